@@ -1,47 +1,120 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, Text, JSON
+from sqlalchemy import create_engine, event, Column, Integer, String, DateTime, Float, Text, JSON, Index, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 
 import os
 
+# DATABASE_URL permet d'utiliser PostgreSQL en production,
+# ex: postgresql://user:password@db:5432/vuln_scanner
+DATABASE_URL = os.getenv("DATABASE_URL")
+if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
 # Utiliser un chemin absolu pour éviter les problèmes de permissions
 # Dans Docker, on utilise /tmp pour éviter les problèmes de permissions
-if os.path.exists("/app"):
+if os.getenv("DB_DIR"):
+    # Répertoire explicite (partagé entre l'API et les workers)
+    DB_DIR = os.getenv("DB_DIR")
+elif os.path.exists("/app"):
     # On est dans Docker - utiliser /tmp pour éviter les problèmes de permissions
     DB_DIR = "/tmp"
 else:
     # Installation locale
-    DB_DIR = os.path.dirname(os.path.dirname(__file__))
+    DB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-os.makedirs(DB_DIR, exist_ok=True)
 DB_PATH = os.path.join(DB_DIR, "vuln_scanner.db")
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
+SQLALCHEMY_DATABASE_URL = DATABASE_URL or f"sqlite:///{DB_PATH}"
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
+# Pool de connexions (API + threads des scanners + workers)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+# Réglages SQLite : WAL (lectures concurrentes des écritures), attente du verrou
+# au lieu de "database is locked", et fsync allégé (sûr en mode WAL)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+
+if IS_SQLITE:
+    os.makedirs(DB_DIR, exist_ok=True)
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+    )
+
+    @event.listens_for(engine, "connect")
+    def _configure_sqlite(dbapi_connection, connection_record):
+        """Appliquer les PRAGMA SQLite à chaque nouvelle connexion"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+else:
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+    )
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 
+# Niveaux de sévérité, du plus grave au moins grave
+SEVERITY_LEVELS = ("critical", "high", "medium", "low", "info")
+
+# Poids de chaque sévérité dans le score de risque d'un scan
+RISK_WEIGHTS = {"critical": 10, "high": 7, "medium": 4, "low": 1, "info": 0}
+
+
 class Scan(Base):
     __tablename__ = "scans"
+    __table_args__ = (
+        # Pagination par curseur (created_at, id), sans filtre ou filtrée par statut, cible ou type
+        Index("ix_scans_created_at_id", "created_at", "id"),
+        Index("ix_scans_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_scans_target_url_created_at_id", "target_url", "created_at", "id"),
+        Index("ix_scans_scan_type_created_at_id", "scan_type", "created_at", "id"),
+        # Scans d'un lot, du plus récent au plus ancien
+        Index("ix_scans_batch_id_created_at_id", "batch_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    target_url = Column(String, index=True)
+    target_url = Column(String)
     status = Column(String, default="pending")  # pending, running, completed, failed
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
-    scan_type = Column(String)  # full, quick, custom
+    scan_type = Column(String)  # full, quick, incremental, custom
+    batch_id = Column(Integer, nullable=True)  # Lot (scan_batches) dont fait partie le scan
+    # Nombre de vulnérabilités par sévérité, maintenu lors de l'écriture des vulnérabilités
+    critical_count = Column(Integer, default=0, server_default="0", nullable=False)
+    high_count = Column(Integer, default=0, server_default="0", nullable=False)
+    medium_count = Column(Integer, default=0, server_default="0", nullable=False)
+    low_count = Column(Integer, default=0, server_default="0", nullable=False)
+    info_count = Column(Integer, default=0, server_default="0", nullable=False)
 
 
 class Vulnerability(Base):
     __tablename__ = "vulnerabilities"
+    __table_args__ = (
+        # Vulnérabilités d'un scan, filtrées ou groupées par sévérité
+        Index("ix_vulnerabilities_scan_id_severity", "scan_id", "severity"),
+        # Tableaux de bord et filtres par type de vulnérabilité
+        Index("ix_vulnerabilities_type_severity", "vulnerability_type", "severity"),
+        # Même vulnérabilité d'un scan à l'autre, ou doublon dans un scan
+        Index("ix_vulnerabilities_fingerprint_scan_id", "fingerprint", "scan_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    scan_id = Column(Integer, index=True)
+    scan_id = Column(Integer, ForeignKey("scans.id", ondelete="CASCADE"), nullable=False)
     title = Column(String)
     description = Column(Text)
     severity = Column(String)  # critical, high, medium, low, info
@@ -49,11 +122,110 @@ class Vulnerability(Base):
     vulnerability_type = Column(String)  # xss, sqli, headers, ports, version
     recommendation = Column(Text)
     evidence = Column(JSON, nullable=True)
+    fingerprint = Column(String, nullable=True)  # Empreinte normalisée (type/CWE, chemin, paramètre)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ScanSummary(Base):
+    """Agrégats par scan, maintenus à l'écriture des vulnérabilités"""
+    __tablename__ = "scan_summaries"
+
+    scan_id = Column(Integer, ForeignKey("scans.id", ondelete="CASCADE"), primary_key=True)
+    total_count = Column(Integer, default=0, server_default="0", nullable=False)
+    risk_score = Column(Integer, default=0, server_default="0", nullable=False)
+    max_cvss_score = Column(Float, default=0.0, server_default="0", nullable=False)
+    counts_by_type = Column(JSON, nullable=True)  # {"xss": 2, "headers": 4, ...}
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class EndpointFingerprint(Base):
+    """Empreinte d'une page au moment d'un scan (comparée lors des scans incrémentaux)"""
+    __tablename__ = "endpoint_fingerprints"
+    __table_args__ = (
+        Index("ix_endpoint_fingerprints_scan_id_endpoint", "scan_id", "endpoint"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    scan_id = Column(Integer, ForeignKey("scans.id", ondelete="CASCADE"), nullable=False)
+    endpoint = Column(String)  # URL canonique (noms de paramètres sans valeurs)
+    url = Column(String)
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    body_hash = Column(String)
+    input_signature = Column(String)  # Formulaires (méthode, action, champs) de la page
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class PayloadStat(Base):
+    """Résultats cumulés d'un payload d'injection, tous scans confondus"""
+    __tablename__ = "payload_stats"
+    __table_args__ = (
+        Index("ix_payload_stats_scanner_context_payload_id", "scanner", "context", "payload_id", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    scanner = Column(String, nullable=False)  # xss, sqli
+    context = Column(String, nullable=False)  # parameter, form, search
+    payload_id = Column(String, nullable=False)
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    hits = Column(Integer, default=0, server_default="0", nullable=False)
+    total_cost = Column(Float, default=0.0, server_default="0", nullable=False)  # Durée cumulée des requêtes (s)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ScanBatch(Base):
+    """Lot de scans créé en une seule requête (balayage de nombreuses cibles)"""
+    __tablename__ = "scan_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=True)
+    scan_type = Column(String)
+    status = Column(String, default="pending")  # pending, running, completed
+    total_count = Column(Integer, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+
+class ZapSiteLock(Base):
+    """Site en cours de scan sur une instance ZAP (ZAP conserve les alertes par site)"""
+    __tablename__ = "zap_site_locks"
+
+    instance_url = Column(String, primary_key=True)
+    site = Column(String, primary_key=True)  # schéma://hôte[:port]
+    owner = Column(String, nullable=False)  # Contexte ZAP du scan qui détient le verrou
+    expires_at = Column(DateTime, nullable=False)  # Renouvelé pendant le scan, repris après expiration
+
+
+class ScanJob(Base):
+    __tablename__ = "scan_jobs"
+    __table_args__ = (
+        Index("ix_scan_jobs_status_id", "status", "id"),
+        # Jobs en cours par hôte (limite par hôte de l'ordonnanceur)
+        Index("ix_scan_jobs_status_host", "status", "host"),
+        # Avancement d'un lot
+        Index("ix_scan_jobs_batch_id_status", "batch_id", "status"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    scan_id = Column(Integer, index=True)
+    host = Column(String, nullable=True)  # Hôte de la cible, pour la limite de scans simultanés par hôte
+    batch_id = Column(Integer, nullable=True)
+    status = Column(String, default="queued")  # queued, running, completed, failed
+    attempts = Column(Integer, default=0)
+    worker_id = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
 
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    from api.migrations import run_migrations
+
+    # Création des tables et migrations, sérialisées entre l'API et les workers
+    run_migrations(engine)
 
 
 def get_db():
@@ -0,0 +1,340 @@
+"""
+File d'attente persistante des scans (stockée dans la base de données)
+
+Les jobs sont réclamés par les workers avec un bail (lease) renouvelé pendant
+l'exécution : si un worker s'arrête brutalement, son bail expire et le job est
+repris par un autre worker.
+
+L'ordonnanceur répartit les workers équitablement entre les lots (les scans
+isolés forment un groupe à part) et respecte des limites de scans simultanés :
+globale, par lot et par hôte cible.
+"""
+import os
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from sqlalchemy import and_, func, insert, or_, select, text
+from sqlalchemy.orm import Session, aliased
+
+from api.database import Scan, ScanBatch, ScanJob
+
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Limites de l'ordonnanceur (0 = pas de limite)
+SCHEDULER_MAX_RUNNING = int(os.getenv("SCHEDULER_MAX_RUNNING", "0"))
+SCHEDULER_MAX_PER_HOST = int(os.getenv("SCHEDULER_MAX_PER_HOST", "1"))
+SCHEDULER_MAX_PER_BATCH = int(os.getenv("SCHEDULER_MAX_PER_BATCH", "0"))
+
+# Espace des verrous consultatifs PostgreSQL par hôte (réclamations de jobs)
+HOST_CLAIM_LOCK_SPACE = 19
+
+
+def target_host(target_url: str):
+    """Hôte d'une URL cible (None si l'URL n'en contient pas)"""
+    return urlparse(target_url or "").hostname
+
+
+def enqueue_scan(db: Session, scan_id: int, target_url: str = None, batch_id: int = None) -> ScanJob:
+    """
+    Ajouter un scan à la file d'attente
+
+    Le job est validé dans la même transaction que les modifications en cours
+    de la session : un scan créé (flush) juste avant n'existe jamais sans job.
+    """
+    job = ScanJob(scan_id=scan_id, host=target_host(target_url), batch_id=batch_id, status="queued")
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def create_batch(db: Session, targets: list, scan_type: str, name: str = None) -> ScanBatch:
+    """
+    Créer un lot de scans et placer tous ses scans dans la file d'attente
+
+    Les scans et les jobs sont insérés par lots, dans une seule transaction.
+    """
+    now = datetime.utcnow()
+    batch = ScanBatch(name=name, scan_type=scan_type, status="pending", total_count=len(targets), created_at=now)
+    db.add(batch)
+    db.flush()
+
+    scans = db.execute(
+        insert(Scan).returning(Scan.id, Scan.target_url),
+        [
+            {"target_url": target, "scan_type": scan_type, "status": "pending", "batch_id": batch.id, "created_at": now}
+            for target in targets
+        ],
+    ).all()
+    db.execute(insert(ScanJob), [
+        {
+            "scan_id": scan_id,
+            "host": target_host(target_url),
+            "batch_id": batch.id,
+            "status": "queued",
+            "attempts": 0,
+            "created_at": now,
+        }
+        for scan_id, target_url in scans
+    ])
+    db.commit()
+    db.refresh(batch)
+    return batch
+
+
+def _claimable(now: datetime):
+    """Jobs en attente, ou en cours dont le bail a expiré"""
+    return and_(
+        ScanJob.attempts < JOB_MAX_ATTEMPTS,
+        or_(
+            ScanJob.status == "queued",
+            and_(ScanJob.status == "running", ScanJob.lease_expires_at < now),
+        ),
+    )
+
+
+def _running_counts(db: Session, column, now: datetime) -> dict:
+    """Nombre de jobs en cours (bail valide) par valeur de column"""
+    return dict(
+        db.query(column, func.count(ScanJob.id))
+        .filter(ScanJob.status == "running", ScanJob.lease_expires_at >= now)
+        .group_by(column)
+        .all()
+    )
+
+
+def claim_job(db: Session, worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS):
+    """
+    Réclamer le prochain job disponible
+
+    Les groupes (lots, scans isolés) sont servis par nombre croissant de jobs
+    en cours, puis par ancienneté : un gros lot n'affame pas les scans créés
+    après lui. Les hôtes ayant atteint SCHEDULER_MAX_PER_HOST sont ignorés.
+
+    La réclamation est un UPDATE conditionnel : si deux workers visent le même
+    job, un seul obtient la ligne et l'autre passe au candidat suivant. La
+    limite par hôte est revérifiée dans cet UPDATE, après sérialisation des
+    réclamations de l'hôte (voir _try_claim).
+
+    Returns:
+        Le ScanJob réclamé, ou None si aucun job n'est disponible
+    """
+    now = datetime.utcnow()
+    _fail_exhausted_jobs(db, now)
+
+    running_by_host = _running_counts(db, ScanJob.host, now)
+    running_by_batch = _running_counts(db, ScanJob.batch_id, now)
+    if SCHEDULER_MAX_RUNNING and sum(running_by_host.values()) >= SCHEDULER_MAX_RUNNING:
+        return None
+
+    blocked_hosts = [
+        host for host, count in running_by_host.items()
+        if host is not None and SCHEDULER_MAX_PER_HOST and count >= SCHEDULER_MAX_PER_HOST
+    ]
+
+    # Groupes ayant des jobs disponibles : le moins servi d'abord, puis le plus ancien
+    groups = db.query(ScanJob.batch_id, func.min(ScanJob.id)).filter(_claimable(now)).group_by(ScanJob.batch_id).all()
+    groups.sort(key=lambda group: (running_by_batch.get(group[0], 0), group[1]))
+
+    for batch_id, _ in groups:
+        if (batch_id is not None and SCHEDULER_MAX_PER_BATCH
+                and running_by_batch.get(batch_id, 0) >= SCHEDULER_MAX_PER_BATCH):
+            continue
+
+        in_group = ScanJob.batch_id.is_(None) if batch_id is None else ScanJob.batch_id == batch_id
+        query = db.query(ScanJob.id, ScanJob.host).filter(_claimable(now), in_group)
+        if blocked_hosts:
+            query = query.filter(or_(ScanJob.host.is_(None), ScanJob.host.notin_(blocked_hosts)))
+
+        for job_id, host in query.order_by(ScanJob.id).limit(10).all():
+            job = _try_claim(db, job_id, host, batch_id, worker_id, lease_seconds, now)
+            if job:
+                return job
+    return None
+
+
+def _try_claim(db: Session, job_id: int, host, batch_id, worker_id: str, lease_seconds: int, now: datetime):
+    """
+    UPDATE conditionnel d'un job candidat ; None si un autre worker l'a pris ou si l'hôte est saturé
+
+    Le comptage des jobs en cours de l'hôte doit voir les réclamations des
+    autres workers. SQLite n'a qu'un écrivain à la fois : l'UPDATE et son
+    sous-requête sont atomiques. Sous PostgreSQL (READ COMMITTED), deux
+    réclamations simultanées ne verraient pas celle de l'autre : un verrou
+    consultatif par hôte, tenu jusqu'au commit, les sérialise et chaque UPDATE
+    compte alors les réclamations déjà validées.
+    """
+    conditions = [ScanJob.id == job_id, _claimable(now)]
+    if host is not None and SCHEDULER_MAX_PER_HOST:
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(
+                text("SELECT pg_advisory_xact_lock(:space, hashtext(:host))"),
+                {"space": HOST_CLAIM_LOCK_SPACE, "host": host},
+            )
+        running = aliased(ScanJob)
+        host_running = (
+            select(func.count(running.id))
+            .where(running.host == host, running.status == "running", running.lease_expires_at >= now)
+            .scalar_subquery()
+        )
+        conditions.append(host_running < SCHEDULER_MAX_PER_HOST)
+
+    updated = db.query(ScanJob).filter(*conditions).update(
+        {
+            ScanJob.status: "running",
+            ScanJob.worker_id: worker_id,
+            ScanJob.lease_expires_at: now + timedelta(seconds=lease_seconds),
+            ScanJob.attempts: ScanJob.attempts + 1,
+            ScanJob.started_at: now,
+        },
+        synchronize_session=False,
+    )
+    if updated and batch_id is not None:
+        # Premier job réclamé d'un lot : le lot démarre
+        db.query(ScanBatch).filter(ScanBatch.id == batch_id, ScanBatch.started_at.is_(None)).update(
+            {ScanBatch.status: "running", ScanBatch.started_at: now},
+            synchronize_session=False,
+        )
+    db.commit()
+    if updated:
+        return db.query(ScanJob).filter(ScanJob.id == job_id).first()
+    return None
+
+
+def renew_lease(db: Session, job_id: int, worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> bool:
+    """Prolonger le bail d'un job ; False si le job appartient désormais à un autre worker"""
+    updated = db.query(ScanJob).filter(
+        ScanJob.id == job_id,
+        ScanJob.worker_id == worker_id,
+        ScanJob.status == "running",
+    ).update(
+        {ScanJob.lease_expires_at: datetime.utcnow() + timedelta(seconds=lease_seconds)},
+        synchronize_session=False,
+    )
+    db.commit()
+    return bool(updated)
+
+
+def finish_job(db: Session, job_id: int, worker_id: str, success: bool, error: str = None,
+               lease_lost: bool = False):
+    """
+    Marquer un job comme terminé (completed) ou échoué (failed)
+
+    Le job n'est modifié que s'il est encore en cours et réclamé par ce worker :
+    un job repris par un autre worker lui appartient désormais. Un job dont le
+    bail a été perdu sans être repris (renouvellements en échec) est remis en
+    file s'il lui reste des tentatives ; sinon le job et son scan échouent dans
+    la même transaction, le scan ne reste jamais "running".
+    """
+    now = datetime.utcnow()
+    job = db.query(ScanJob).filter(
+        ScanJob.id == job_id,
+        ScanJob.worker_id == worker_id,
+        ScanJob.status == "running",
+    ).with_for_update().first()
+    if job is None:
+        db.commit()
+        return
+
+    if not success and lease_lost and job.attempts < JOB_MAX_ATTEMPTS:
+        job.status = "queued"
+        job.worker_id = None
+        job.lease_expires_at = None
+        job.last_error = error or "Bail perdu, job remis en file"
+        db.commit()
+        return
+
+    job.status = "completed" if success else "failed"
+    job.finished_at = now
+    job.lease_expires_at = None
+    job.last_error = error
+    if not success:
+        if lease_lost and not error:
+            job.last_error = "Bail perdu et nombre maximal de tentatives atteint"
+        db.query(Scan).filter(Scan.id == job.scan_id, Scan.status != "failed").update(
+            {Scan.status: "failed"}, synchronize_session=False
+        )
+    db.flush()
+    batch_id = job.batch_id
+    if batch_id is not None:
+        _complete_batch_if_done(db, batch_id, now)
+    db.commit()
+
+
+def _complete_batch_if_done(db: Session, batch_id: int, now: datetime):
+    """Marquer un lot comme terminé quand il n'a plus de job en attente ni en cours"""
+    remaining = db.query(func.count(ScanJob.id)).filter(
+        ScanJob.batch_id == batch_id,
+        ScanJob.status.in_(("queued", "running")),
+    ).scalar()
+    if not remaining:
+        db.query(ScanBatch).filter(ScanBatch.id == batch_id, ScanBatch.completed_at.is_(None)).update(
+            {ScanBatch.status: "completed", ScanBatch.completed_at: now},
+            synchronize_session=False,
+        )
+
+
+def _fail_exhausted_jobs(db: Session, now: datetime):
+    """Abandonner les jobs dont le bail a expiré après le nombre maximal de tentatives"""
+    exhausted = db.query(ScanJob).filter(
+        ScanJob.status == "running",
+        ScanJob.lease_expires_at < now,
+        ScanJob.attempts >= JOB_MAX_ATTEMPTS,
+    ).all()
+    for job in exhausted:
+        job.status = "failed"
+        job.finished_at = now
+        job.last_error = "Nombre maximal de tentatives atteint"
+        db.query(Scan).filter(Scan.id == job.scan_id).update(
+            {Scan.status: "failed"}, synchronize_session=False
+        )
+    if exhausted:
+        db.flush()
+        for batch_id in {job.batch_id for job in exhausted if job.batch_id is not None}:
+            _complete_batch_if_done(db, batch_id, now)
+        db.commit()
+
+
+def queue_stats(db: Session) -> dict:
+    """Longueur de la file et nombre de jobs par statut"""
+    counts = dict(
+        db.query(ScanJob.status, func.count(ScanJob.id)).group_by(ScanJob.status).all()
+    )
+    oldest = db.query(func.min(ScanJob.created_at)).filter(ScanJob.status == "queued").scalar()
+    return {
+        "queued": counts.get("queued", 0),
+        "running": counts.get("running", 0),
+        "completed": counts.get("completed", 0),
+        "failed": counts.get("failed", 0),
+        "oldest_queued_seconds": (datetime.utcnow() - oldest).total_seconds() if oldest else 0,
+    }
+
+
+def batch_progress(db: Session, batch: ScanBatch) -> dict:
+    """Avancement d'un lot : jobs par statut, pourcentage, débit et estimation de fin"""
+    counts = dict(
+        db.query(ScanJob.status, func.count(ScanJob.id))
+        .filter(ScanJob.batch_id == batch.id)
+        .group_by(ScanJob.status)
+        .all()
+    )
+    done = counts.get("completed", 0) + counts.get("failed", 0)
+    total = batch.total_count or sum(counts.values())
+
+    # Débit mesuré depuis le démarrage du lot (jusqu'à sa fin s'il est terminé)
+    elapsed = 0.0
+    if batch.started_at:
+        elapsed = ((batch.completed_at or datetime.utcnow()) - batch.started_at).total_seconds()
+    throughput = done / elapsed * 60 if elapsed > 0 else 0.0
+    remaining = total - done
+
+    return {
+        "queued": counts.get("queued", 0),
+        "running": counts.get("running", 0),
+        "completed": counts.get("completed", 0),
+        "failed": counts.get("failed", 0),
+        "progress_percent": round(done / total * 100, 1) if total else 100.0,
+        "elapsed_seconds": elapsed,
+        "throughput_per_minute": round(throughput, 2),
+        "eta_seconds": round(remaining / throughput * 60) if throughput and remaining else None,
+    }
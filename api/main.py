@@ -1,14 +1,22 @@
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Depends, File, Form, HTTPException, Query, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import StreamingResponse, FileResponse
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
+from urllib.parse import urlparse
+import base64
+import ipaddress
+import os
+import re
 import uvicorn
 
-from api.database import get_db, init_db, Scan, Vulnerability
-from scanners.scanner_manager import ScannerManager
+from api.database import get_db, init_db, SessionLocal, Scan, ScanBatch, ScanSummary, Vulnerability, SEVERITY_LEVELS
+from reports.report_generator import generate_html_report_stream, get_report_template
+from reports.report_cache import ReportCache, compute_etag, http_date, is_not_modified
+from api.job_queue import batch_progress, create_batch, enqueue_scan, queue_stats
 
 app = FastAPI(
     title="Vulnerability Scanner API",
@@ -23,13 +31,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Nombre maximal de cibles par lot
+BATCH_MAX_TARGETS = int(os.getenv("BATCH_MAX_TARGETS", "10000"))
+
+# Types de scan acceptés pour un lot (exécutés par api.worker.run_scan)
+BATCH_SCAN_TYPES = ("quick", "full", "incremental")
+
+# Nom d'hôte : au moins deux labels (lettres, chiffres, tirets) séparés par des points
+_HOSTNAME_RE = re.compile(r"^(?!-)[\w-]{1,63}(?<!-)(\.(?!-)[\w-]{1,63}(?<!-))+\.?$")
+
 
 # Modèles Pydantic
 class ScanRequest(BaseModel):
     target_url: str
-    scan_type: str = "full"  # full, quick, custom
+    scan_type: str = "full"  # full, quick, incremental, custom
 
 
 class ScanResponse(BaseModel):
@@ -37,7 +55,14 @@ class ScanResponse(BaseModel):
     target_url: str
     status: str
     created_at: datetime
+    completed_at: Optional[datetime] = None
     scan_type: str
+    batch_id: Optional[int] = None
+    critical_count: int = 0
+    high_count: int = 0
+    medium_count: int = 0
+    low_count: int = 0
+    info_count: int = 0
 
     class Config:
         from_attributes = True
@@ -53,19 +78,55 @@ class VulnerabilityResponse(BaseModel):
     vulnerability_type: str
     recommendation: str
     evidence: Optional[dict] = None
+    fingerprint: Optional[str] = None
 
     class Config:
         from_attributes = True
 
 
 class ScanDetailResponse(ScanResponse):
+    total_count: int = 0
+    risk_score: int = 0
+    max_cvss_score: float = 0.0
+    counts_by_type: dict = {}
     vulnerabilities: List[VulnerabilityResponse] = []
 
 
+class BatchRequest(BaseModel):
+    targets: List[str]
+    scan_type: str = "full"
+    name: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    id: int
+    name: Optional[str] = None
+    scan_type: str
+    status: str
+    total_count: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    queued: int = 0
+    running: int = 0
+    completed: int = 0
+    failed: int = 0
+    progress_percent: float = 0.0
+    elapsed_seconds: float = 0.0
+    throughput_per_minute: float = 0.0
+    eta_seconds: Optional[int] = None
+    rejected_targets: List[str] = []
+
+    class Config:
+        from_attributes = True
+
+
 # Initialisation de la base de données
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    # Compiler le template du rapport dès le démarrage
+    get_report_template()
 
 
 @app.get("/")
@@ -75,9 +136,13 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "POST /api/scans": "Créer un nouveau scan",
-            "GET /api/scans": "Liste tous les scans",
+            "GET /api/scans": "Liste des scans (pagination par curseur, filtres status/target_url/scan_type)",
             "GET /api/scans/{scan_id}": "Détails d'un scan",
-            "GET /api/scans/{scan_id}/report": "Rapport HTML d'un scan"
+            "GET /api/scans/{scan_id}/report": "Rapport HTML d'un scan",
+            "POST /api/batches": "Créer un lot de scans (liste de cibles)",
+            "POST /api/batches/upload": "Créer un lot de scans (fichier de cibles)",
+            "GET /api/batches/{batch_id}": "Avancement d'un lot de scans",
+            "GET /api/queue": "État de la file d'attente des scans"
         }
     }
 
@@ -85,7 +150,6 @@ async def root():
 @app.post("/api/scans", response_model=ScanResponse)
 async def create_scan(
     scan_request: ScanRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """Créer un nouveau scan de vulnérabilité"""
@@ -96,19 +160,67 @@ async def create_scan(
         status="pending"
     )
     db.add(scan)
-    db.commit()
-    db.refresh(scan)
+    db.flush()
 
-    # Lancer le scan en arrière-plan
-    background_tasks.add_task(run_scan, scan.id, scan_request.target_url, scan_request.scan_type)
+    # Placer le scan dans la file d'attente (exécuté par les workers: python3 -m api.worker) ;
+    # le scan et son job sont validés ensemble
+    enqueue_scan(db, scan.id, scan.target_url)
+    db.refresh(scan)
 
     return scan
 
 
+def _encode_cursor(scan: Scan) -> str:
+    """Curseur opaque désignant la position (created_at, id) d'un scan"""
+    raw = f"{scan.created_at.isoformat()}|{scan.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, scan_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(scan_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+
+
 @app.get("/api/scans", response_model=List[ScanResponse])
-async def list_scans(db: Session = Depends(get_db)):
-    """Liste tous les scans"""
-    scans = db.query(Scan).order_by(Scan.created_at.desc()).all()
+async def list_scans(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    target_url: Optional[str] = None,
+    scan_type: Optional[str] = None,
+    batch_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Liste des scans, du plus récent au plus ancien
+
+    Pagination par curseur sur (created_at, id) : le curseur de la page suivante
+    est renvoyé dans l'en-tête X-Next-Cursor (absent sur la dernière page).
+    """
+    query = db.query(Scan)
+    if status:
+        query = query.filter(Scan.status == status)
+    if target_url:
+        query = query.filter(Scan.target_url == target_url)
+    if scan_type:
+        query = query.filter(Scan.scan_type == scan_type)
+    if batch_id is not None:
+        query = query.filter(Scan.batch_id == batch_id)
+    if cursor:
+        created_at, scan_id = _decode_cursor(cursor)
+        query = query.filter(or_(
+            Scan.created_at < created_at,
+            and_(Scan.created_at == created_at, Scan.id < scan_id)
+        ))
+
+    scans = query.order_by(Scan.created_at.desc(), Scan.id.desc()).limit(limit + 1).all()
+    if len(scans) > limit:
+        scans = scans[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(scans[-1])
     return scans
 
 
@@ -122,69 +234,188 @@ async def get_scan(scan_id: int, db: Session = Depends(get_db)):
     vulnerabilities = db.query(Vulnerability).filter(
         Vulnerability.scan_id == scan_id
     ).all()
+    summary = db.query(ScanSummary).filter(ScanSummary.scan_id == scan_id).first()
 
     return {
         **scan.__dict__,
+        "total_count": summary.total_count if summary else 0,
+        "risk_score": summary.risk_score if summary else 0,
+        "max_cvss_score": summary.max_cvss_score if summary else 0.0,
+        "counts_by_type": (summary.counts_by_type or {}) if summary else {},
         "vulnerabilities": vulnerabilities
     }
 
 
+report_cache = ReportCache()
+
+
 @app.get("/api/scans/{scan_id}/report")
-async def get_scan_report(scan_id: int, db: Session = Depends(get_db)):
-    """Générer un rapport HTML pour un scan"""
-    from reports.report_generator import generate_html_report
+async def get_scan_report(scan_id: int, request: Request, db: Session = Depends(get_db)):
+    """
+    Générer un rapport HTML pour un scan (envoyé en streaming)
 
+    Le rapport d'un scan terminé est mis en cache sur disque (gzip) et servi
+    avec ETag/Last-Modified : une requête conditionnelle reçoit un 304.
+    """
     scan = db.query(Scan).filter(Scan.id == scan_id).first()
     if not scan:
         raise HTTPException(status_code=404, detail="Scan non trouvé")
 
-    vulnerabilities = db.query(Vulnerability).filter(
-        Vulnerability.scan_id == scan_id
-    ).all()
-
-    html_report = generate_html_report(scan, vulnerabilities)
-    return HTMLResponse(content=html_report, media_type="text/html")
+    severity_counts = {severity: getattr(scan, f"{severity}_count") for severity in SEVERITY_LEVELS}
+    summary = db.query(ScanSummary).filter(ScanSummary.scan_id == scan_id).first()
+    total_count = summary.total_count if summary else None
+    db.expunge(scan)
+
+    def render():
+        # Session propre au streaming : celle de la requête est fermée avant l'envoi du corps
+        stream_db = SessionLocal()
+        try:
+            vulnerabilities = stream_db.query(Vulnerability).filter(
+                Vulnerability.scan_id == scan_id
+            ).order_by(Vulnerability.id).yield_per(500)
+            yield from generate_html_report_stream(scan, vulnerabilities, severity_counts, total_count)
+        finally:
+            stream_db.close()
+
+    media_type = "text/html; charset=utf-8"
+    if scan.status != "completed":
+        # Rapport d'un scan en cours : pas de cache, les vulnérabilités changent encore
+        return StreamingResponse(render(), media_type=media_type, headers={"Cache-Control": "no-store"})
+
+    etag = compute_etag(scan, summary)
+    last_modified = max(filter(None, [scan.completed_at, summary.updated_at if summary else None]), default=None)
+    headers = {
+        "ETag": f'"{etag}"',
+        "Cache-Control": "private, no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+
+    if is_not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since"),
+                       etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    cached_path = report_cache.get(scan_id, etag)
+    if cached_path:
+        if "gzip" in request.headers.get("accept-encoding", "").lower():
+            return FileResponse(cached_path, media_type=media_type,
+                                headers={**headers, "Content-Encoding": "gzip"})
+        return StreamingResponse(report_cache.read_chunks(cached_path), media_type=media_type, headers=headers)
+
+    return StreamingResponse(report_cache.store_stream(scan_id, etag, render()),
+                             media_type=media_type, headers=headers)
+
+
+def _is_valid_host(hostname: Optional[str]) -> bool:
+    """Hôte scannable : adresse IP, localhost ou nom de domaine (avec un point)"""
+    if not hostname:
+        return False
+    if hostname == "localhost":
+        return True
+    try:
+        ipaddress.ip_address(hostname)
+        return True
+    except ValueError:
+        return bool(_HOSTNAME_RE.match(hostname)) and not hostname.replace(".", "").isdigit()
 
 
-def run_scan(scan_id: int, target_url: str, scan_type: str):
-    """Exécuter le scan en arrière-plan"""
-    from api.database import SessionLocal
-    
-    db = SessionLocal()
+def _parse_target(raw: str) -> Optional[str]:
+    """URL http(s) d'une cible (schéma http ajouté aux hôtes nus), None si invalide"""
+    target = raw.strip()
+    if "://" not in target:
+        target = f"http://{target}"
     try:
-        # Mettre à jour le statut
-        scan = db.query(Scan).filter(Scan.id == scan_id).first()
-        if not scan:
-            return
-
-        scan.status = "running"
-        db.commit()
-
-        # Initialiser le gestionnaire de scanners
-        scanner_manager = ScannerManager(db, scan_id)
-
-        # Exécuter les scans selon le type
-        if scan_type == "quick":
-            scanner_manager.run_quick_scan(target_url)
-        elif scan_type == "full":
-            scanner_manager.run_full_scan(target_url)
-        else:
-            scanner_manager.run_full_scan(target_url)
-
-        # Mettre à jour le statut
-        scan.status = "completed"
-        scan.completed_at = datetime.utcnow()
-        db.commit()
-
-    except Exception as e:
-        # En cas d'erreur
-        scan = db.query(Scan).filter(Scan.id == scan_id).first()
-        if scan:
-            scan.status = "failed"
-            db.commit()
-        print(f"Erreur lors du scan {scan_id}: {str(e)}")
-    finally:
-        db.close()
+        parsed = urlparse(target)
+        parsed.port
+    except ValueError:
+        return None
+    if parsed.scheme not in ("http", "https") or not _is_valid_host(parsed.hostname):
+        return None
+    return target
+
+
+def _normalize_targets(raw_targets):
+    """
+    Nettoyer une liste de cibles : doublons et lignes vides ignorés, schéma http
+    ajouté aux hôtes nus, cibles dont l'hôte n'est ni une IP ni un nom de domaine
+    rejetées
+
+    Returns:
+        (cibles retenues, cibles rejetées)
+    """
+    targets, rejected, seen = [], [], set()
+    for raw in raw_targets:
+        target = (raw or "").strip()
+        if not target or target.startswith("#"):
+            continue
+        target = _parse_target(target)
+        if target is None:
+            rejected.append(raw.strip())
+            continue
+        if target not in seen:
+            seen.add(target)
+            targets.append(target)
+    return targets, rejected
+
+
+def _create_batch_response(db: Session, raw_targets, scan_type: str, name: Optional[str]):
+    if scan_type not in BATCH_SCAN_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Type de scan invalide (valeurs acceptées: {', '.join(BATCH_SCAN_TYPES)})"
+        )
+    targets, rejected = _normalize_targets(raw_targets)
+    if not targets:
+        raise HTTPException(status_code=400, detail="Aucune cible valide")
+    if len(targets) > BATCH_MAX_TARGETS:
+        raise HTTPException(status_code=400, detail=f"Un lot est limité à {BATCH_MAX_TARGETS} cibles")
+
+    batch = create_batch(db, targets, scan_type, name)
+    return {**batch.__dict__, **batch_progress(db, batch), "rejected_targets": rejected}
+
+
+@app.post("/api/batches", response_model=BatchResponse)
+async def create_scan_batch(batch_request: BatchRequest, db: Session = Depends(get_db)):
+    """Créer un lot de scans à partir d'une liste de cibles"""
+    return _create_batch_response(db, batch_request.targets, batch_request.scan_type, batch_request.name)
+
+
+@app.post("/api/batches/upload", response_model=BatchResponse)
+async def upload_scan_batch(
+    file: UploadFile = File(...),
+    scan_type: str = Form("full"),
+    name: Optional[str] = Form(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Créer un lot de scans à partir d'un fichier (une cible par ligne, ou CSV avec
+    la cible en première colonne)
+
+    Une première ligne qui n'est pas une cible valide est considérée comme la
+    ligne d'en-tête du CSV et ignorée.
+    """
+    content = (await file.read()).decode("utf-8-sig", errors="replace")
+    raw_targets = [line.split(",")[0].strip().strip('"') for line in content.splitlines()]
+    raw_targets = [raw for raw in raw_targets if raw and not raw.startswith("#")]
+    if raw_targets and _parse_target(raw_targets[0]) is None:
+        raw_targets = raw_targets[1:]
+    return _create_batch_response(db, raw_targets, scan_type, name or file.filename)
+
+
+@app.get("/api/batches/{batch_id}", response_model=BatchResponse)
+async def get_scan_batch(batch_id: int, db: Session = Depends(get_db)):
+    """Avancement d'un lot : scans par statut, pourcentage, débit et estimation de fin"""
+    batch = db.query(ScanBatch).filter(ScanBatch.id == batch_id).first()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Lot non trouvé")
+    return {**batch.__dict__, **batch_progress(db, batch)}
+
+
+@app.get("/api/queue")
+async def get_queue(db: Session = Depends(get_db)):
+    """État de la file d'attente des scans"""
+    return queue_stats(db)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,268 @@
+"""
+Migrations du schéma de la base de données
+
+init_db crée les tables manquantes avec leur définition actuelle, puis applique
+ici, dans l'ordre, les migrations pas encore enregistrées dans schema_migrations.
+Chaque migration vérifie l'état réel du schéma : elle ne fait rien sur une base
+créée directement avec la définition actuelle.
+
+L'API et les workers appellent init_db au démarrage : la création des tables et
+chaque migration s'exécutent sous un verrou de base (verrou d'écriture SQLite,
+verrou consultatif PostgreSQL), et la version est relue une fois le verrou
+obtenu pour qu'une migration ne soit appliquée qu'une fois.
+"""
+import json
+from datetime import datetime
+from urllib.parse import urlparse
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+
+from api.database import RISK_WEIGHTS, SEVERITY_LEVELS, Base, Scan, ScanJob, ScanSummary, Vulnerability
+from scanners.findings_writer import finding_fingerprint
+
+_metadata = MetaData()
+
+# Clé du verrou consultatif PostgreSQL qui sérialise les migrations
+MIGRATION_LOCK_ID = 7305180421
+
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+
+def _add_scan_severity_counts(connection):
+    """Compteurs de vulnérabilités par sévérité sur la table scans"""
+    scan_columns = {column["name"] for column in inspect(connection).get_columns("scans")}
+    missing = [f"{severity}_count" for severity in SEVERITY_LEVELS if f"{severity}_count" not in scan_columns]
+    for column in missing:
+        connection.execute(text(f"ALTER TABLE scans ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"))
+    if missing:
+        # Initialiser les compteurs à partir des vulnérabilités déjà enregistrées
+        for severity in SEVERITY_LEVELS:
+            connection.execute(text(
+                f"UPDATE scans SET {severity}_count = ("
+                "SELECT COUNT(*) FROM vulnerabilities "
+                "WHERE vulnerabilities.scan_id = scans.id AND LOWER(vulnerabilities.severity) = :severity)"
+            ), {"severity": severity})
+    _create_indexes(connection, Scan.__table__, ["ix_scans_created_at_id", "ix_scans_status_created_at_id"])
+
+
+def _add_vulnerability_foreign_key_and_indexes(connection):
+    """Clé étrangère vulnerabilities.scan_id -> scans.id et index composites"""
+    inspector = inspect(connection)
+    has_foreign_key = any(
+        fk["referred_table"] == "scans" for fk in inspector.get_foreign_keys("vulnerabilities")
+    )
+
+    # L'index simple sur scan_id est couvert par l'index composite (scan_id, severity)
+    if any(index["name"] == "ix_vulnerabilities_scan_id" for index in inspector.get_indexes("vulnerabilities")):
+        connection.execute(text("DROP INDEX ix_vulnerabilities_scan_id"))
+
+    if not has_foreign_key:
+        # Les vulnérabilités orphelines empêcheraient la création de la contrainte : elles
+        # sont déplacées (et non supprimées) dans vulnerabilities_orphaned
+        orphaned = "scan_id IS NULL OR scan_id NOT IN (SELECT id FROM scans)"
+        count = connection.execute(text(f"SELECT COUNT(*) FROM vulnerabilities WHERE {orphaned}")).scalar()
+        if count:
+            connection.execute(text(
+                "CREATE TABLE IF NOT EXISTS vulnerabilities_orphaned AS SELECT * FROM vulnerabilities WHERE 1 = 0"
+            ))
+            connection.execute(text(f"INSERT INTO vulnerabilities_orphaned SELECT * FROM vulnerabilities WHERE {orphaned}"))
+            connection.execute(text(f"DELETE FROM vulnerabilities WHERE {orphaned}"))
+            print(f"[!] Migration 2: {count} vulnérabilité(s) orpheline(s) (scan inexistant) "
+                  "déplacée(s) dans la table vulnerabilities_orphaned")
+        if connection.dialect.name == "sqlite":
+            _rebuild_sqlite_table(connection, Vulnerability.__table__)
+        else:
+            connection.execute(text(
+                "ALTER TABLE vulnerabilities ADD CONSTRAINT fk_vulnerabilities_scan_id "
+                "FOREIGN KEY (scan_id) REFERENCES scans (id) ON DELETE CASCADE"
+            ))
+
+    _create_indexes(connection, Vulnerability.__table__, [
+        "ix_vulnerabilities_scan_id_severity", "ix_vulnerabilities_type_severity"
+    ])
+
+
+def _backfill_scan_summaries(connection):
+    """Résumés par scan (total, score de risque, CVSS max, nombre par type) des scans existants"""
+    existing = set(connection.execute(select(ScanSummary.scan_id)).scalars())
+    rows = connection.execute(text(
+        "SELECT scan_id, vulnerability_type, LOWER(severity), COUNT(*), MAX(cvss_score) "
+        "FROM vulnerabilities GROUP BY scan_id, vulnerability_type, LOWER(severity)"
+    )).all()
+
+    summaries = {}
+    for scan_id, vuln_type, severity, count, max_cvss in rows:
+        if scan_id in existing:
+            continue
+        summary = summaries.setdefault(scan_id, {
+            "scan_id": scan_id,
+            "total_count": 0,
+            "risk_score": 0,
+            "max_cvss_score": 0.0,
+            "counts_by_type": {},
+            "updated_at": datetime.utcnow(),
+        })
+        summary["total_count"] += count
+        summary["risk_score"] += RISK_WEIGHTS.get(severity, 0) * count
+        summary["max_cvss_score"] = max(summary["max_cvss_score"], max_cvss or 0.0)
+        summary["counts_by_type"][vuln_type] = summary["counts_by_type"].get(vuln_type, 0) + count
+
+    if summaries:
+        connection.execute(ScanSummary.__table__.insert(), list(summaries.values()))
+
+
+def _add_batch_scheduling_columns(connection):
+    """Lots de scans (scans.batch_id) et colonnes d'ordonnancement des jobs (hôte, lot)"""
+    inspector = inspect(connection)
+    scan_columns = {column["name"] for column in inspector.get_columns("scans")}
+    job_columns = {column["name"] for column in inspector.get_columns("scan_jobs")}
+
+    if "batch_id" not in scan_columns:
+        connection.execute(text("ALTER TABLE scans ADD COLUMN batch_id INTEGER"))
+    if "batch_id" not in job_columns:
+        connection.execute(text("ALTER TABLE scan_jobs ADD COLUMN batch_id INTEGER"))
+    if "host" not in job_columns:
+        connection.execute(text("ALTER TABLE scan_jobs ADD COLUMN host VARCHAR"))
+        # Renseigner l'hôte des jobs existants à partir de l'URL de leur scan
+        rows = connection.execute(text(
+            "SELECT scan_jobs.id, scans.target_url FROM scan_jobs JOIN scans ON scans.id = scan_jobs.scan_id"
+        )).all()
+        updates = [
+            {"job_id": job_id, "host": urlparse(target_url or "").hostname}
+            for job_id, target_url in rows
+        ]
+        if updates:
+            connection.execute(text("UPDATE scan_jobs SET host = :host WHERE id = :job_id"), updates)
+
+    _create_indexes(connection, Scan.__table__, ["ix_scans_batch_id_created_at_id"])
+    _create_indexes(connection, ScanJob.__table__, ["ix_scan_jobs_status_host", "ix_scan_jobs_batch_id_status"])
+
+
+def _add_vulnerability_fingerprints(connection):
+    """Empreinte normalisée des vulnérabilités (doublons entre scanners et d'un scan à l'autre)"""
+    columns = {column["name"] for column in inspect(connection).get_columns("vulnerabilities")}
+    if "fingerprint" not in columns:
+        connection.execute(text("ALTER TABLE vulnerabilities ADD COLUMN fingerprint VARCHAR"))
+
+    # Calculer l'empreinte des vulnérabilités existantes, par tranches
+    last_id = 0
+    while True:
+        rows = connection.execute(text(
+            "SELECT id, vulnerability_type, title, description, evidence FROM vulnerabilities "
+            "WHERE id > :last_id AND fingerprint IS NULL ORDER BY id LIMIT 1000"
+        ), {"last_id": last_id}).all()
+        if not rows:
+            break
+        updates = []
+        for vulnerability_id, vuln_type, title, description, evidence in rows:
+            if isinstance(evidence, str):
+                evidence = json.loads(evidence)
+            updates.append({
+                "vulnerability_id": vulnerability_id,
+                "fingerprint": finding_fingerprint(
+                    vuln_type, title, description, evidence if isinstance(evidence, dict) else None
+                ),
+            })
+        connection.execute(text("UPDATE vulnerabilities SET fingerprint = :fingerprint WHERE id = :vulnerability_id"), updates)
+        last_id = rows[-1][0]
+
+    _create_indexes(connection, Vulnerability.__table__, ["ix_vulnerabilities_fingerprint_scan_id"])
+
+
+def _add_scan_filter_indexes(connection):
+    """Index de pagination des scans filtrés par cible ou par type"""
+    # L'index simple sur target_url est couvert par l'index composite (target_url, created_at, id)
+    if any(index["name"] == "ix_scans_target_url" for index in inspect(connection).get_indexes("scans")):
+        connection.execute(text("DROP INDEX ix_scans_target_url"))
+    _create_indexes(connection, Scan.__table__, [
+        "ix_scans_target_url_created_at_id", "ix_scans_scan_type_created_at_id"
+    ])
+
+
+# (version, description, fonction) - ne jamais renuméroter une migration publiée
+MIGRATIONS = [
+    (1, "Compteurs de sévérité et index de pagination sur scans", _add_scan_severity_counts),
+    (2, "Clé étrangère et index composites sur vulnerabilities", _add_vulnerability_foreign_key_and_indexes),
+    (3, "Table scan_summaries", _backfill_scan_summaries),
+    (4, "Lots de scans et ordonnancement par hôte", _add_batch_scheduling_columns),
+    (5, "Empreinte des vulnérabilités", _add_vulnerability_fingerprints),
+    (6, "Index de pagination des scans par cible et par type", _add_scan_filter_indexes),
+]
+
+
+def run_migrations(engine):
+    """
+    Créer les tables manquantes puis appliquer les migrations en attente,
+    chacune dans sa propre transaction, sous le verrou des migrations
+    """
+    with engine.begin() as connection:
+        _lock_schema(connection)
+        Base.metadata.create_all(bind=connection)
+        _metadata.create_all(bind=connection)
+    with engine.connect() as connection:
+        applied = set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        with engine.begin() as connection:
+            _lock_schema(connection)
+            # Un autre processus a pu appliquer la migration pendant l'attente du verrou
+            if connection.execute(
+                select(schema_migrations.c.version).where(schema_migrations.c.version == version)
+            ).first():
+                continue
+            migrate(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+        print(f"[*] Migration {version} appliquée: {description}")
+
+
+def _lock_schema(connection):
+    """
+    Prendre le verrou des migrations jusqu'à la fin de la transaction
+
+    SQLite : BEGIN IMMEDIATE réserve l'écriture dès le début de la transaction
+    (attente bornée par busy_timeout). PostgreSQL : verrou consultatif libéré
+    au commit.
+    """
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+    elif connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+
+
+def _create_indexes(connection, table, names):
+    """
+    Créer les index nommés d'une table s'ils n'existent pas
+
+    Chaque migration crée uniquement ses propres index : ceux ajoutés plus tard
+    peuvent porter sur des colonnes qui n'existent pas encore à cette étape.
+    """
+    for index in table.indexes:
+        if index.name in names:
+            index.create(connection, checkfirst=True)
+
+
+def _rebuild_sqlite_table(connection, table):
+    """
+    Recréer une table SQLite avec sa définition actuelle (SQLite ne permet pas
+    d'ajouter une contrainte à une table existante)
+    """
+    inspector = inspect(connection)
+    old_columns = {column["name"] for column in inspector.get_columns(table.name)}
+    columns = ", ".join(column.name for column in table.columns if column.name in old_columns)
+    old_name = f"{table.name}_old"
+
+    for index in inspector.get_indexes(table.name):
+        connection.execute(text(f"DROP INDEX {index['name']}"))
+    connection.execute(text(f"ALTER TABLE {table.name} RENAME TO {old_name}"))
+    table.create(connection)
+    connection.execute(text(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old_name}"))
+    connection.execute(text(f"DROP TABLE {old_name}"))
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Workers de scan : exécutent les jobs de la file d'attente dans des processus séparés
+
+Usage : python3 -m api.worker --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import datetime
+
+from api.database import SessionLocal, EndpointFingerprint, Scan, ScanSummary, Vulnerability, SEVERITY_LEVELS, engine, init_db
+from api.job_queue import JOB_LEASE_SECONDS, claim_job, finish_job, renew_lease
+from scanners.scanner_manager import ScannerManager
+
+
+def run_scan(scan_id: int, target_url: str, scan_type: str, lease: "_LeaseKeeper" = None) -> bool:
+    """
+    Exécuter un scan ; retourne True si le scan s'est terminé normalement
+
+    Si le bail du job est perdu (lease), le scan est arrêté sans plus rien
+    écrire : un autre worker a pu le réclamer et le reprendre depuis le début.
+    """
+    db = SessionLocal()
+    scanner_manager = None
+    try:
+        # Mettre à jour le statut
+        scan = db.query(Scan).filter(Scan.id == scan_id).first()
+        if not scan:
+            return False
+
+        if scan.status == "running":
+            # Reprise après l'arrêt d'un worker : repartir d'une base propre
+            db.query(Vulnerability).filter(Vulnerability.scan_id == scan_id).delete()
+            db.query(ScanSummary).filter(ScanSummary.scan_id == scan_id).delete()
+            db.query(EndpointFingerprint).filter(EndpointFingerprint.scan_id == scan_id).delete()
+            for severity in SEVERITY_LEVELS:
+                setattr(scan, f"{severity}_count", 0)
+
+        scan.status = "running"
+        db.commit()
+
+        # Initialiser le gestionnaire de scanners
+        scanner_manager = ScannerManager(db, scan_id)
+        if lease is not None:
+            lease.on_lost(scanner_manager.stop)
+
+        # Exécuter les scans selon le type
+        if scan_type == "quick":
+            scanner_manager.run_quick_scan(target_url)
+        elif scan_type == "full":
+            scanner_manager.run_full_scan(target_url)
+        elif scan_type == "incremental":
+            scanner_manager.run_full_scan(target_url, incremental=True)
+        else:
+            scanner_manager.run_full_scan(target_url)
+
+        if lease is not None and lease.lost.is_set():
+            print(f"[!] Scan {scan_id} abandonné : bail perdu, le statut appartient au worker qui l'a repris")
+            return False
+
+        # Toutes les vulnérabilités doivent être écrites avant de marquer le scan terminé
+        scanner_manager.findings.flush()
+
+        # Mettre à jour le statut
+        scan.status = "completed"
+        scan.completed_at = datetime.utcnow()
+        db.commit()
+        return True
+
+    except Exception as e:
+        # En cas d'erreur
+        db.rollback()
+        if lease is not None and lease.lost.is_set():
+            print(f"Erreur lors du scan {scan_id} (bail perdu): {str(e)}")
+            return False
+        scan = db.query(Scan).filter(Scan.id == scan_id).first()
+        if scan:
+            scan.status = "failed"
+            db.commit()
+        print(f"Erreur lors du scan {scan_id}: {str(e)}")
+        return False
+    finally:
+        if scanner_manager:
+            scanner_manager.close()
+        db.close()
+
+
+class _LeaseKeeper(threading.Thread):
+    def __init__(self, job_id: int, worker_id: str, lease_seconds: int):
+        """
+        Renouveler le bail d'un job tant que le scan est en cours
+
+        Le bail est perdu quand le renouvellement est refusé (job réclamé par un
+        autre worker) ou quand aucun renouvellement n'a réussi pendant toute sa
+        durée ; les fonctions enregistrées avec on_lost sont alors appelées.
+        """
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.stopped = threading.Event()
+        self.lost = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def on_lost(self, callback):
+        """Appeler callback à la perte du bail (immédiatement s'il est déjà perdu)"""
+        with self._lock:
+            if not self.lost.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def run(self):
+        renewed_at = time.monotonic()
+        while not self.stopped.wait(self.lease_seconds / 3):
+            db = SessionLocal()
+            try:
+                if not renew_lease(db, self.job_id, self.worker_id, self.lease_seconds):
+                    print(f"[!] Bail perdu pour le job {self.job_id}")
+                    self._lose()
+                    return
+                renewed_at = time.monotonic()
+            except Exception as e:
+                print(f"Erreur lors du renouvellement du bail du job {self.job_id}: {e}")
+                if time.monotonic() - renewed_at >= self.lease_seconds:
+                    print(f"[!] Bail expiré pour le job {self.job_id}")
+                    self._lose()
+                    return
+            finally:
+                db.close()
+
+    def _lose(self):
+        with self._lock:
+            self.lost.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Erreur lors de l'arrêt du job {self.job_id}: {e}")
+
+
+def worker_loop(worker_id: str, poll_interval: float, lease_seconds: int, stop_event=None):
+    """Boucle d'un worker : réclamer un job, exécuter le scan, recommencer"""
+    print(f"[*] Worker {worker_id} démarré")
+    while not (stop_event and stop_event.is_set()):
+        db = SessionLocal()
+        try:
+            job = claim_job(db, worker_id, lease_seconds)
+            if job:
+                job_id, scan_id, attempt = job.id, job.scan_id, job.attempts
+                scan = db.query(Scan).filter(Scan.id == scan_id).first()
+                target = (scan.target_url, scan.scan_type) if scan else None
+        except Exception as e:
+            print(f"Erreur lors de la réclamation d'un job: {e}")
+            job = None
+        finally:
+            db.close()
+
+        if not job:
+            if stop_event:
+                stop_event.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+            continue
+
+        print(f"[*] Worker {worker_id} : job {job_id} (scan {scan_id}, tentative {attempt})")
+        lease_keeper = _LeaseKeeper(job_id, worker_id, lease_seconds)
+        lease_keeper.start()
+        error = None
+        try:
+            success = run_scan(scan_id, *target, lease=lease_keeper) if target else False
+            if not target:
+                error = "Scan introuvable"
+        except Exception as e:
+            success, error = False, str(e)
+        finally:
+            lease_keeper.stopped.set()
+
+        db = SessionLocal()
+        try:
+            finish_job(db, job_id, worker_id, success, error, lease_lost=lease_keeper.lost.is_set())
+        finally:
+            db.close()
+    print(f"[*] Worker {worker_id} arrêté")
+
+
+def _worker_process(index: int, poll_interval: float, lease_seconds: int):
+    """Point d'entrée d'un processus worker"""
+    # Ne pas réutiliser les connexions DB héritées du processus parent
+    engine.dispose(close=False)
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{index}"
+    worker_loop(worker_id, poll_interval, lease_seconds, stop_event)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Workers de scan de vulnérabilités")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKER_COUNT", "2")),
+                        help="Nombre de processus workers")
+    parser.add_argument("--poll-interval", type=float, default=float(os.getenv("WORKER_POLL_INTERVAL", "2")),
+                        help="Intervalle (secondes) entre deux consultations de la file vide")
+    parser.add_argument("--lease", type=int, default=JOB_LEASE_SECONDS,
+                        help="Durée (secondes) du bail d'un job")
+    args = parser.parse_args()
+
+    init_db()
+    processes = []
+    for index in range(args.workers):
+        process = multiprocessing.Process(
+            target=_worker_process,
+            args=(index, args.poll_interval, args.lease),
+            name=f"scan-worker-{index}",
+        )
+        process.start()
+        processes.append(process)
+
+    def _stop(signum, frame):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
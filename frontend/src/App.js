@@ -7,8 +7,35 @@ import ScanDetail from './components/ScanDetail';
 // URL de l'API - utilise le proxy en développement ou l'URL complète
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 
+// Pagination de la liste des scans (curseur renvoyé dans l'en-tête X-Next-Cursor)
+const PAGE_SIZE = 50;
+const MAX_PAGE_SIZE = 200;
+
+const fetchScanPage = async (cursor, limit) => {
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (cursor) {
+    params.set('cursor', cursor);
+  }
+  const response = await fetch(`${API_URL}/api/scans?${params}`, {
+    method: 'GET',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+  });
+
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+
+  return {
+    scans: await response.json(),
+    nextCursor: response.headers.get('X-Next-Cursor'),
+  };
+};
+
 function App() {
   const [scans, setScans] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [selectedScan, setSelectedScan] = useState(null);
   const [loading, setLoading] = useState(false);
   const [apiAvailable, setApiAvailable] = useState(true);
@@ -19,19 +46,18 @@ function App() {
 
   const fetchScans = async () => {
     try {
-      const response = await fetch(`${API_URL}/api/scans`, {
-        method: 'GET',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-      });
-      
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
-      }
-      
-      const data = await response.json();
-      setScans(data);
+      // Recharger au moins autant de scans que ceux déjà affichés (pages chargées avec "Charger plus")
+      const wanted = Math.max(PAGE_SIZE, scans.length);
+      let loaded = [];
+      let cursor = null;
+      do {
+        const page = await fetchScanPage(cursor, Math.min(MAX_PAGE_SIZE, wanted - loaded.length));
+        loaded = loaded.concat(page.scans);
+        cursor = page.nextCursor;
+      } while (cursor && loaded.length < wanted);
+
+      setScans(loaded);
+      setNextCursor(cursor);
       setApiAvailable(true);
     } catch (error) {
       // Ne logger l'erreur qu'une seule fois pour éviter le spam dans la console
@@ -43,6 +69,23 @@ function App() {
     }
   };
 
+  const loadMoreScans = async () => {
+    if (!nextCursor) {
+      return;
+    }
+    try {
+      const page = await fetchScanPage(nextCursor, PAGE_SIZE);
+      setScans((previous) => {
+        const known = new Set(previous.map((scan) => scan.id));
+        return [...previous, ...page.scans.filter((scan) => !known.has(scan.id))];
+      });
+      setNextCursor(page.nextCursor);
+      setApiAvailable(true);
+    } catch (error) {
+      setApiAvailable(false);
+    }
+  };
+
   const handleScanCreated = (newScan) => {
     setScans([newScan, ...scans]);
     setSelectedScan(newScan);
@@ -79,6 +122,8 @@ function App() {
               scans={scans} 
               onScanSelect={handleScanSelect} 
               onRefresh={fetchScans}
+              hasMore={Boolean(nextCursor)}
+              onLoadMore={loadMoreScans}
               apiAvailable={apiAvailable}
             />
           </>
@@ -2,7 +2,15 @@ import React, { useState, useEffect } from 'react';
 import './ScanList.css';
 import axios from 'axios';
 
-function ScanList({ scans, onScanSelect, onRefresh, apiAvailable }) {
+const SEVERITIES = [
+  { key: 'critical', label: 'Critique' },
+  { key: 'high', label: 'Élevé' },
+  { key: 'medium', label: 'Moyen' },
+  { key: 'low', label: 'Faible' },
+  { key: 'info', label: 'Info' },
+];
+
+function ScanList({ scans, onScanSelect, onRefresh, hasMore, onLoadMore, apiAvailable }) {
   const [loading, setLoading] = useState(false);
 
   useEffect(() => {
@@ -86,10 +94,25 @@ function ScanList({ scans, onScanSelect, onRefresh, apiAvailable }) {
                   </p>
                 )}
               </div>
+              <div className="scan-card-counts">
+                {SEVERITIES.map(({ key, label }) => (
+                  <span key={key} className={`count-badge count-${key}`}>
+                    {label}: {scan[`${key}_count`] || 0}
+                  </span>
+                ))}
+              </div>
             </div>
           ))}
         </div>
       )}
+
+      {hasMore && (
+        <div className="load-more">
+          <button onClick={onLoadMore} className="refresh-button">
+            Charger plus
+          </button>
+        </div>
+      )}
     </div>
   );
 }
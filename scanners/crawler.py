@@ -0,0 +1,185 @@
+import hashlib
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urljoin, urlparse
+from scanners.response_cache import ResponseCache
+from scanners.forms import endpoint_key
+
+# Chemins jamais visités : déconnexion et ressources statiques
+DEFAULT_EXCLUDE = (
+    r"log-?out|sign-?out|deconnexion|"
+    r"\.(?:png|jpe?g|gif|svg|ico|bmp|webp|css|js|map|pdf|zip|gz|tar|rar|7z|"
+    r"woff2?|ttf|eot|mp3|mp4|avi|mov|webm|exe|dmg|iso)$"
+)
+
+# Balises et attributs contenant des liens à suivre
+_LINK_ATTRIBUTES = {'a': 'href', 'area': 'href', 'frame': 'src', 'iframe': 'src'}
+
+class URLSeenSet:
+    """
+    Ensemble compact des endpoints déjà rencontrés
+
+    Chaque endpoint est réduit à une empreinte blake2b de 8 octets (un entier) :
+    la mémoire reste faible même pour des dizaines de milliers d'URLs.
+    """
+
+    def __init__(self):
+        self._digests = set()
+        self._lock = threading.Lock()
+
+    def add(self, url: str) -> bool:
+        """Ajouter un endpoint ; True s'il n'avait pas encore été vu"""
+        digest = int.from_bytes(
+            hashlib.blake2b(endpoint_key(url).encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'big'
+        )
+        with self._lock:
+            if digest in self._digests:
+                return False
+            self._digests.add(digest)
+            return True
+
+    def __len__(self):
+        return len(self._digests)
+
+
+class CrawledPage:
+    def __init__(self, url: str, depth: int, response, links: list):
+        """
+        Page découverte par le crawler
+
+        Args:
+            url: URL demandée (clé de la réponse dans le cache du scan)
+            depth: Profondeur depuis l'URL de départ
+            response: Réponse partagée (CachedResponse)
+            links: Liens dans le périmètre trouvés sur la page
+        """
+        self.url = url
+        self.depth = depth
+        self.response = response
+        self.links = links
+
+    @property
+    def injectable(self) -> bool:
+        """La page expose des paramètres ou des champs de saisie à tester"""
+        inputs = self.response.inputs
+        return bool(urlparse(self.url).query) or bool(inputs.forms) or bool(inputs.search_fields)
+
+
+class Crawler:
+    def __init__(self, cache: ResponseCache, max_depth: int = None, max_pages: int = None,
+                 concurrency: int = None, exclude: str = None):
+        """
+        Crawler en largeur limité au site cible
+
+        Les pages sont téléchargées en parallèle via le cache de réponses du scan
+        (les scanners réutilisent donc la page et son document parsé) et transmises
+        une par une dès leur réception, sans attendre la fin du parcours.
+
+        Args:
+            cache: Cache des réponses du scan
+            max_depth: Profondeur maximale depuis l'URL de départ (CRAWL_MAX_DEPTH, défaut 2)
+            max_pages: Nombre maximal de pages téléchargées (CRAWL_MAX_PAGES, défaut 50)
+            concurrency: Téléchargements simultanés (CRAWL_CONCURRENCY, défaut 8)
+            exclude: Expression des chemins ignorés (CRAWL_EXCLUDE, défaut DEFAULT_EXCLUDE)
+        """
+        self.cache = cache
+        self.max_depth = max_depth if max_depth is not None else int(os.getenv('CRAWL_MAX_DEPTH', '2'))
+        self.max_pages = max_pages or int(os.getenv('CRAWL_MAX_PAGES', '50'))
+        self.concurrency = concurrency or int(os.getenv('CRAWL_CONCURRENCY', '8'))
+        self.exclude = re.compile(exclude or os.getenv('CRAWL_EXCLUDE', DEFAULT_EXCLUDE), re.IGNORECASE)
+
+    def crawl(self, start_url: str, on_page=None):
+        """
+        Parcourir le site à partir d'une URL
+
+        Périmètre : même schéma, hôte et port que l'URL de départ, chemins situés
+        sous son répertoire, hors chemins exclus.
+
+        Args:
+            start_url: URL de départ
+            on_page: Fonction appelée avec chaque CrawledPage dès sa réception
+
+        Returns:
+            Liste des pages parcourues
+        """
+        # Le périmètre suit une éventuelle redirection de l'URL de départ (ex. http -> https)
+        try:
+            start = urlparse(self.cache.fetch(start_url).url)
+        except Exception:
+            start = urlparse(start_url)
+        scope = (start.scheme.lower(), start.netloc.lower(), start.path[:start.path.rfind('/') + 1] or '/')
+        seen = URLSeenSet()
+        seen.add(start_url)
+        frontier = deque([(start_url, 0)])
+        pages = []
+        submitted = 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='crawler') as pool:
+            pending = {}
+            while frontier or pending:
+                # Remplir les emplacements libres dans l'ordre de la file (parcours en largeur)
+                while frontier and len(pending) < self.concurrency and submitted < self.max_pages:
+                    url, depth = frontier.popleft()
+                    pending[pool.submit(self._fetch, url, depth, scope)] = url
+                    submitted += 1
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.pop(future)
+                    page = future.result()
+                    if page is None:
+                        continue
+                    pages.append(page)
+                    if page.depth < self.max_depth:
+                        for link in page.links:
+                            if seen.add(link):
+                                frontier.append((link, page.depth + 1))
+                    if on_page:
+                        try:
+                            on_page(page)
+                        except Exception as e:
+                            print(f"Erreur lors du traitement de la page {page.url}: {e}")
+
+        print(f"[*] Crawl de {start_url}: {len(pages)} pages, {len(seen)} endpoints découverts")
+        return pages
+
+    def _fetch(self, url: str, depth: int, scope: tuple):
+        """Télécharger une page et extraire ses liens (thread du pool) ; None si la page est inexploitable"""
+        try:
+            response = self.cache.fetch(url)
+        except Exception as e:
+            print(f"[!] Page inaccessible pendant le crawl {url}: {e}")
+            return None
+
+        if response.status_code >= 400 or 'html' not in response.headers.get('Content-Type', 'text/html'):
+            return None
+        # Une redirection hors du périmètre n'est pas suivie
+        if not self._in_scope(response.url, scope):
+            return None
+
+        links = []
+        tree = response.tree
+        for tag in (tree.iter(*_LINK_ATTRIBUTES) if tree is not None else ()):
+            href = (tag.get(_LINK_ATTRIBUTES[tag.tag]) or '').strip()
+            if not href or href.startswith('#'):
+                continue
+            link = urljoin(response.url, href).split('#', 1)[0]
+            if self._in_scope(link, scope):
+                links.append(link)
+        return CrawledPage(url, depth, response, links)
+
+    def _in_scope(self, url: str, scope: tuple) -> bool:
+        """L'URL appartient au site et au répertoire de départ et n'est pas exclue"""
+        parsed = urlparse(url)
+        scheme, netloc, path_prefix = scope
+        return (
+            parsed.scheme.lower() == scheme
+            and parsed.netloc.lower() == netloc
+            and (parsed.path or '/').startswith(path_prefix)
+            and not self.exclude.search(parsed.path)
+        )
@@ -0,0 +1,260 @@
+"""
+Base locale de vulnérabilités (CVE) par produit et version
+
+Le flux source est un fichier JSON hors ligne au format OSV simplifié :
+
+    [{"id": "CVE-...", "summary": "...",
+      "affected": [{"package": {"name": "apache"},
+                    "ranges": [{"events": [{"introduced": "2.4.0"}, {"fixed": "2.4.56"}]}],
+                    "versions": ["2.4.49"]}],
+      "database_specific": {"severity": "critical", "cvss_score": 9.8}}]
+
+Il est normalisé en intervalles de versions dans un index SQLite (reconstruit
+automatiquement quand le flux change). Au chargement, chaque produit est
+découpé en segments élémentaires triés : une version est résolue vers toutes
+ses CVE par recherche dichotomique, sans accès réseau.
+
+Reconstruction manuelle de l'index :
+
+    python3 -m scanners.cve_database --feed data/cve_feed.json --index /tmp/cve_index.sqlite
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from bisect import bisect_right
+from functools import lru_cache
+
+DEFAULT_FEED_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "cve_feed.json"
+)
+
+# Borne supérieure des intervalles ouverts
+_UNBOUNDED = ((float("inf"),), 0)
+
+
+@lru_cache(maxsize=4096)
+def version_tuple(version: str) -> tuple:
+    """'2.4.49' -> (2, 4, 49) ; les zéros finaux sont ignorés (2.4 == 2.4.0)"""
+    parts = [int(part) for part in re.findall(r"\d+", version or "")]
+    while parts and parts[-1] == 0:
+        parts.pop()
+    return tuple(parts)
+
+
+def _bounds(lower: str, upper: str, upper_inclusive: bool):
+    """Clés de tri [début, fin) d'un intervalle de versions"""
+    start = (version_tuple(lower), 0)
+    if upper is None:
+        return start, _UNBOUNDED
+    return start, (version_tuple(upper), 1 if upper_inclusive else 0)
+
+
+def _normalize_ranges(affected: dict):
+    """Intervalles (début, fin, fin incluse) d'une entrée 'affected' du flux"""
+    intervals = []
+    for version_range in affected.get("ranges", []):
+        introduced = None
+        for event in version_range.get("events", []):
+            if "introduced" in event:
+                introduced = event["introduced"]
+            elif "fixed" in event and introduced is not None:
+                intervals.append((introduced, event["fixed"], 0))
+                introduced = None
+            elif "last_affected" in event and introduced is not None:
+                intervals.append((introduced, event["last_affected"], 1))
+                introduced = None
+        if introduced is not None:
+            intervals.append((introduced, None, 0))
+    for version in affected.get("versions", []):
+        intervals.append((version, version, 1))
+    return intervals
+
+
+def build_index(feed_path: str, index_path: str):
+    """
+    Construire l'index SQLite à partir du flux JSON
+
+    Returns:
+        Nombre d'intervalles indexés
+    """
+    with open(feed_path, "rb") as feed_file:
+        raw = feed_file.read()
+    entries = json.loads(raw)
+
+    directory = os.path.dirname(os.path.abspath(index_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+
+    count = 0
+    try:
+        connection = sqlite3.connect(temp_path)
+        with connection:
+            connection.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            connection.execute(
+                "CREATE TABLE advisories (id TEXT PRIMARY KEY, summary TEXT, severity TEXT, cvss_score REAL)"
+            )
+            connection.execute(
+                "CREATE TABLE ranges (product TEXT, advisory_id TEXT, introduced TEXT, "
+                "upper TEXT, upper_inclusive INTEGER)"
+            )
+            for entry in entries:
+                specific = entry.get("database_specific", {})
+                connection.execute(
+                    "INSERT OR REPLACE INTO advisories VALUES (?, ?, ?, ?)",
+                    (entry["id"], entry.get("summary", ""), specific.get("severity", "medium"),
+                     float(specific.get("cvss_score", 5.0)))
+                )
+                for affected in entry.get("affected", []):
+                    product = affected.get("package", {}).get("name", "").lower()
+                    for introduced, upper, upper_inclusive in _normalize_ranges(affected):
+                        connection.execute(
+                            "INSERT INTO ranges VALUES (?, ?, ?, ?, ?)",
+                            (product, entry["id"], introduced, upper, upper_inclusive)
+                        )
+                        count += 1
+            connection.execute("CREATE INDEX ix_ranges_product ON ranges (product)")
+            connection.execute(
+                "INSERT INTO meta VALUES ('feed_sha1', ?)", (hashlib.sha1(raw).hexdigest(),)
+            )
+        connection.close()
+        os.replace(temp_path, index_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return count
+
+
+class CVEDatabase:
+    def __init__(self, feed_path: str = None, index_path: str = None):
+        """
+        Index des CVE chargé en mémoire
+
+        Args:
+            feed_path: Flux JSON source (CVE_FEED_PATH, défaut data/cve_feed.json)
+            index_path: Index SQLite (CVE_INDEX_PATH, défaut <tmp>/vuln_scanner_cve_index.sqlite)
+        """
+        self.feed_path = feed_path or os.getenv("CVE_FEED_PATH", DEFAULT_FEED_PATH)
+        self.index_path = index_path or os.getenv(
+            "CVE_INDEX_PATH",
+            os.path.join(tempfile.gettempdir(), "vuln_scanner_cve_index.sqlite")
+        )
+        self.advisories = {}
+        # Par produit : (bornes triées des segments, CVE couvrant chaque segment)
+        self._segments = {}
+        self._load()
+
+    def _index_is_current(self) -> bool:
+        """L'index existe et correspond au flux actuel"""
+        if not os.path.exists(self.index_path):
+            return False
+        if not os.path.exists(self.feed_path):
+            return True
+        with open(self.feed_path, "rb") as feed_file:
+            feed_sha1 = hashlib.sha1(feed_file.read()).hexdigest()
+        try:
+            connection = sqlite3.connect(self.index_path)
+            try:
+                row = connection.execute("SELECT value FROM meta WHERE key = 'feed_sha1'").fetchone()
+            finally:
+                connection.close()
+        except sqlite3.Error:
+            return False
+        return row is not None and row[0] == feed_sha1
+
+    def _load(self):
+        """Charger l'index (reconstruit si absent ou périmé) et découper les produits en segments"""
+        if not self._index_is_current():
+            if not os.path.exists(self.feed_path):
+                print(f"[!] Flux CVE introuvable: {self.feed_path}")
+                return
+            count = build_index(self.feed_path, self.index_path)
+            print(f"[*] Index CVE construit: {count} intervalles ({self.index_path})")
+
+        connection = sqlite3.connect(self.index_path)
+        try:
+            for advisory_id, summary, severity, cvss_score in connection.execute(
+                "SELECT id, summary, severity, cvss_score FROM advisories"
+            ):
+                self.advisories[advisory_id] = {
+                    'id': advisory_id,
+                    'summary': summary,
+                    'severity': severity,
+                    'cvss_score': cvss_score
+                }
+
+            intervals = {}
+            for product, advisory_id, introduced, upper, upper_inclusive in connection.execute(
+                "SELECT product, advisory_id, introduced, upper, upper_inclusive FROM ranges"
+            ):
+                start, end = _bounds(introduced, upper, bool(upper_inclusive))
+                if start < end:
+                    intervals.setdefault(product, []).append((start, end, advisory_id))
+        finally:
+            connection.close()
+
+        for product, product_intervals in intervals.items():
+            self._segments[product] = self._build_segments(product_intervals)
+
+    def _build_segments(self, intervals):
+        """
+        Segments élémentaires d'un produit : entre deux bornes consécutives,
+        l'ensemble des CVE applicables est constant
+        """
+        boundaries = sorted({bound for start, end, _ in intervals for bound in (start, end)})
+        positions = {bound: position for position, bound in enumerate(boundaries)}
+        covering = [set() for _ in boundaries]
+        for start, end, advisory_id in intervals:
+            for position in range(positions[start], positions[end]):
+                covering[position].add(advisory_id)
+        return boundaries, [tuple(sorted(advisory_ids)) for advisory_ids in covering]
+
+    def lookup(self, product: str, version: str) -> list:
+        """
+        Toutes les CVE affectant une version d'un produit
+
+        Returns:
+            Liste de dictionnaires {'id', 'summary', 'severity', 'cvss_score'}
+        """
+        segments = self._segments.get((product or "").lower())
+        parsed = version_tuple(version)
+        if not segments or not parsed:
+            return []
+        boundaries, covering = segments
+        position = bisect_right(boundaries, (parsed, 0)) - 1
+        if position < 0:
+            return []
+        return [self.advisories[advisory_id] for advisory_id in covering[position]]
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_cve_database() -> CVEDatabase:
+    """Base CVE partagée par les scans (chargée au premier appel)"""
+    global _database
+    with _database_lock:
+        if _database is None:
+            _database = CVEDatabase()
+    return _database
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construire l'index CVE local à partir d'un flux JSON")
+    parser.add_argument("--feed", default=os.getenv("CVE_FEED_PATH", DEFAULT_FEED_PATH))
+    parser.add_argument("--index", default=os.getenv(
+        "CVE_INDEX_PATH", os.path.join(tempfile.gettempdir(), "vuln_scanner_cve_index.sqlite")
+    ))
+    args = parser.parse_args()
+    count = build_index(args.feed, args.index)
+    print(f"[*] Index CVE construit: {count} intervalles ({args.index})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import hashlib
+from sqlalchemy import exists
+from sqlalchemy.orm import Session
+from api.database import EndpointFingerprint, Scan, Vulnerability
+from scanners.forms import endpoint_key
+
+# Types de vulnérabilités rattachés à un endpoint (reportés si la page n'a pas changé)
+INJECTION_TYPES = ("xss", "sqli")
+
+# Types pouvant porter un endpoint : une XSS/SQLi fusionnée dans l'alerte ZAP
+# équivalente écrite avant elle garde le type de l'alerte (voir FindingsWriter)
+CARRIED_TYPES = INJECTION_TYPES + ("zap",)
+
+
+def _digest(data: bytes, size: int) -> str:
+    return hashlib.blake2b(data, digest_size=size).hexdigest()
+
+
+def fingerprint_page(page) -> dict:
+    """
+    Empreinte d'une page crawlée : validateurs HTTP, hash du corps et
+    signature de ses formulaires (méthode, action résolue, noms des champs)
+    """
+    response = page.response
+    signatures = sorted(form.signature for form in response.forms)
+    return {
+        'endpoint': endpoint_key(page.url),
+        'url': page.url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'body_hash': _digest(response.text.encode('utf-8', 'surrogatepass'), 16),
+        'input_signature': _digest(repr(signatures).encode('utf-8', 'surrogatepass'), 8),
+    }
+
+
+def is_unchanged(current: dict, previous: dict) -> bool:
+    """
+    La page est-elle identique à celle du scan précédent ?
+
+    Les champs testables doivent être les mêmes et le contenu est comparé par
+    son hash. L'ETag / Last-Modified ne servent que si l'un des hash manque :
+    certains serveurs renvoient des validateurs fixes pour des pages
+    dynamiques, un corps modifié est donc toujours considéré comme changé.
+    """
+    if previous is None or current['input_signature'] != previous['input_signature']:
+        return False
+    if current['body_hash'] and previous['body_hash']:
+        return current['body_hash'] == previous['body_hash']
+    if current['etag'] and current['etag'] == previous['etag']:
+        return True
+    return bool(current['last_modified']) and current['last_modified'] == previous['last_modified']
+
+
+class PreviousScan:
+    def __init__(self, db: Session, scan_id: int, target_url: str):
+        """
+        Empreintes et vulnérabilités XSS/SQLi du dernier scan terminé de la même cible
+
+        Args:
+            db: Session SQLAlchemy du scan
+            scan_id: Scan en cours (exclu de la recherche)
+            target_url: URL cible
+        """
+        self.scan_id = db.query(Scan.id).filter(
+            Scan.target_url == target_url,
+            Scan.status == "completed",
+            Scan.id != scan_id,
+            exists().where(EndpointFingerprint.scan_id == Scan.id)
+        ).order_by(Scan.id.desc()).limit(1).scalar()
+
+        self.fingerprints = {}
+        self.findings = {}
+        if self.scan_id is None:
+            return
+
+        for fingerprint in db.query(EndpointFingerprint).filter(EndpointFingerprint.scan_id == self.scan_id):
+            self.fingerprints[fingerprint.endpoint] = {
+                'etag': fingerprint.etag,
+                'last_modified': fingerprint.last_modified,
+                'body_hash': fingerprint.body_hash,
+                'input_signature': fingerprint.input_signature,
+            }
+
+        for vulnerability in db.query(Vulnerability).filter(
+            Vulnerability.scan_id == self.scan_id,
+            Vulnerability.vulnerability_type.in_(CARRIED_TYPES)
+        ):
+            endpoint = (vulnerability.evidence or {}).get('endpoint')
+            if endpoint:
+                # Copie détachée de la session (les commits du scan expirent les objets chargés)
+                self.findings.setdefault(endpoint, []).append({
+                    'title': vulnerability.title,
+                    'description': vulnerability.description,
+                    'severity': vulnerability.severity,
+                    'cvss_score': vulnerability.cvss_score,
+                    'vuln_type': vulnerability.vulnerability_type,
+                    'recommendation': vulnerability.recommendation,
+                    'evidence': dict(vulnerability.evidence),
+                })
+
+    def unchanged(self, fingerprint: dict) -> bool:
+        """La page a la même empreinte qu'au scan précédent"""
+        return is_unchanged(fingerprint, self.fingerprints.get(fingerprint['endpoint']))
@@ -0,0 +1,317 @@
+import hashlib
+import os
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlparse
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+from api.database import EndpointFingerprint, Scan, ScanSummary, Vulnerability, RISK_WEIGHTS, SEVERITY_LEVELS
+from reports.report_cache import ReportCache
+
+# CWE des vulnérabilités détectées par les scanners intégrés : une alerte ZAP de
+# même CWE est la même faille (seules ces CWE servent à rapprocher des scanners)
+SCANNER_CWE = {"xss": 79, "sqli": 89}
+_SCANNER_CWE_IDS = frozenset(str(cwe) for cwe in SCANNER_CWE.values())
+
+# Rang des sévérités, de la plus faible à la plus grave
+_SEVERITY_RANK = {severity: rank for rank, severity in enumerate(reversed(SEVERITY_LEVELS))}
+
+# Champs de preuve distinguant deux vulnérabilités de même nature sur un même chemin
+_DISCRIMINATORS = ("parameter", "form_field", "cve", "osvdb_id")
+
+
+def finding_fingerprint(vuln_type: str, title: str, description: str, evidence: dict = None) -> str:
+    """
+    Empreinte normalisée d'une vulnérabilité : nature, chemin de l'URL et paramètre
+
+    La nature est le type et le titre normalisé (nom de l'alerte ZAP, ...), sauf
+    pour les XSS et SQLi : leur CWE rapproche les scanners intégrés des alertes
+    ZAP équivalentes. Une même faille a la même empreinte dans un scan comme
+    d'un scan à l'autre ; deux alertes distinctes de même CWE restent distinctes.
+    """
+    evidence = evidence or {}
+    cwe = str(evidence.get("cweid") or SCANNER_CWE.get(vuln_type) or "").strip()
+    if cwe in _SCANNER_CWE_IDS:
+        kind = f"cwe-{cwe}"
+    else:
+        kind = f"{vuln_type}:{' '.join(str(title or '').lower().split())}"
+
+    url = evidence.get("url") or evidence.get("form_action") or evidence.get("path") or ""
+    path = (urlparse(str(url)).path or "/").rstrip("/") or "/"
+
+    discriminator = next((str(evidence[key]) for key in _DISCRIMINATORS if evidence.get(key)), "")
+    if not discriminator and not kind.startswith("cwe-"):
+        # Sans CWE ni paramètre, le message distingue les vulnérabilités d'un même chemin (Nikto, ...)
+        discriminator = description or ""
+
+    key = "\x1f".join((kind, path, discriminator.lower()))
+    return hashlib.blake2b(key.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+class FindingsWriter:
+    def __init__(self, db: Session, scan_id: int, batch_size: int = None, flush_interval: float = None):
+        """
+        Écriture groupée des vulnérabilités d'un scan
+
+        Les vulnérabilités sont mises en tampon puis insérées en une seule
+        transaction quand le tampon atteint batch_size lignes, toutes les
+        flush_interval secondes (thread d'écriture périodique, même si aucun
+        scanner ne signale plus rien), à la fin de chaque scanner et à la
+        fermeture du scan (même en échec). Les écritures passent par une session
+        propre à l'écriture groupée, sur la même base que la session du scan :
+        le thread périodique ne partage pas la session du thread principal.
+        Les compteurs par sévérité du scan et son résumé (scan_summaries) sont
+        mis à jour dans la même transaction, et les rapports en cache du scan
+        sont supprimés après chaque écriture. Les empreintes des pages crawlées
+        sont écrites dans les mêmes transactions.
+
+        Les doublons (même empreinte, voir finding_fingerprint) sont fusionnés à
+        leur arrivée : la première vulnérabilité est conservée avec la sévérité
+        et le score CVSS les plus élevés signalés, et ses preuves listent tous
+        les scanners l'ayant signalée (evidence['sources']). La page crawlée d'un
+        doublon XSS/SQLi (evidence['endpoint']) est reportée sur la vulnérabilité
+        fusionnée, pour qu'un scan incrémental la reprenne si la page n'a pas
+        changé. Une fois écrite, seules sa sévérité, son score, ses sources et sa
+        page restent en mémoire : la mémoire du scan ne croît pas avec les
+        descriptions et preuves.
+
+        Args:
+            db: Session SQLAlchemy du scan (sa connexion sert à ouvrir la session d'écriture)
+            scan_id: Identifiant du scan
+            batch_size: Taille maximale du tampon (FINDINGS_BATCH_SIZE, défaut 200)
+            flush_interval: Délai maximal en secondes avant écriture (FINDINGS_FLUSH_INTERVAL, défaut 2)
+        """
+        self.db = Session(bind=db.get_bind())
+        self.scan_id = scan_id
+        self.batch_size = batch_size or int(os.getenv('FINDINGS_BATCH_SIZE', '200'))
+        self.flush_interval = flush_interval or float(os.getenv('FINDINGS_FLUSH_INTERVAL', '2'))
+        self._buffer = []
+        self._endpoint_fingerprints = []
+        # Vulnérabilités du tampon par empreinte
+        self._pending = {}
+        # Vulnérabilités déjà écrites par empreinte : sévérité, CVSS, sources, page et sévérité en base
+        self._written = {}
+        self._merged = set()
+        # Écriture abandonnée (bail du job perdu : le scan est repris par un autre worker)
+        self._discarded = False
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.report_cache = ReportCache()
+        # Écriture périodique : une vulnérabilité isolée n'attend pas la fin d'un scanner lent
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, name=f'findings-{scan_id}', daemon=True)
+        self._flusher.start()
+
+    def add(self, title: str, description: str, severity: str, cvss_score: float,
+            vuln_type: str, recommendation: str, evidence: dict = None):
+        """Ajouter une vulnérabilité au tampon, ou la fusionner avec un doublon déjà signalé"""
+        fingerprint = finding_fingerprint(vuln_type, title, description, evidence)
+        source = {'scanner': vuln_type, 'title': title, 'severity': severity}
+        endpoint = (evidence or {}).get('endpoint')
+        if endpoint:
+            source['endpoint'] = endpoint
+        with self._lock:
+            if self._discarded:
+                return
+            row = self._pending.get(fingerprint)
+            if row is not None:
+                self._merge(row, row['evidence'], source, severity, cvss_score)
+                return
+            written = self._written.get(fingerprint)
+            if written is not None:
+                if self._merge(written, written, source, severity, cvss_score):
+                    # Déjà insérée : ligne mise à jour au prochain flush
+                    self._merged.add(fingerprint)
+                return
+
+            # Une vulnérabilité reprise d'un scan précédent conserve ses sources
+            sources = list((evidence or {}).get('sources') or [])
+            if source not in sources:
+                sources.append(source)
+            row = {
+                'scan_id': self.scan_id,
+                'title': title,
+                'description': description,
+                'severity': severity,
+                'cvss_score': cvss_score,
+                'vulnerability_type': vuln_type,
+                'recommendation': recommendation,
+                'evidence': dict(evidence or {}, sources=sources),
+                'fingerprint': fingerprint
+            }
+            self._pending[fingerprint] = row
+            self._buffer.append(row)
+            due = (len(self._buffer) >= self.batch_size
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    @staticmethod
+    def _merge(row: dict, evidence: dict, source: dict, severity: str, cvss_score: float) -> bool:
+        """
+        Fusionner un doublon dans une vulnérabilité : source ajoutée, page
+        reportée, sévérité et CVSS maximaux
+
+        evidence porte les sources et la page (preuves de la ligne en attente,
+        ou état mémorisé d'une vulnérabilité déjà écrite).
+        """
+        changed = False
+        if source not in evidence['sources']:
+            evidence['sources'].append(source)
+            changed = True
+        if source.get('endpoint') and not evidence.get('endpoint'):
+            evidence['endpoint'] = source['endpoint']
+            changed = True
+        rank = _SEVERITY_RANK.get(str(severity or '').lower(), -1)
+        if rank > _SEVERITY_RANK.get(str(row['severity'] or '').lower(), -1):
+            row['severity'] = severity
+            changed = True
+        if (cvss_score or 0.0) > (row['cvss_score'] or 0.0):
+            row['cvss_score'] = cvss_score
+            changed = True
+        return changed
+
+    def add_endpoint_fingerprint(self, fingerprint: dict):
+        """Ajouter l'empreinte d'une page au tampon (écrite au prochain flush)"""
+        with self._lock:
+            self._endpoint_fingerprints.append(dict(fingerprint, scan_id=self.scan_id))
+
+    def flush(self):
+        """Insérer le contenu du tampon en une seule transaction"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if self._discarded:
+                return
+            if not self._buffer and not self._endpoint_fingerprints and not self._merged:
+                return
+            rows, self._buffer = self._buffer, []
+            endpoint_fingerprints, self._endpoint_fingerprints = self._endpoint_fingerprints, []
+            merged, self._merged = self._merged, set()
+            try:
+                if rows:
+                    self.db.execute(insert(Vulnerability), rows)
+                    self._increment_counts(rows)
+                    self._update_summary(rows)
+                if merged:
+                    self._update_merged(merged)
+                if endpoint_fingerprints:
+                    self.db.execute(insert(EndpointFingerprint), endpoint_fingerprints)
+                self.db.commit()
+                for row in rows:
+                    # Seul l'essentiel est conservé pour fusionner les doublons à venir
+                    del self._pending[row['fingerprint']]
+                    self._written[row['fingerprint']] = {
+                        'severity': row['severity'],
+                        'cvss_score': row['cvss_score'],
+                        'sources': row['evidence']['sources'],
+                        'endpoint': row['evidence'].get('endpoint'),
+                        'stored_severity': row['severity']
+                    }
+                for fingerprint in merged:
+                    self._written[fingerprint]['stored_severity'] = self._written[fingerprint]['severity']
+                if rows or merged:
+                    self.report_cache.invalidate(self.scan_id)
+            except Exception as e:
+                self.db.rollback()
+                # Conserver les lignes pour la prochaine tentative
+                self._buffer = rows + self._buffer
+                self._endpoint_fingerprints = endpoint_fingerprints + self._endpoint_fingerprints
+                self._merged |= merged
+                print(f"Erreur lors de l'enregistrement de {len(rows)} vulnérabilités: {e}")
+
+    def _update_merged(self, fingerprints):
+        """Mettre à jour les vulnérabilités déjà écrites ayant reçu un doublon, et les compteurs si leur sévérité change"""
+        severity_changes = []
+        for fingerprint in fingerprints:
+            written = self._written[fingerprint]
+            # Preuves relues en base : elles ne sont plus gardées en mémoire après l'écriture
+            stored = self.db.execute(
+                select(Vulnerability.id, Vulnerability.evidence)
+                .where(Vulnerability.scan_id == self.scan_id, Vulnerability.fingerprint == fingerprint)
+            ).first()
+            if stored is None:
+                continue
+            evidence = dict(stored.evidence or {}, sources=list(written['sources']))
+            if written['endpoint']:
+                evidence['endpoint'] = written['endpoint']
+            self.db.execute(
+                update(Vulnerability)
+                .where(Vulnerability.id == stored.id)
+                .values(evidence=evidence,
+                        severity=written['severity'], cvss_score=written['cvss_score'])
+            )
+            severity_changes.append((written['stored_severity'], written['severity'], written['cvss_score']))
+
+        counts = Counter()
+        for old_severity, new_severity, cvss_score in severity_changes:
+            if old_severity != new_severity:
+                counts[str(old_severity or '').lower()] -= 1
+                counts[str(new_severity or '').lower()] += 1
+        values = {
+            f"{severity}_count": getattr(Scan, f"{severity}_count") + count
+            for severity, count in counts.items()
+            if severity in SEVERITY_LEVELS and count
+        }
+        if values:
+            self.db.execute(update(Scan).where(Scan.id == self.scan_id).values(**values))
+
+        summary = self.db.get(ScanSummary, self.scan_id)
+        if summary is not None:
+            summary.risk_score += sum(
+                RISK_WEIGHTS.get(str(new_severity or '').lower(), 0) - RISK_WEIGHTS.get(str(old_severity or '').lower(), 0)
+                for old_severity, new_severity, cvss_score in severity_changes
+            )
+            summary.max_cvss_score = max([summary.max_cvss_score] + [cvss_score or 0.0 for _, _, cvss_score in severity_changes])
+
+    def _increment_counts(self, rows):
+        """Ajouter les vulnérabilités écrites aux compteurs par sévérité du scan"""
+        counts = Counter(str(row['severity'] or '').lower() for row in rows)
+        values = {
+            f"{severity}_count": getattr(Scan, f"{severity}_count") + count
+            for severity, count in counts.items()
+            if severity in SEVERITY_LEVELS
+        }
+        if values:
+            self.db.execute(update(Scan).where(Scan.id == self.scan_id).values(**values))
+
+    def _update_summary(self, rows):
+        """Mettre à jour le résumé du scan : total, score de risque, CVSS max, nombre par type"""
+        summary = self.db.get(ScanSummary, self.scan_id)
+        if summary is None:
+            summary = ScanSummary(scan_id=self.scan_id, total_count=0, risk_score=0, max_cvss_score=0.0)
+            self.db.add(summary)
+
+        counts_by_type = dict(summary.counts_by_type or {})
+        for row in rows:
+            counts_by_type[row['vulnerability_type']] = counts_by_type.get(row['vulnerability_type'], 0) + 1
+
+        summary.total_count += len(rows)
+        summary.risk_score += sum(RISK_WEIGHTS.get(str(row['severity'] or '').lower(), 0) for row in rows)
+        summary.max_cvss_score = max([summary.max_cvss_score] + [row['cvss_score'] or 0.0 for row in rows])
+        summary.counts_by_type = counts_by_type
+
+    def discard(self):
+        """Abandonner l'écriture : tampon vidé, ajouts et écritures suivants ignorés"""
+        with self._lock:
+            self._discarded = True
+            dropped = len(self._buffer)
+            self._buffer, self._endpoint_fingerprints, self._merged = [], [], set()
+            self._pending.clear()
+        if dropped:
+            print(f"[!] {dropped} vulnérabilités en attente abandonnées (scan {self.scan_id})")
+
+    def _flush_periodically(self):
+        """Thread d'écriture : vider le tampon dès que flush_interval secondes se sont écoulées"""
+        while not self._closed.wait(self.flush_interval / 2):
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def close(self):
+        """Arrêter l'écriture périodique, écriture finale du tampon"""
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+        if self._buffer:
+            print(f"[!] {len(self._buffer)} vulnérabilités n'ont pas pu être enregistrées")
+        self.db.close()
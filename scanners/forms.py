@@ -0,0 +1,148 @@
+from typing import NamedTuple, Tuple
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qsl
+import lxml.html
+from lxml import etree
+
+# Champs qui ne reçoivent pas de payload : valeur par défaut conservée dans les requêtes
+# (seuls les champs de saisie texte et les textarea sont testés)
+NON_INJECTABLE_TYPES = frozenset({
+    'hidden', 'submit', 'button', 'image', 'reset', 'checkbox', 'radio', 'select', 'file'
+})
+
+# Champs texte reconnus comme champs de recherche hors formulaire
+_SEARCH_TYPES = frozenset({'text', 'search'})
+
+_PARSER = lxml.html.HTMLParser(encoding='utf-8', remove_comments=True)
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def endpoint_key(url: str) -> str:
+    """
+    Forme canonique d'un endpoint : schéma et hôte en minuscules, port par
+    défaut et fragment retirés, noms des paramètres triés (valeurs ignorées)
+
+    '/item?id=1' et '/item?id=2' désignent ainsi le même endpoint.
+    """
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or '').lower()
+    if parsed.port and parsed.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parsed.port}"
+    names = sorted({name for name, _ in parse_qsl(parsed.query, keep_blank_values=True)})
+    return urlunparse((scheme, host, parsed.path or '/', '', '&'.join(names), ''))
+
+
+def form_signature(method: str, action_url: str, field_names) -> tuple:
+    """Signature d'un formulaire : un même formulaire présent sur plusieurs pages n'est testé qu'une fois"""
+    return (method.lower(), endpoint_key(action_url), tuple(sorted(set(field_names))))
+
+
+class FormField(NamedTuple):
+    """Champ de formulaire : nom, type (en minuscules) et valeur par défaut"""
+    name: str
+    type: str
+    default: str
+
+
+class Form(NamedTuple):
+    """
+    Formulaire d'une page, immuable
+
+    action est l'URL absolue de soumission (résolue par rapport à la page) ;
+    method vaut 'get' ou 'post'.
+    """
+    action: str
+    method: str
+    fields: Tuple[FormField, ...]
+
+    @property
+    def injectable_fields(self) -> Tuple[FormField, ...]:
+        """Champs testés : saisie texte (password inclus) et textarea ; ni listes, cases à cocher ni boutons"""
+        return tuple(field for field in self.fields if field.type not in NON_INJECTABLE_TYPES)
+
+    @property
+    def defaults(self) -> dict:
+        """Valeurs par défaut des champs"""
+        return {field.name: field.default for field in self.fields}
+
+    def baseline(self, value: str = 'test') -> dict:
+        """Données de soumission de référence : champs de saisie remplis, autres champs à leur valeur par défaut"""
+        return {
+            field.name: field.default if field.type in NON_INJECTABLE_TYPES else value
+            for field in self.fields
+        }
+
+    @property
+    def signature(self) -> tuple:
+        return form_signature(self.method, self.action, (field.name for field in self.fields))
+
+
+class PageInputs(NamedTuple):
+    """Formulaires et champs de recherche d'une page"""
+    forms: Tuple[Form, ...]
+    search_fields: Tuple[str, ...]
+
+
+def parse_html(text: str):
+    """Document lxml d'une page HTML (None si la page est vide ou illisible)"""
+    if not text or not text.strip():
+        return None
+    try:
+        return lxml.html.document_fromstring(text.encode('utf-8', 'surrogatepass'), parser=_PARSER)
+    except (etree.ParserError, ValueError):
+        return None
+
+
+def extract_inputs(tree, page_url: str) -> PageInputs:
+    """
+    Extraire les formulaires et les champs de recherche d'un document
+
+    Args:
+        tree: Document lxml (parse_html)
+        page_url: URL de la page, base de résolution des actions relatives
+    """
+    if tree is None:
+        return PageInputs((), ())
+
+    # Une balise <base href> change la base de résolution des URLs relatives
+    base_href = tree.xpath('string(//base/@href)').strip()
+    base_url = urljoin(page_url, base_href) if base_href else page_url
+
+    forms = []
+    for form in tree.iter('form'):
+        method = (form.get('method') or 'get').strip().lower()
+        method = method if method == 'post' else 'get'
+        action = urljoin(base_url, (form.get('action') or '').strip()).split('#', 1)[0]
+        if method == 'get':
+            # Un formulaire GET remplace la query string de son action
+            action = action.split('?', 1)[0]
+        forms.append(Form(action, method, tuple(_fields(form))))
+
+    # Champs de recherche hors formulaires (ceux des formulaires sont déjà testés avec leur formulaire)
+    search_fields = tuple(
+        name for name in (
+            element.get('name', '') for element in tree.iter('input')
+            if (element.get('type') or 'text').strip().lower() in _SEARCH_TYPES
+            and next(element.iterancestors('form'), None) is None
+        ) if name
+    )
+    return PageInputs(tuple(forms), search_fields)
+
+
+def _fields(form):
+    """Champs nommés d'un formulaire, dans l'ordre du document"""
+    for element in form.iter('input', 'textarea', 'select'):
+        name = element.get('name')
+        if not name:
+            continue
+        if element.tag == 'textarea':
+            yield FormField(name, 'textarea', element.text or '')
+        elif element.tag == 'select':
+            options = element.xpath('.//option')
+            selected = next((option for option in options if option.get('selected') is not None),
+                            options[0] if options else None)
+            default = '' if selected is None else selected.get('value', selected.text_content().strip())
+            yield FormField(name, 'select', default)
+        else:
+            yield FormField(name, (element.get('type') or 'text').strip().lower(), element.get('value', ''))
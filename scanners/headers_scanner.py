@@ -1,9 +1,13 @@
 import requests
 from urllib.parse import urlparse
+from scanners.http_client import HTTPClient
+from scanners.response_cache import ResponseCache
 
 
 class HeadersScanner:
-    def __init__(self):
+    def __init__(self, cache: ResponseCache = None, http_client: HTTPClient = None):
+        self.http = http_client or (cache.client if cache else HTTPClient())
+        self.cache = cache or ResponseCache(client=self.http)
         self.security_headers = {
             'X-Content-Type-Options': {
                 'required': True,
@@ -68,8 +72,8 @@ class HeadersScanner:
         try:
             print(f"[*] Scan des headers de sécurité pour {target_url}...")
             
-            # Faire une requête HEAD ou GET
-            response = requests.get(target_url, timeout=10, allow_redirects=True, verify=False)
+            # Réponse partagée avec les autres scanners du scan
+            response = self.cache.fetch(target_url)
             headers = response.headers
             
             missing_headers = []
@@ -0,0 +1,80 @@
+import os
+import threading
+from urllib.parse import urlparse
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+
+class HTTPClient:
+    def __init__(self, pool_connections: int = None, pool_maxsize: int = None,
+                 timeout: float = None, verify: bool = False, max_per_host: int = None):
+        """
+        Client HTTP partagé par tous les scanners d'un scan
+
+        Une seule session requests avec pool de connexions keep-alive : les
+        requêtes successives vers un même hôte réutilisent les connexions TCP/TLS
+        déjà ouvertes au lieu d'en ouvrir une nouvelle à chaque payload.
+
+        Le nombre de requêtes simultanées vers un même hôte est borné pour tout
+        le scan (crawl, injections, ...), quel que soit le nombre de threads
+        qui partagent le client ; le pool garde au moins autant de connexions
+        par hôte, aucune n'est donc fermée faute de place.
+
+        Args:
+            pool_connections: Nombre d'hôtes gardés dans le pool (HTTP_POOL_CONNECTIONS, défaut 10)
+            pool_maxsize: Connexions conservées par hôte (HTTP_POOL_MAXSIZE, défaut max_per_host)
+            timeout: Timeout par défaut en secondes (HTTP_TIMEOUT, défaut 10)
+            verify: Vérifier les certificats TLS
+            max_per_host: Requêtes simultanées par hôte (HTTP_MAX_PER_HOST, défaut 10)
+        """
+        self.max_per_host = max_per_host or int(os.getenv('HTTP_MAX_PER_HOST', '10'))
+        self.pool_connections = pool_connections or int(os.getenv('HTTP_POOL_CONNECTIONS', '10'))
+        self.pool_maxsize = max(pool_maxsize or int(os.getenv('HTTP_POOL_MAXSIZE', '0')), self.max_per_host)
+        self.timeout = timeout or float(os.getenv('HTTP_TIMEOUT', '10'))
+        self.verify = verify
+
+        if not verify:
+            # Les cibles ont souvent des certificats auto-signés
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # Un sémaphore par hôte, partagé par tous les threads du scan
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+
+    def request(self, method: str, url: str, **kwargs):
+        """Envoyer une requête via le pool de connexions"""
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('verify', self.verify)
+        with self._host_slot(urlparse(url).netloc):
+            return self.session.request(method, url, **kwargs)
+
+    def _host_slot(self, host: str):
+        """Sémaphore limitant les requêtes simultanées vers un hôte"""
+        with self._host_slots_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def get(self, url: str, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        """Fermer les connexions du pool"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
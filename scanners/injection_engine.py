@@ -0,0 +1,146 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from scanners.http_client import HTTPClient
+
+
+class InjectionProbe:
+    def __init__(self, method: str, url: str, payload: str = None, params: dict = None,
+                 data: dict = None, timeout: float = 8, allow_redirects: bool = True,
+                 check=None, context: dict = None):
+        """
+        Requête d'injection élémentaire (un payload sur un champ)
+
+        Args:
+            method: Méthode HTTP (GET ou POST)
+            url: URL de la requête
+            payload: Payload injecté
+            params: Paramètres de query string
+            data: Corps de formulaire (POST)
+            timeout: Timeout en secondes
+            allow_redirects: Suivre les redirections
+            check: Fonction (response) -> verdict ; un verdict vrai confirme la vulnérabilité
+            context: Informations libres du scanner (champ, formulaire, ...)
+        """
+        self.method = method.upper()
+        self.url = url
+        self.payload = payload
+        self.params = params
+        self.data = data
+        self.timeout = timeout
+        self.allow_redirects = allow_redirects
+        self.check = check
+        self.context = context or {}
+
+
+class InjectionEngine:
+    def __init__(self, http_client: HTTPClient = None, concurrency: int = None, observer=None):
+        """
+        Moteur asyncio d'envoi des payloads XSS/SQLi
+
+        Les champs sont testés en parallèle ; les payloads d'un même champ sont
+        envoyés un par un, dans l'ordre du groupe, jusqu'au premier verdict
+        positif. Les requêtes partent dans un pool de threads propre au moteur,
+        partagé par tous les appels (y compris ceux des threads d'injection du
+        crawl) : le moteur n'envoie jamais plus de `concurrency` requêtes à la
+        fois. Le nombre de requêtes simultanées vers un hôte est en outre borné
+        par le client HTTP du scan.
+
+        Args:
+            http_client: Client HTTP partagé du scan
+            concurrency: Requêtes simultanées du moteur, tous appels confondus
+                (INJECTION_CONCURRENCY, défaut : limite par hôte du client HTTP)
+            observer: Fonction (probe, verdict, durée) appelée pour chaque probe envoyé
+                (verdict None si la requête a échoué)
+        """
+        self.http = http_client or HTTPClient()
+        self.concurrency = concurrency or int(os.getenv('INJECTION_CONCURRENCY', '0')) or self.http.max_per_host
+        self.observer = observer
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='injection')
+
+    def close(self):
+        """Arrêter le pool de threads du moteur (requêtes en attente abandonnées)"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, groups):
+        """
+        Tester des groupes de probes (un groupe = un champ ou paramètre)
+
+        Les probes d'un groupe sont envoyés l'un après l'autre et le groupe
+        s'arrête au premier verdict positif : les payloads suivants ne sont pas
+        envoyés et un seul résultat est remonté par champ.
+
+        Args:
+            groups: Liste de listes d'InjectionProbe, chacune dans l'ordre d'envoi
+
+        Returns:
+            Liste de tuples (probe, response, verdict), au plus un par groupe
+        """
+        groups = [group for group in groups if group]
+        if not groups:
+            return []
+        results = asyncio.run(self._run_groups(groups))
+        return [result for result in results if result is not None]
+
+    def fetch(self, probes):
+        """
+        Envoyer des requêtes en parallèle sans vérification
+
+        Returns:
+            Liste de réponses (None si la requête a échoué), dans l'ordre des probes
+        """
+        if not probes:
+            return []
+        return asyncio.run(self._fetch_all(probes))
+
+    async def _run_groups(self, groups):
+        return await asyncio.gather(*(self._run_group(group) for group in groups))
+
+    async def _fetch_all(self, probes):
+        return await asyncio.gather(*(self._send(probe, verify=False) for probe in probes))
+
+    async def _run_group(self, probes):
+        # Arrêt anticipé : les payloads suivants du champ ne sont jamais envoyés
+        for probe in probes:
+            result = await self._send(probe)
+            if result is not None:
+                return result
+        return None
+
+    async def _send(self, probe: InjectionProbe, verify: bool = True):
+        # Boucle asyncio de l'appel, requêtes bloquantes dans le pool de threads du moteur
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, self._execute, probe, verify)
+        except Exception as e:
+            print(f"Erreur lors de l'envoi du payload sur {probe.url}: {e}")
+            return None
+
+    def _execute(self, probe: InjectionProbe, verify: bool):
+        """Envoyer la requête (thread du pool) et appliquer la vérification"""
+        start_time = time.perf_counter()
+        response = None
+        verdict = None
+        try:
+            response = self.http.request(
+                probe.method,
+                probe.url,
+                params=probe.params,
+                data=probe.data,
+                timeout=probe.timeout,
+                allow_redirects=probe.allow_redirects
+            )
+            if not verify:
+                return response
+            verdict = probe.check(response) if probe.check else None
+        finally:
+            # Chaque payload envoyé est enregistré, y compris en cas d'échec (timeout, ...) ;
+            # la durée d'une réponse reçue exclut l'attente d'une place libre vers l'hôte
+            if verify and self.observer:
+                elapsed = (response.elapsed.total_seconds() if response is not None
+                           else time.perf_counter() - start_time)
+                self.observer(probe, verdict, elapsed)
+        if verdict:
+            return probe, response, verdict
+        return None
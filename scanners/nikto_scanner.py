@@ -1,12 +1,22 @@
+import csv
 import subprocess
 import re
 import os
+import threading
 from urllib.parse import urlparse
 
 
 class NiktoScanner:
-    def __init__(self):
+    def __init__(self, timeout: float = None):
+        """
+        Args:
+            timeout: Durée maximale d'un scan Nikto en secondes (NIKTO_TIMEOUT, défaut 300)
+        """
         self.nikto_path = self._find_nikto()
+        self.timeout = timeout or float(os.getenv('NIKTO_TIMEOUT', '300'))
+        self._process = None
+        self._stop_reason = None
+        self._lock = threading.Lock()
 
     def _find_nikto(self):
         """Trouver le chemin vers Nikto"""
@@ -31,12 +41,26 @@ class NiktoScanner:
         
         return None
 
-    def scan(self, target_url: str):
-        """Scanner avec Nikto"""
+    def scan(self, target_url: str, on_finding=None):
+        """
+        Scanner avec Nikto
+
+        Le rapport CSV de Nikto est lu ligne par ligne pendant l'exécution :
+        chaque vulnérabilité est transmise à on_finding dès sa détection, et
+        les résultats déjà lus sont conservés en cas de timeout ou d'annulation.
+
+        Args:
+            target_url: URL cible
+            on_finding: Fonction appelée avec chaque vulnérabilité dès sa lecture
+
+        Returns:
+            Liste des vulnérabilités lues
+        """
         if not self.nikto_path:
             print("[!] Nikto non trouvé, scan ignoré")
             return []
 
+        vulnerabilities = []
         try:
             parsed = urlparse(target_url)
             host = parsed.hostname or parsed.netloc.split(':')[0]
@@ -44,49 +68,101 @@ class NiktoScanner:
             
             print(f"[*] Scan Nikto de {target_url}...")
             
-            # Exécuter Nikto
+            # Rapport CSV écrit dans un pipe dédié, la sortie console est ignorée
+            read_fd, write_fd = os.pipe()
             cmd = [
                 self.nikto_path,
                 '-h', host,
                 '-p', str(port),
-                '-Format', 'txt'
+                '-Format', 'csv',
+                '-output', f'/dev/fd/{write_fd}',
+                '-ask', 'no',
+                '-nointeractive'
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+            try:
+                process = subprocess.Popen(
+                    cmd,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    pass_fds=(write_fd,)
+                )
+            finally:
+                os.close(write_fd)
             
-            if result.returncode != 0:
-                return []
-
-            # Parser les résultats
-            vulnerabilities = []
-            lines = result.stdout.split('\n')
+            with self._lock:
+                self._process = process
+                self._stop_reason = None
+            watchdog = threading.Timer(self.timeout, self._stop, args=('timeout',))
+            watchdog.daemon = True
+            watchdog.start()
             
-            for line in lines:
-                if '+ ' in line and 'OSVDB' in line:
-                    # Format Nikto: + /path: description (OSVDB-xxxxx)
-                    match = re.search(r'\+ (.+?): (.+?) \(OSVDB-(\d+)\)', line)
-                    if match:
-                        path = match.group(1)
-                        description = match.group(2)
-                        osvdb_id = match.group(3)
-                        
-                        vulnerabilities.append({
-                            'title': f"Vulnérabilité Nikto: {path}",
-                            'description': description,
-                            'severity': self._determine_severity(description),
-                            'cvss_score': 5.0,
-                            'recommendation': 'Vérifier la configuration du serveur et appliquer les correctifs recommandés.',
-                            'path': path,
-                            'osvdb_id': osvdb_id
-                        })
+            try:
+                with os.fdopen(read_fd, 'r', errors='replace') as report:
+                    for line in report:
+                        finding = self._parse_csv_line(line)
+                        if not finding:
+                            continue
+                        vulnerabilities.append(finding)
+                        if on_finding:
+                            on_finding(finding)
+                process.wait()
+            finally:
+                watchdog.cancel()
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                with self._lock:
+                    self._process = None
+            
+            if self._stop_reason == 'timeout':
+                print(f"[!] Scan Nikto timeout, {len(vulnerabilities)} résultats partiels conservés")
+            elif self._stop_reason == 'cancel':
+                print(f"[!] Scan Nikto annulé, {len(vulnerabilities)} résultats partiels conservés")
             
             return vulnerabilities
-        except subprocess.TimeoutExpired:
-            print("[!] Scan Nikto timeout")
-            return []
         except Exception as e:
             print(f"Erreur Nikto: {e}")
-            return []
+            return vulnerabilities
+
+    def cancel(self):
+        """Arrêter le scan Nikto en cours (les résultats déjà lus sont conservés)"""
+        self._stop('cancel')
+
+    def _stop(self, reason: str):
+        """Terminer le processus Nikto en cours"""
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                self._stop_reason = reason
+                self._process.terminate()
+
+    def _parse_csv_line(self, line: str):
+        """
+        Convertir une ligne du rapport CSV de Nikto en vulnérabilité
+
+        Colonnes : hôte, IP, port, références (OSVDB), méthode, URI, message
+        """
+        try:
+            row = next(csv.reader([line]))
+        except (csv.Error, StopIteration):
+            return None
+        if len(row) < 7 or not row[6].strip():
+            return None
+        
+        references, method, path, description = row[3].strip(), row[4].strip(), row[5].strip(), row[6].strip()
+        osvdb = re.search(r'OSVDB-(\d+)', references)
+        return {
+            'title': f"Vulnérabilité Nikto: {path or '/'}",
+            'description': description,
+            'severity': self._determine_severity(description),
+            'cvss_score': 5.0,
+            'recommendation': 'Vérifier la configuration du serveur et appliquer les correctifs recommandés.',
+            'path': path,
+            'method': method,
+            'references': references,
+            'osvdb_id': osvdb.group(1) if osvdb else None
+        }
 
     def _determine_severity(self, description: str) -> str:
         """Déterminer la sévérité basée sur la description"""
@@ -1,11 +1,22 @@
-import nmap
 import re
 from urllib.parse import urlparse
+from scanners.port_scanner import AsyncPortScanner
+
+try:
+    import nmap
+except ImportError:  # python-nmap absent : scanner TCP intégré uniquement
+    nmap = None
 
 
 class NmapScanner:
-    def __init__(self):
-        self.nm = nmap.PortScanner()
+    def __init__(self, port_scanner: AsyncPortScanner = None):
+        self.port_scanner = port_scanner or AsyncPortScanner()
+        self.nm = None
+        if nmap is not None:
+            try:
+                self.nm = nmap.PortScanner()
+            except nmap.PortScannerError as e:
+                print(f"[!] Nmap indisponible ({e}), utilisation du scanner TCP intégré")
 
     def scan(self, target_url: str):
         """Scanner les ports ouverts d'une cible"""
@@ -16,6 +27,9 @@ class NmapScanner:
             
             if not host:
                 return []
+            
+            if self.nm is None:
+                return self._fallback_port_detection(target_url)
 
             # Scanner les ports communs
             print(f"[*] Scan Nmap de {host}...")
@@ -43,37 +57,13 @@ class NmapScanner:
             return self._fallback_port_detection(target_url)
 
     def _fallback_port_detection(self, target_url: str):
-        """Détection basique des ports si Nmap n'est pas disponible"""
-        import requests
-        results = []
-        
-        parsed = urlparse(target_url)
-        scheme = parsed.scheme or 'http'
-        host = parsed.hostname or parsed.netloc.split(':')[0]
-        
-        # Tester les ports communs
-        common_ports = {
-            'http': 80,
-            'https': 443,
-            'http-alt': 8080,
-            'https-alt': 8443
-        }
-        
-        for service, port in common_ports.items():
-            try:
-                test_url = f"{scheme}://{host}:{port}"
-                response = requests.get(test_url, timeout=2, allow_redirects=False)
-                if response.status_code:
-                    results.append({
-                        'port': port,
-                        'protocol': 'tcp',
-                        'state': 'open',
-                        'service': service,
-                        'version': 'unknown',
-                        'product': 'unknown'
-                    })
-            except:
-                pass
-        
-        return results
-
+        """Scan TCP intégré si Nmap n'est pas disponible"""
+        try:
+            parsed = urlparse(target_url)
+            host = parsed.hostname or parsed.netloc.split(':')[0]
+            # Toujours inclure le port de l'URL cible
+            extra_ports = [parsed.port] if parsed.port else []
+            return self.port_scanner.scan(host, extra_ports=extra_ports)
+        except Exception as e:
+            print(f"Erreur lors du scan TCP: {e}")
+            return []
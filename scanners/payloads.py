@@ -0,0 +1,148 @@
+"""
+Corpus de payloads et ordonnancement adaptatif
+
+Les payloads sont chargés depuis data/payloads/<scanner>.json :
+
+    {"budgets": {"parameter": 3, "form": 4},
+     "payloads": [{"id": "script-tag", "template": "<script>..."}]}
+
+Pour chaque contexte d'injection (paramètre d'URL, champ de formulaire, ...),
+seuls les `budget` payloads les plus rentables sont envoyés. La rentabilité
+d'un payload est son taux de succès estimé (moyenne a posteriori d'une loi
+Beta(1, 1) mise à jour par les succès et échecs observés sur tous les scans)
+divisé par son coût moyen (durée des requêtes). Un payload jamais essayé garde
+un taux estimé de 1/2 : il finit par être testé à la place des payloads qui
+échouent. Sans statistiques, l'ordre du fichier est conservé.
+"""
+import json
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from api.database import PayloadStat
+
+DEFAULT_PAYLOAD_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "payloads"
+)
+
+Payload = namedtuple("Payload", ["id", "template"])
+
+PayloadCorpus = namedtuple("PayloadCorpus", ["payloads", "budgets"])
+
+
+def load_corpus(scanner: str, directory: str = None) -> PayloadCorpus:
+    """Charger le corpus de payloads d'un scanner (PAYLOAD_DIR, défaut data/payloads)"""
+    directory = directory or os.getenv("PAYLOAD_DIR", DEFAULT_PAYLOAD_DIR)
+    with open(os.path.join(directory, f"{scanner}.json"), encoding="utf-8") as corpus_file:
+        data = json.load(corpus_file)
+    payloads = tuple(Payload(entry["id"], entry["template"]) for entry in data["payloads"])
+    return PayloadCorpus(payloads, dict(data.get("budgets", {})))
+
+
+class PayloadScheduler:
+    def __init__(self, scanner: str, corpus: PayloadCorpus = None, stats: dict = None):
+        """
+        Choix et ordre des payloads d'un scanner, d'après les résultats observés
+
+        Args:
+            scanner: Nom du scanner ('xss', 'sqli'), nom du fichier de corpus
+            corpus: Corpus de payloads (load_corpus(scanner) par défaut)
+            stats: Statistiques des scans précédents {(contexte, id): (essais, succès, coût total)}
+        """
+        self.scanner = scanner
+        self.corpus = corpus or load_corpus(scanner)
+        self._stats = {key: list(value) for key, value in (stats or {}).items()}
+        # Observations de ce scan, à enregistrer en base à la fin du scan
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def select(self, context: str) -> list:
+        """
+        Payloads à envoyer dans un contexte, du plus rentable au moins rentable
+
+        Returns:
+            Liste de Payload, limitée au budget du contexte
+        """
+        budget = self.corpus.budgets.get(context, len(self.corpus.payloads))
+        with self._lock:
+            stats = [self._stats.get((context, payload.id), (0, 0, 0.0)) for payload in self.corpus.payloads]
+
+        attempts = sum(stat[0] for stat in stats)
+        # Coût a priori d'un payload jamais essayé : coût moyen du contexte
+        mean_cost = sum(stat[2] for stat in stats) / attempts if attempts else 1.0
+        scores = [
+            ((hits + 1) / (tries + 2)) / max((cost + mean_cost) / (tries + 1), 1e-3)
+            for tries, hits, cost in stats
+        ]
+        # Tri stable : à score égal, l'ordre du fichier est conservé
+        order = sorted(range(len(scores)), key=lambda index: -scores[index])
+        return [self.corpus.payloads[index] for index in order[:budget]]
+
+    def record(self, context: str, payload_id: str, hit: bool, elapsed: float):
+        """Enregistrer le résultat d'un payload envoyé"""
+        key = (context, payload_id)
+        with self._lock:
+            for stats in (self._stats, self._pending):
+                entry = stats.setdefault(key, [0, 0, 0.0])
+                entry[0] += 1
+                entry[1] += 1 if hit else 0
+                entry[2] += elapsed
+
+    def observe(self, probe, verdict, elapsed: float):
+        """
+        Observateur de l'InjectionEngine : résultat d'un probe portant un payload du corpus
+
+        Appelé pour chaque probe envoyé ; une requête en échec compte comme un essai sans succès.
+        """
+        payload_id = probe.context.get('payload_id')
+        if payload_id:
+            self.record(probe.context.get('payload_context'), payload_id, bool(verdict), elapsed)
+
+    def drain(self) -> dict:
+        """Observations accumulées depuis le dernier appel {(contexte, id): [essais, succès, coût]}"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+
+def load_payload_stats(db: Session) -> dict:
+    """Statistiques de tous les payloads {scanner: {(contexte, id): (essais, succès, coût total)}}"""
+    stats = {}
+    for stat in db.query(PayloadStat):
+        stats.setdefault(stat.scanner, {})[(stat.context, stat.payload_id)] = (
+            stat.attempts, stat.hits, stat.total_cost
+        )
+    return stats
+
+
+def save_payload_stats(db: Session, scanner: str, pending: dict):
+    """
+    Ajouter les observations d'un scan aux statistiques en base
+
+    Les compteurs sont incrémentés en SQL : plusieurs workers peuvent enregistrer
+    leurs observations en même temps.
+    """
+    now = datetime.utcnow()
+    for (context, payload_id), (attempts, hits, cost) in pending.items():
+        for _ in range(2):
+            updated = db.execute(
+                update(PayloadStat)
+                .where(PayloadStat.scanner == scanner, PayloadStat.context == context,
+                       PayloadStat.payload_id == payload_id)
+                .values(attempts=PayloadStat.attempts + attempts, hits=PayloadStat.hits + hits,
+                        total_cost=PayloadStat.total_cost + cost, updated_at=now)
+            ).rowcount
+            if updated:
+                break
+            try:
+                with db.begin_nested():
+                    db.add(PayloadStat(scanner=scanner, context=context, payload_id=payload_id,
+                                       attempts=attempts, hits=hits, total_cost=cost, updated_at=now))
+                break
+            except IntegrityError:
+                # Ligne créée entre-temps par un autre worker : nouvelle tentative de mise à jour
+                continue
+    db.commit()
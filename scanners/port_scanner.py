@@ -0,0 +1,151 @@
+import asyncio
+import os
+import re
+import socket
+import time
+
+# Ports analysés par défaut : ports bien connus et services couramment exposés
+DEFAULT_PORTS = (
+    "1-1024,1433,1521,2049,2375,2376,3000,3306,3389,5000,5432,5601,5900,5984,"
+    "6379,7001,8000,8008,8080,8081,8443,8888,9000,9090,9200,9300,11211,27017"
+)
+
+# Requête envoyée aux services qui ne parlent pas en premier
+_HTTP_PROBE = "HEAD / HTTP/1.0\r\nHost: {host}\r\n\r\n"
+
+# (service, expression) : produit et version extraits de la bannière
+_BANNER_SIGNATURES = [
+    ("ssh", re.compile(r"^SSH-[\d.]+-(?P<product>[A-Za-z]+)[_-]?(?P<version>[\w.]+)?")),
+    ("http", re.compile(r"^HTTP/[\d.]+ \d+")),
+    ("ftp", re.compile(r"^220[ -].*?(?P<product>vsFTPd|ProFTPD|FileZilla Server|Pure-FTPd)[ /]?(?P<version>[\d.]+)?", re.IGNORECASE)),
+    ("smtp", re.compile(r"^220[ -].*?E?SMTP (?P<product>[\w-]+)?", re.IGNORECASE)),
+    ("redis", re.compile(r"^-(?:ERR|NOAUTH|DENIED)")),
+    ("mysql", re.compile(r"^.{4}\n(?P<version>[\d.]+[\w.-]*)", re.DOTALL)),
+]
+
+# En-tête Server d'une réponse HTTP
+_HTTP_SERVER = re.compile(r"^Server:[ \t]*(?P<product>[^/\r\n ]+)/?(?P<version>[\w.]+)?", re.IGNORECASE | re.MULTILINE)
+
+
+def parse_port_spec(spec: str) -> list:
+    """'22,80,8000-8010' -> liste triée et sans doublons des ports"""
+    ports = set()
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = (int(bound) for bound in part.split("-", 1))
+            ports.update(range(max(1, start), min(65535, end) + 1))
+        else:
+            ports.add(int(part))
+    return sorted(port for port in ports if 0 < port <= 65535)
+
+
+class AsyncPortScanner:
+    def __init__(self, ports: str = None, concurrency: int = None, timeout: float = None,
+                 banner_timeout: float = None):
+        """
+        Scanner de ports TCP (connect) asynchrone, utilisé quand Nmap n'est pas disponible
+
+        Args:
+            ports: Liste ou plages de ports, ex. '22,80,8000-8100' (PORT_SCAN_PORTS, défaut DEFAULT_PORTS)
+            concurrency: Connexions simultanées maximales (PORT_SCAN_CONCURRENCY, défaut 500)
+            timeout: Délai de connexion par port en secondes (PORT_SCAN_TIMEOUT, défaut 1)
+            banner_timeout: Délai de lecture de la bannière en secondes (PORT_SCAN_BANNER_TIMEOUT, défaut 1)
+        """
+        self.ports = parse_port_spec(ports or os.getenv('PORT_SCAN_PORTS', DEFAULT_PORTS))
+        self.concurrency = concurrency or int(os.getenv('PORT_SCAN_CONCURRENCY', '500'))
+        self.timeout = timeout or float(os.getenv('PORT_SCAN_TIMEOUT', '1'))
+        self.banner_timeout = banner_timeout or float(os.getenv('PORT_SCAN_BANNER_TIMEOUT', '1'))
+
+    def scan(self, host: str, extra_ports: list = None):
+        """
+        Scanner les ports d'un hôte
+
+        Args:
+            host: Nom d'hôte ou adresse IP
+            extra_ports: Ports ajoutés à la liste configurée (ex. port de l'URL cible)
+
+        Returns:
+            Liste des ports ouverts au format du scanner Nmap
+        """
+        ports = sorted(set(self.ports) | set(extra_ports or []))
+        start_time = time.perf_counter()
+        results = asyncio.run(self._scan(host, ports))
+        print(f"[*] Scan TCP de {host}: {len(results)} ports ouverts sur {len(ports)} en {time.perf_counter() - start_time:.1f}s")
+        return results
+
+    async def _scan(self, host: str, ports: list):
+        # Résoudre l'hôte une seule fois pour tous les ports
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        address = infos[0][4][0]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*(self._probe(semaphore, host, address, port) for port in ports))
+        return [result for result in results if result]
+
+    async def _probe(self, semaphore, host: str, address: str, port: int):
+        """Tenter une connexion sur un port et lire sa bannière"""
+        async with semaphore:
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(address, port), timeout=self.timeout
+                )
+            except (OSError, asyncio.TimeoutError):
+                return None
+
+            try:
+                banner = await self._grab_banner(reader, writer, host)
+            finally:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except OSError:
+                    pass
+
+        service, product, version = self._identify(port, banner)
+        return {
+            'port': port,
+            'protocol': 'tcp',
+            'state': 'open',
+            'service': service,
+            'version': version,
+            'product': product,
+            'banner': banner[:200]
+        }
+
+    async def _grab_banner(self, reader, writer, host: str) -> str:
+        """Bannière envoyée par le service, sinon réponse à une requête HTTP minimale"""
+        try:
+            data = await asyncio.wait_for(reader.read(512), timeout=self.banner_timeout)
+        except asyncio.TimeoutError:
+            # Service silencieux : il attend une requête du client
+            data = None
+        except OSError:
+            return ''
+
+        if data is None:
+            try:
+                writer.write(_HTTP_PROBE.format(host=host).encode())
+                await writer.drain()
+                data = await asyncio.wait_for(reader.read(512), timeout=self.banner_timeout)
+            except (OSError, asyncio.TimeoutError):
+                return ''
+        return data.decode('latin-1', errors='replace')
+
+    def _identify(self, port: int, banner: str):
+        """Service, produit et version d'après la bannière (ou le numéro de port)"""
+        for service, signature in _BANNER_SIGNATURES:
+            match = signature.match(banner)
+            if match:
+                if service == 'http':
+                    match = _HTTP_SERVER.search(banner) or match
+                groups = match.groupdict()
+                return service, groups.get('product') or 'unknown', groups.get('version') or 'unknown'
+        try:
+            service = socket.getservbyport(port, 'tcp')
+        except OSError:
+            service = 'unknown'
+        return service, 'unknown', 'unknown'
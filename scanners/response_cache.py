@@ -0,0 +1,120 @@
+import threading
+from scanners.http_client import HTTPClient
+from scanners.forms import extract_inputs, parse_html
+
+# Document pas encore parsé (None signifie une page vide ou illisible)
+_UNPARSED = object()
+
+
+class CachedResponse:
+    def __init__(self, response):
+        """
+        Réponse HTTP partagée entre les scanners d'un même scan
+
+        Args:
+            response: Réponse requests d'origine
+        """
+        self.response = response
+        self.url = response.url
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.text = response.text
+        self._tree = _UNPARSED
+        self._inputs = None
+        self._lock = threading.Lock()
+
+    @property
+    def tree(self):
+        """Document HTML parsé une seule fois (lxml), None si la page est vide"""
+        if self._tree is _UNPARSED:
+            with self._lock:
+                if self._tree is _UNPARSED:
+                    self._tree = parse_html(self.text)
+        return self._tree
+
+    @property
+    def inputs(self):
+        """Formulaires et champs de recherche de la page (PageInputs), extraits une seule fois"""
+        if self._inputs is None:
+            tree = self.tree
+            with self._lock:
+                if self._inputs is None:
+                    self._inputs = extract_inputs(tree, self.url)
+        return self._inputs
+
+    @property
+    def forms(self):
+        """Formulaires de la page (tuple de Form)"""
+        return self.inputs.forms
+
+
+class ResponseCache:
+    def __init__(self, client: HTTPClient = None, timeout=10):
+        """
+        Cache des réponses HTTP pour la durée d'un scan
+
+        Les entrées sont indexées par (méthode, URL, corps) : une même page n'est
+        téléchargée et parsée qu'une seule fois, même si plusieurs scanners la
+        demandent en parallèle.
+
+        Args:
+            client: Client HTTP partagé du scan
+            timeout: Timeout des requêtes en secondes
+        """
+        self.client = client or HTTPClient()
+        self.timeout = timeout
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, url: str, method: str = 'GET', data=None) -> CachedResponse:
+        """
+        Récupérer une réponse depuis le cache, ou l'obtenir depuis la cible
+
+        Lève les exceptions requests si la requête échoue (l'échec est aussi mis
+        en cache pour ne pas relancer la requête pour chaque scanner).
+        """
+        method = method.upper()
+        key = (method, url, self._body_key(data))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = {'ready': threading.Event(), 'response': None, 'error': None}
+                self._entries[key] = entry
+
+        if owner:
+            try:
+                response = self.client.request(
+                    method,
+                    url,
+                    data=data if method != 'GET' else None,
+                    params=data if method == 'GET' else None,
+                    timeout=self.timeout,
+                    allow_redirects=True
+                )
+                entry['response'] = CachedResponse(response)
+            except Exception as e:
+                entry['error'] = e
+            finally:
+                entry['ready'].set()
+        else:
+            entry['ready'].wait()
+
+        if entry['error'] is not None:
+            raise entry['error']
+        return entry['response']
+
+    def clear(self):
+        """Vider le cache"""
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _body_key(data):
+        """Clé hashable pour le corps de la requête"""
+        if data is None:
+            return None
+        if isinstance(data, dict):
+            return tuple(sorted((str(k), str(v)) for k, v in data.items()))
+        return data
@@ -0,0 +1,62 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class ScanExecutor:
+    def __init__(self, max_workers: int = None, on_complete=None):
+        """
+        Exécuteur de scanners indépendants en parallèle
+
+        Args:
+            max_workers: Nombre maximal de scanners exécutés simultanément
+                         (par défaut SCAN_MAX_WORKERS, sinon un thread par scanner)
+            on_complete: Fonction appelée avec le nom de chaque scanner terminé
+        """
+        if max_workers is None and os.getenv('SCAN_MAX_WORKERS'):
+            max_workers = int(os.getenv('SCAN_MAX_WORKERS'))
+        self.max_workers = max_workers
+        self.on_complete = on_complete
+        self.timings = {}
+
+    def run(self, tasks):
+        """
+        Exécuter les scanners et attendre la fin de tous
+
+        Args:
+            tasks: Liste de tuples (nom, fonction) - chaque fonction reçoit zéro argument
+
+        Returns:
+            Dictionnaire {nom: durée en secondes} pour chaque scanner
+        """
+        if not tasks:
+            return {}
+
+        workers = max(1, min(self.max_workers or len(tasks), len(tasks)))
+        start_time = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scanner') as pool:
+            futures = {pool.submit(self._timed, name, func): name for name, func in tasks}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    self.timings[name] = future.result()
+                except Exception as e:
+                    print(f"Erreur lors de l'exécution du scanner {name}: {e}")
+
+        total = time.perf_counter() - start_time
+        print(f"[*] {len(tasks)} scanners exécutés en {total:.1f}s ({workers} workers)")
+        return self.timings
+
+    def _timed(self, name, func):
+        """Exécuter un scanner et mesurer sa durée"""
+        start_time = time.perf_counter()
+        try:
+            func()
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.timings[name] = elapsed
+            print(f"[*] Scanner {name} terminé en {elapsed:.1f}s")
+            if self.on_complete:
+                self.on_complete(name)
+        return elapsed
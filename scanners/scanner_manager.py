@@ -6,62 +6,122 @@ from scanners.xss_scanner import XSSScanner
 from scanners.sqli_scanner import SQLiScanner
 from scanners.version_scanner import VersionScanner
 from scanners.zap_scanner import ZAPScanner
-from api.database import Vulnerability
-import requests
+from scanners.scan_executor import ScanExecutor
+from scanners.http_client import HTTPClient
+from scanners.response_cache import ResponseCache
+from scanners.findings_writer import FindingsWriter
+from scanners.crawler import Crawler
+from scanners.forms import endpoint_key
+from scanners.endpoint_fingerprints import PreviousScan, fingerprint_page
+from scanners.payloads import PayloadScheduler, load_payload_stats, save_payload_stats
+from concurrent.futures import ThreadPoolExecutor
 import os
+import threading
 
 
 class ScannerManager:
-    def __init__(self, db: Session, scan_id: int):
+    def __init__(self, db: Session, scan_id: int, max_workers: int = None):
         self.db = db
         self.scan_id = scan_id
+        # Vulnérabilités écrites par lots ; le tampon est vidé à la fin de chaque scanner
+        self.findings = FindingsWriter(db, scan_id)
+        self.executor = ScanExecutor(max_workers=max_workers, on_complete=lambda name: self.findings.flush())
+        self.timings = {}
+        # Client HTTP (pool keep-alive) et cache des réponses partagés par les scanners de ce scan
+        self.http_client = HTTPClient()
+        self.response_cache = ResponseCache(client=self.http_client)
         self.nmap_scanner = NmapScanner()
         self.nikto_scanner = NiktoScanner()
-        self.headers_scanner = HeadersScanner()
-        self.xss_scanner = XSSScanner()
-        self.sqli_scanner = SQLiScanner()
-        self.version_scanner = VersionScanner()
+        self.headers_scanner = HeadersScanner(cache=self.response_cache)
+        # Ordonnancement des payloads d'après les résultats de tous les scans précédents
+        payload_stats = load_payload_stats(db)
+        self.payload_schedulers = {
+            name: PayloadScheduler(name, stats=payload_stats.get(name)) for name in ('xss', 'sqli')
+        }
+        self.xss_scanner = XSSScanner(cache=self.response_cache, scheduler=self.payload_schedulers['xss'])
+        self.sqli_scanner = SQLiScanner(cache=self.response_cache, scheduler=self.payload_schedulers['sqli'])
+        self.version_scanner = VersionScanner(cache=self.response_cache)
+        self.crawler = Crawler(cache=self.response_cache)
+        # Pages testées simultanément par les scanners XSS/SQLi pendant le crawl
+        self.injection_workers = int(os.getenv('CRAWL_INJECTION_WORKERS', '4'))
+        # Scan précédent de la cible (mode incrémental uniquement)
+        self.previous_scan = None
+        # Scan arrêté (bail perdu) : plus aucune écriture ni nouvelle page testée
+        self.stopped = threading.Event()
         # ZAP Scanner (optionnel - utilise l'API ZAP si disponible)
         # Dans Docker, utilise 'zap' comme hostname, sinon localhost
         default_zap_url = 'http://zap:8080' if os.path.exists('/.dockerenv') else 'http://localhost:8080'
         zap_url = os.getenv('ZAP_PROXY_URL', default_zap_url)
         zap_key = os.getenv('ZAP_API_KEY', None)
-        self.zap_scanner = ZAPScanner(zap_proxy_url=zap_url, zap_api_key=zap_key)
+        # ZAP_PROXY_URL peut lister plusieurs instances séparées par des virgules
+        self.zap_scanner = ZAPScanner(zap_proxy_url=zap_url, zap_api_key=zap_key, bind=db.get_bind())
+
+    def stop(self):
+        """Arrêter le scan : vulnérabilités en attente abandonnées, plus aucune écriture ni page testée, Nikto interrompu"""
+        self.stopped.set()
+        self.findings.discard()
+        self.nikto_scanner.cancel()
+
+    def close(self):
+        """Écrire les vulnérabilités restantes et les statistiques des payloads, libérer les threads d'injection et les connexions HTTP du scan"""
+        try:
+            # Scan interrompu (erreur, arrêt du worker) : ne pas laisser de processus Nikto orphelin
+            self.nikto_scanner.cancel()
+            self.findings.close()
+            for name, scheduler in self.payload_schedulers.items():
+                try:
+                    save_payload_stats(self.db, name, scheduler.drain())
+                except Exception as e:
+                    self.db.rollback()
+                    print(f"Erreur lors de l'enregistrement des statistiques des payloads {name}: {e}")
+        finally:
+            self.xss_scanner.close()
+            self.sqli_scanner.close()
+            self.http_client.close()
 
     def run_quick_scan(self, target_url: str):
         """Scan rapide - headers et ports uniquement"""
         print(f"[*] Démarrage du scan rapide pour {target_url}")
         
-        # Scan des headers de sécurité
-        self._scan_headers(target_url)
-        
-        # Scan des ports ouverts (version simplifiée)
-        self._scan_ports(target_url)
+        self.timings = self.executor.run([
+            # Scan des headers de sécurité
+            ('headers', lambda: self._scan_headers(target_url)),
+            # Scan des ports ouverts (version simplifiée)
+            ('ports', lambda: self._scan_ports(target_url)),
+        ])
 
-    def run_full_scan(self, target_url: str):
-        """Scan complet - tous les scanners"""
-        print(f"[*] Démarrage du scan complet pour {target_url}")
-        
-        # Scan des ports
-        self._scan_ports(target_url)
-        
-        # Scan des headers de sécurité
-        self._scan_headers(target_url)
-        
-        # Scan XSS
-        self._scan_xss(target_url)
-        
-        # Scan SQLi
-        self._scan_sqli(target_url)
-        
-        # Scan des versions logicielles
-        self._scan_versions(target_url)
+    def run_full_scan(self, target_url: str, incremental: bool = False):
+        """
+        Scan complet - tous les scanners
+
+        En mode incrémental, les pages dont l'empreinte n'a pas changé depuis le
+        dernier scan terminé de la cible ne sont pas testées (XSS, SQLi) : leurs
+        vulnérabilités sont reprises de ce scan.
+        """
+        print(f"[*] Démarrage du scan {'incrémental' if incremental else 'complet'} pour {target_url}")
         
-        # Scan Nikto (si disponible)
-        self._scan_nikto(target_url)
+        if incremental:
+            # Chargé avant le lancement des scanners : la session n'est pas encore partagée entre threads
+            self.previous_scan = PreviousScan(self.db, self.scan_id, target_url)
+            if self.previous_scan.scan_id is None:
+                print("[*] Aucun scan précédent avec empreintes : toutes les pages seront testées")
         
-        # Scan ZAP (si disponible) - Spider + Active Scan
-        self._scan_zap(target_url)
+        # Les scanners sont indépendants : ils s'exécutent en parallèle et la durée
+        # totale correspond à peu près à celle du scanner le plus lent
+        self.timings = self.executor.run([
+            # Scan ZAP (si disponible) - Spider + Active Scan, le plus long en premier
+            ('zap', lambda: self._scan_zap(target_url)),
+            # Scan Nikto (si disponible)
+            ('nikto', lambda: self._scan_nikto(target_url)),
+            # Scan des ports
+            ('ports', lambda: self._scan_ports(target_url)),
+            # Scan des headers de sécurité
+            ('headers', lambda: self._scan_headers(target_url)),
+            # Crawl du site : chaque page découverte est testée (XSS, SQLi) dès sa réception
+            ('crawl', lambda: self._crawl_and_inject(target_url)),
+            # Scan des versions logicielles
+            ('versions', lambda: self._scan_versions(target_url)),
+        ])
 
     def _scan_ports(self, target_url: str):
         """Scanner les ports ouverts"""
@@ -120,8 +180,50 @@ class ScannerManager:
         except Exception as e:
             print(f"Erreur lors du scan des headers: {e}")
 
-    def _scan_xss(self, target_url: str):
-        """Scanner les vulnérabilités XSS"""
+    def _crawl_and_inject(self, target_url: str):
+        """Parcourir le site et tester les paramètres et formulaires de chaque page au fil du crawl"""
+        skipped = []
+        with ThreadPoolExecutor(max_workers=self.injection_workers, thread_name_prefix='injection-page') as pool:
+            def on_page(page):
+                if self.stopped.is_set():
+                    return
+                fingerprint = fingerprint_page(page)
+                self.findings.add_endpoint_fingerprint(fingerprint)
+                if self.previous_scan is not None and self.previous_scan.unchanged(fingerprint):
+                    skipped.append(page.url)
+                    self._carry_forward(fingerprint['endpoint'])
+                elif page.injectable:
+                    pool.submit(self._scan_xss, page.url, fingerprint['endpoint'])
+                    pool.submit(self._scan_sqli, page.url, fingerprint['endpoint'])
+
+            try:
+                self.crawler.crawl(target_url, on_page=on_page)
+            except Exception as e:
+                print(f"Erreur lors du crawl: {e}")
+                if self.stopped.is_set():
+                    return
+                # La page cible est testée même si le crawl échoue
+                pool.submit(self._scan_xss, target_url, endpoint_key(target_url))
+                pool.submit(self._scan_sqli, target_url, endpoint_key(target_url))
+        
+        if skipped:
+            print(f"[*] {len(skipped)} pages inchangées depuis le scan {self.previous_scan.scan_id} : tests XSS/SQLi ignorés")
+
+    def _carry_forward(self, endpoint: str):
+        """Reprendre les vulnérabilités XSS/SQLi d'une page inchangée depuis le scan précédent"""
+        for finding in self.previous_scan.findings.get(endpoint, []):
+            self._save_vulnerability(
+                title=finding['title'],
+                description=finding['description'],
+                severity=finding['severity'],
+                cvss_score=finding['cvss_score'],
+                vuln_type=finding['vuln_type'],
+                recommendation=finding['recommendation'],
+                evidence=dict(finding['evidence'], carried_from_scan=self.previous_scan.scan_id)
+            )
+
+    def _scan_xss(self, target_url: str, endpoint: str = None):
+        """Scanner les vulnérabilités XSS (endpoint : page crawlée à laquelle rattacher les résultats)"""
         try:
             results = self.xss_scanner.scan(target_url)
             if results:
@@ -133,13 +235,13 @@ class ScannerManager:
                         cvss_score=result.get('cvss_score', 7.5),
                         vuln_type="xss",
                         recommendation="Valider et échapper toutes les entrées utilisateur. Utiliser Content Security Policy (CSP).",
-                        evidence=result
+                        evidence=dict(result, endpoint=endpoint) if endpoint else result
                     )
         except Exception as e:
             print(f"Erreur lors du scan XSS: {e}")
 
-    def _scan_sqli(self, target_url: str):
-        """Scanner les vulnérabilités SQLi"""
+    def _scan_sqli(self, target_url: str, endpoint: str = None):
+        """Scanner les vulnérabilités SQLi (endpoint : page crawlée à laquelle rattacher les résultats)"""
         try:
             results = self.sqli_scanner.scan(target_url)
             if results:
@@ -151,7 +253,7 @@ class ScannerManager:
                         cvss_score=result.get('cvss_score', 9.0),
                         vuln_type="sqli",
                         recommendation="Utiliser des requêtes préparées (prepared statements). Valider et échapper toutes les entrées.",
-                        evidence=result
+                        evidence=dict(result, endpoint=endpoint) if endpoint else result
                     )
         except Exception as e:
             print(f"Erreur lors du scan SQLi: {e}")
@@ -175,20 +277,20 @@ class ScannerManager:
             print(f"Erreur lors du scan de versions: {e}")
 
     def _scan_nikto(self, target_url: str):
-        """Scanner avec Nikto (si disponible)"""
+        """Scanner avec Nikto (si disponible) - vulnérabilités enregistrées au fil du scan"""
+        def save(result):
+            self._save_vulnerability(
+                title=result.get('title', 'Vulnérabilité détectée par Nikto'),
+                description=result.get('description'),
+                severity=result.get('severity', 'medium'),
+                cvss_score=result.get('cvss_score', 5.0),
+                vuln_type="nikto",
+                recommendation=result.get('recommendation', 'Vérifier la configuration du serveur.'),
+                evidence=result
+            )
+        
         try:
-            results = self.nikto_scanner.scan(target_url)
-            if results:
-                for result in results:
-                    self._save_vulnerability(
-                        title=result.get('title', 'Vulnérabilité détectée par Nikto'),
-                        description=result.get('description'),
-                        severity=result.get('severity', 'medium'),
-                        cvss_score=result.get('cvss_score', 5.0),
-                        vuln_type="nikto",
-                        recommendation=result.get('recommendation', 'Vérifier la configuration du serveur.'),
-                        evidence=result
-                    )
+            self.nikto_scanner.scan(target_url, on_finding=save)
         except Exception as e:
             print(f"Erreur lors du scan Nikto: {e}")
 
@@ -200,47 +302,45 @@ class ScannerManager:
                 print("[!] Pour utiliser ZAP, démarrez-le avec: zap.sh -daemon -port 8080")
                 return
             
-            results = self.zap_scanner.scan(target_url)
-            if results:
-                for result in results:
-                    # Construire une recommandation complète
-                    recommendation = result.get('solution', '')
-                    if result.get('reference'):
-                        recommendation += f"\nRéférence: {result.get('reference')}"
-                    
-                    self._save_vulnerability(
-                        title=result.get('title', 'Vulnérabilité détectée par OWASP ZAP'),
-                        description=f"{result.get('description', '')}\nURL: {result.get('url', target_url)}\nParamètre: {result.get('parameter', 'N/A')}",
-                        severity=result.get('severity', 'medium'),
-                        cvss_score=result.get('cvss_score', 5.5),
-                        vuln_type="zap",
-                        recommendation=recommendation or 'Consulter les références de sécurité pour plus d\'informations.',
-                        evidence={
-                            'url': result.get('url'),
-                            'parameter': result.get('parameter'),
-                            'evidence': result.get('evidence'),
-                            'cweid': result.get('cweid'),
-                            'wascid': result.get('wascid')
-                        }
-                    )
+            def save(result):
+                # Construire une recommandation complète
+                recommendation = result.get('solution', '')
+                if result.get('reference'):
+                    recommendation += f"\nRéférence: {result.get('reference')}"
+                
+                self._save_vulnerability(
+                    title=result.get('title', 'Vulnérabilité détectée par OWASP ZAP'),
+                    description=f"{result.get('description', '')}\nURL: {result.get('url', target_url)}\nParamètre: {result.get('parameter', 'N/A')}",
+                    severity=result.get('severity', 'medium'),
+                    cvss_score=result.get('cvss_score', 5.5),
+                    vuln_type="zap",
+                    recommendation=recommendation or 'Consulter les références de sécurité pour plus d\'informations.',
+                    evidence={
+                        'url': result.get('url'),
+                        'parameter': result.get('parameter'),
+                        'evidence': result.get('evidence'),
+                        'cweid': result.get('cweid'),
+                        'wascid': result.get('wascid')
+                    }
+                )
+            
+            # Alertes lues page par page et transmises directement à l'écriture groupée
+            self.zap_scanner.scan(target_url, on_finding=save)
         except Exception as e:
             print(f"Erreur lors du scan ZAP: {e}")
 
     def _save_vulnerability(self, title: str, description: str, severity: str,
                            cvss_score: float, vuln_type: str, recommendation: str, evidence: dict = None):
-        """Sauvegarder une vulnérabilité dans la base de données"""
-        vuln = Vulnerability(
-            scan_id=self.scan_id,
+        """Sauvegarder une vulnérabilité (écriture groupée via FindingsWriter)"""
+        self.findings.add(
             title=title,
             description=description,
             severity=severity,
             cvss_score=cvss_score,
-            vulnerability_type=vuln_type,
+            vuln_type=vuln_type,
             recommendation=recommendation,
             evidence=evidence
         )
-        self.db.add(vuln)
-        self.db.commit()
 
     def _analyze_port_for_web_server(self, port: int, port_info: dict, target_url: str):
         """
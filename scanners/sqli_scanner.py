@@ -1,45 +1,35 @@
-import requests
+import os
+import threading
 from urllib.parse import urlparse, urlencode, parse_qs
-from bs4 import BeautifulSoup
-import re
+from scanners.http_client import HTTPClient
+from scanners.response_cache import ResponseCache
+from scanners.injection_engine import InjectionEngine, InjectionProbe
+from scanners.sqli_signatures import SQLErrorDetector
+from scanners.payloads import PayloadScheduler
+from scanners.blind_sqli import BlindSQLiDetector, InjectionPoint
 
 
 class SQLiScanner:
-    def __init__(self):
-        self.sqli_payloads = [
-            "' OR '1'='1",
-            "' OR '1'='1' --",
-            "' OR '1'='1' /*",
-            "admin'--",
-            "admin'/*",
-            "' UNION SELECT NULL--",
-            "1' AND '1'='1",
-            "1' AND '1'='2",
-            "' OR 1=1#",
-            "' OR 1=1--",
-        ]
+    def __init__(self, cache: ResponseCache = None, http_client: HTTPClient = None,
+                 scheduler: PayloadScheduler = None, blind: bool = None):
+        self.http = http_client or (cache.client if cache else HTTPClient())
+        self.cache = cache or ResponseCache(client=self.http)
+        # Payloads (data/payloads/sqli.json) choisis et ordonnés selon leurs résultats passés
+        self.scheduler = scheduler or PayloadScheduler('sqli')
+        self.engine = InjectionEngine(http_client=self.http, observer=self.scheduler.observe)
+        # Injections aveugles par délai (BLIND_SQLI, activé par défaut)
+        if blind is None:
+            blind = os.getenv('BLIND_SQLI', '1').lower() not in ('0', 'false', 'no')
+        self.blind_detector = BlindSQLiDetector(self.engine) if blind else None
+        # Formulaires déjà testés pendant ce scan (un même formulaire apparaît souvent sur chaque page)
+        self._tested_forms = set()
+        self._tested_forms_lock = threading.Lock()
         
-        self.error_patterns = [
-            r"SQL syntax.*MySQL",
-            r"Warning.*\Wmysql_",
-            r"MySQLSyntaxErrorException",
-            r"valid MySQL result",
-            r"PostgreSQL.*ERROR",
-            r"Warning.*\Wpg_",
-            r"valid PostgreSQL result",
-            r"Npgsql\.NpgsqlException",
-            r"SQLite.*error",
-            r"SQLiteException",
-            r"SQLite.*SQL syntax",
-            r"Microsoft.*ODBC.*SQL Server",
-            r"ODBC SQL Server Driver",
-            r"SQLServer JDBC Driver",
-            r"Warning.*\Wmssql_",
-            r"Warning.*\Wsqlsrv_",
-            r"SQLException",
-            r"Unclosed quotation mark",
-            r"quoted string not properly terminated",
-        ]
+        self.error_detector = SQLErrorDetector()
+
+    def close(self):
+        """Libérer le pool de threads du moteur d'injection"""
+        self.engine.close()
 
     def scan(self, target_url: str):
         """Scanner les vulnérabilités SQL Injection"""
@@ -48,9 +38,11 @@ class SQLiScanner:
             
             parsed = urlparse(target_url)
             vulnerabilities = []
+            # Champs sans erreur SQL ni réponse anormale, testés ensuite par délai
+            blind_points = []
             
             # TOUJOURS scanner les formulaires, même s'il y a des paramètres dans l'URL
-            form_vulns = self._scan_forms(target_url)
+            form_vulns = self._scan_forms(target_url, blind_points)
             vulnerabilities.extend(form_vulns)
             
             # Extraire les paramètres de l'URL
@@ -59,161 +51,232 @@ class SQLiScanner:
             if params:
                 # Obtenir une réponse baseline
                 try:
-                    baseline_response = requests.get(target_url, timeout=5, allow_redirects=True)
+                    baseline_text = self.cache.fetch(target_url).text
                 except:
-                    baseline_response = None
+                    baseline_text = None
                 
-                # Tester chaque paramètre avec des payloads SQLi
+                # Tester chaque paramètre avec des payloads SQLi (un groupe par paramètre)
+                groups = []
+                payloads = self.scheduler.select('parameter')
                 for param_name, param_values in params.items():
-                    for payload in self.sqli_payloads[:5]:  # Limiter pour éviter trop de requêtes
-                        test_url = self._build_test_url(target_url, param_name, payload)
-                        
-                        try:
-                            response = requests.get(test_url, timeout=5, allow_redirects=True)
-                            
-                            # Vérifier les erreurs SQL dans la réponse
-                            if self._check_sqli_errors(response.text):
-                                vulnerabilities.append({
-                                    'description': f"Vulnérabilité SQL Injection potentielle dans le paramètre '{param_name}'. Erreurs SQL détectées dans la réponse.",
-                                    'severity': 'critical',
-                                    'cvss_score': 9.0,
-                                    'parameter': param_name,
-                                    'payload': payload,
-                                    'url': test_url
-                                })
-                                break
-                            
-                            # Vérifier les différences de réponse
-                            if baseline_response and self._check_response_difference(response.text, baseline_response.text):
-                                vulnerabilities.append({
-                                    'description': f"Vulnérabilité SQL Injection potentielle dans le paramètre '{param_name}'. Réponse anormale détectée.",
-                                    'severity': 'high',
-                                    'cvss_score': 8.0,
-                                    'parameter': param_name,
-                                    'payload': payload,
-                                    'url': test_url
-                                })
-                                break
-                        except:
-                            continue
+                    groups.append([
+                        InjectionProbe(
+                            'GET',
+                            self._build_test_url(target_url, param_name, entry.template),
+                            payload=entry.template,
+                            timeout=5,
+                            check=self._sqli_check(baseline_text),
+                            context={'parameter': param_name, 'payload_id': entry.id, 'payload_context': 'parameter'}
+                        )
+                        for entry in payloads
+                    ])
+                
+                found = set()
+                for probe, response, verdict in self.engine.run(groups):
+                    param_name = probe.context['parameter']
+                    found.add(param_name)
+                    if verdict['type'] == 'error':
+                        vulnerabilities.append({
+                            'description': f"Vulnérabilité SQL Injection potentielle dans le paramètre '{param_name}'. Erreurs SQL ({verdict['dbms']}) détectées dans la réponse.",
+                            'severity': 'critical',
+                            'cvss_score': 9.0,
+                            'parameter': param_name,
+                            'payload': probe.payload,
+                            'url': probe.url,
+                            'dbms': verdict['dbms'],
+                            'error_signature': verdict['signature']
+                        })
+                    else:
+                        vulnerabilities.append({
+                            'description': f"Vulnérabilité SQL Injection potentielle dans le paramètre '{param_name}'. Réponse anormale détectée.",
+                            'severity': 'high',
+                            'cvss_score': 8.0,
+                            'parameter': param_name,
+                            'payload': probe.payload,
+                            'url': probe.url
+                        })
+                
+                base_url = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+                blind_points.extend(
+                    InjectionPoint('get', base_url, param_name, params, {'parameter': param_name})
+                    for param_name in params if param_name not in found
+                )
+            
+            # Paramètres et formulaires de la page testés ensemble : un seul délai d'attente
+            if blind_points and self.blind_detector:
+                vulnerabilities.extend(self._scan_blind(target_url, blind_points))
             
             return vulnerabilities
         except Exception as e:
             print(f"Erreur lors du scan SQLi: {e}")
             return []
 
-    def _scan_forms(self, target_url: str):
-        """Scanner les formulaires pour SQLi"""
+    def _scan_forms(self, target_url: str, blind_points: list = None):
+        """Scanner les formulaires pour SQLi (blind_points : champs à tester ensuite par délai)"""
         try:
-            response = requests.get(target_url, timeout=10)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            forms = soup.find_all('form')
+            # Formulaires de la page, extraits une seule fois pour tous les scanners
+            forms = [
+                form for form in self.cache.fetch(target_url).forms
+                if form.fields and self._claim_form(form)
+            ]
             vulnerabilities = []
             
-            for form in forms:
-                action = form.get('action', '')
-                method = form.get('method', 'get').lower()
-                inputs = form.find_all(['input', 'textarea'])
-                
-                if not inputs:
-                    continue
-                
-                # Obtenir une réponse baseline pour comparaison
-                try:
-                    baseline_data = {}
-                    for input_field in inputs:
-                        input_name = input_field.get('name', '')
-                        if input_name:
-                            baseline_data[input_name] = 'test'
-                    
-                    form_url = urlparse(action) if action else urlparse(target_url)
-                    if not form_url.netloc:
-                        form_url = urlparse(target_url)
-                    
-                    if method == 'post':
-                        baseline_response = requests.post(
-                            f"{form_url.scheme}://{form_url.netloc}{form_url.path or '/'}",
-                            data=baseline_data,
-                            timeout=5,
-                            allow_redirects=True
-                        )
-                    else:
-                        baseline_response = requests.get(
-                            f"{form_url.scheme}://{form_url.netloc}{form_url.path or '/'}",
-                            params=baseline_data,
-                            timeout=5,
-                            allow_redirects=True
-                        )
-                except:
-                    baseline_response = None
-                
-                # Construire l'URL complète du formulaire
-                form_url = urlparse(action) if action else urlparse(target_url)
-                if not form_url.netloc:
-                    form_url = urlparse(target_url)
-                full_form_url = f"{form_url.scheme}://{form_url.netloc}{form_url.path or '/'}"
+            # Obtenir les réponses baseline de tous les formulaires en parallèle
+            # (champs cachés à leur valeur par défaut, ex. jetons CSRF)
+            baseline_responses = self.engine.fetch([
+                self._form_probe(form.method, form.action, form.baseline(), timeout=5)
+                for form in forms
+            ])
+            
+            groups = []
+            form_payloads = self.scheduler.select('form')
+            for form, baseline_response in zip(forms, baseline_responses):
+                baseline_text = baseline_response.text if baseline_response is not None else None
+                baseline_data = form.baseline()
                 
                 # Tester TOUS les champs, y compris password (important pour les formulaires de login)
-                for input_field in inputs:
-                    input_name = input_field.get('name', '')
-                    input_type = input_field.get('type', 'text').lower()
-                    
-                    if not input_name or input_type in ['hidden', 'submit', 'button']:
-                        continue
-                    
+                for field in form.injectable_fields:
                     # Tester plusieurs payloads SQLi
-                    for payload in self.sqli_payloads[:6]:
-                        test_data = baseline_data.copy() if baseline_data else {}
-                        test_data[input_name] = payload
-                        
-                        try:
-                            if method == 'post':
-                                test_response = requests.post(
-                                    full_form_url,
-                                    data=test_data,
-                                    timeout=8,
-                                    allow_redirects=True
-                                )
-                            else:
-                                test_response = requests.get(
-                                    full_form_url,
-                                    params=test_data,
-                                    timeout=8,
-                                    allow_redirects=True
-                                )
-                            
-                            # Vérifier les erreurs SQL
-                            if self._check_sqli_errors(test_response.text):
-                                vulnerabilities.append({
-                                    'description': f"Vulnérabilité SQL Injection potentielle dans le formulaire (champ '{input_name}'). Erreurs SQL détectées dans la réponse.",
-                                    'severity': 'critical',
-                                    'cvss_score': 9.0,
-                                    'form_field': input_name,
-                                    'payload': payload,
-                                    'form_action': full_form_url
-                                })
-                                break  # Une vulnérabilité trouvée pour ce champ
-                            
-                            # Vérifier les différences de réponse
-                            if baseline_response and self._check_response_difference(test_response.text, baseline_response.text):
-                                vulnerabilities.append({
-                                    'description': f"Vulnérabilité SQL Injection potentielle dans le formulaire (champ '{input_name}'). Réponse anormale détectée.",
-                                    'severity': 'high',
-                                    'cvss_score': 8.0,
-                                    'form_field': input_name,
-                                    'payload': payload,
-                                    'form_action': full_form_url
-                                })
-                                break
-                        except:
-                            continue
+                    group = []
+                    for entry in form_payloads:
+                        test_data = dict(baseline_data)
+                        test_data[field.name] = entry.template
+                        group.append(self._form_probe(
+                            form.method,
+                            form.action,
+                            test_data,
+                            timeout=8,
+                            payload=entry.template,
+                            check=self._sqli_check(baseline_text),
+                            context={'form_field': field.name, 'form_action': form.action,
+                                     'payload_id': entry.id, 'payload_context': 'form'}
+                        ))
+                    groups.append(group)
+            
+            # Une vulnérabilité au plus par champ (arrêt au premier payload positif)
+            found = set()
+            for probe, response, verdict in self.engine.run(groups):
+                input_name = probe.context['form_field']
+                found.add((probe.context['form_action'], input_name))
+                if verdict['type'] == 'error':
+                    vulnerabilities.append({
+                        'description': f"Vulnérabilité SQL Injection potentielle dans le formulaire (champ '{input_name}'). Erreurs SQL ({verdict['dbms']}) détectées dans la réponse.",
+                        'severity': 'critical',
+                        'cvss_score': 9.0,
+                        'form_field': input_name,
+                        'payload': probe.payload,
+                        'form_action': probe.context['form_action'],
+                        'dbms': verdict['dbms'],
+                        'error_signature': verdict['signature']
+                    })
+                else:
+                    vulnerabilities.append({
+                        'description': f"Vulnérabilité SQL Injection potentielle dans le formulaire (champ '{input_name}'). Réponse anormale détectée.",
+                        'severity': 'high',
+                        'cvss_score': 8.0,
+                        'form_field': input_name,
+                        'payload': probe.payload,
+                        'form_action': probe.context['form_action']
+                    })
+            
+            if blind_points is not None:
+                blind_points.extend(
+                    InjectionPoint(form.method, form.action, field.name, form.baseline(),
+                                   {'form_field': field.name, 'form_action': form.action})
+                    for form in forms
+                    for field in form.injectable_fields
+                    if (form.action, field.name) not in found
+                )
             
             return vulnerabilities
         except Exception as e:
             print(f"Erreur lors du scan des formulaires: {e}")
             return []
 
+    def _scan_blind(self, target_url: str, points: list):
+        """Scanner les champs par injection de délais (SQLi aveugle)"""
+        try:
+            vulnerabilities = []
+            for point, probe, verdict in self.blind_detector.detect(points):
+                timings = (
+                    f"{verdict['elapsed']:.1f}s puis {verdict['confirmation_elapsed']:.1f}s "
+                    f"(référence {verdict['baseline_mean']:.2f}s ± {verdict['baseline_stdev']:.2f}s)"
+                )
+                evidence = {
+                    'payload': probe.payload,
+                    'dbms': verdict['dbms'],
+                    'technique': 'time-based',
+                    'delay': verdict['delay'],
+                    'timings': {key: verdict[key] for key in (
+                        'elapsed', 'confirmation_elapsed', 'control_elapsed',
+                        'baseline_mean', 'baseline_stdev', 'baseline_samples', 'zscore'
+                    )}
+                }
+                if 'parameter' in point.context:
+                    param_name = point.context['parameter']
+                    vulnerabilities.append(dict(
+                        evidence,
+                        description=f"Vulnérabilité SQL Injection aveugle dans le paramètre '{param_name}'. Les délais injectés ({verdict['dbms']}) sont reproduits : {timings}.",
+                        severity='critical',
+                        cvss_score=9.0,
+                        parameter=param_name,
+                        url=self._build_test_url(target_url, param_name, probe.payload)
+                    ))
+                else:
+                    input_name = point.context['form_field']
+                    vulnerabilities.append(dict(
+                        evidence,
+                        description=f"Vulnérabilité SQL Injection aveugle dans le formulaire (champ '{input_name}'). Les délais injectés ({verdict['dbms']}) sont reproduits : {timings}.",
+                        severity='critical',
+                        cvss_score=9.0,
+                        form_field=input_name,
+                        form_action=point.context['form_action']
+                    ))
+            return vulnerabilities
+        except Exception as e:
+            print(f"Erreur lors du scan SQLi aveugle: {e}")
+            return []
+
+    def _claim_form(self, form) -> bool:
+        """Réserver un formulaire pour ce scan ; False s'il a déjà été testé"""
+        with self._tested_forms_lock:
+            if form.signature in self._tested_forms:
+                return False
+            self._tested_forms.add(form.signature)
+            return True
+
+    def _form_probe(self, method: str, url: str, form_data: dict, timeout: float,
+                    payload: str = None, check=None, context: dict = None) -> InjectionProbe:
+        """Construire la requête de soumission d'un formulaire"""
+        return InjectionProbe(
+            method,
+            url,
+            payload=payload,
+            data=form_data if method == 'post' else None,
+            params=form_data if method != 'post' else None,
+            timeout=timeout,
+            check=check,
+            context=context
+        )
+
+    def _sqli_check(self, baseline_text: str):
+        """
+        Vérification appliquée à la réponse d'un probe
+
+        Returns:
+            {'type': 'error', 'dbms', 'signature'}, {'type': 'difference'} ou None
+        """
+        def check(response):
+            # Vérifier les erreurs SQL dans la réponse
+            error = self._check_sqli_errors(response.text)
+            if error:
+                return {'type': 'error', 'dbms': error['dbms'], 'signature': error['signature']}
+            # Vérifier les différences de réponse
+            if baseline_text is not None and self._check_response_difference(response.text, baseline_text):
+                return {'type': 'difference'}
+            return None
+        return check
+
     def _build_test_url(self, base_url: str, param_name: str, payload: str) -> str:
         """Construire une URL de test avec un payload SQLi"""
         parsed = urlparse(base_url)
@@ -223,15 +286,9 @@ class SQLiScanner:
         new_query = urlencode(params, doseq=True)
         return f"{parsed.scheme}://{parsed.netloc}{parsed.path}?{new_query}"
 
-    def _check_sqli_errors(self, html_content: str) -> bool:
-        """Vérifier si des erreurs SQL sont présentes dans la réponse"""
-        html_lower = html_content.lower()
-        
-        for pattern in self.error_patterns:
-            if re.search(pattern, html_content, re.IGNORECASE):
-                return True
-        
-        return False
+    def _check_sqli_errors(self, html_content: str):
+        """Erreur SQL présente dans la réponse : {'dbms', 'signature', 'match'} ou None"""
+        return self.error_detector.detect(html_content)
 
     def _check_response_difference(self, test_response: str, baseline_response: str) -> bool:
         """Vérifier si la réponse est significativement différente"""
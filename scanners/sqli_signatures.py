@@ -0,0 +1,109 @@
+import re
+
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick absent : préfiltre par expression régulière combinée
+    ahocorasick = None
+
+
+# Signatures d'erreurs SQL : (SGBD, ancre, expression régulière)
+# L'ancre est une sous-chaîne littérale (en minuscules) présente dans toute
+# correspondance de l'expression : seules les signatures dont l'ancre apparaît
+# dans la réponse sont vérifiées.
+SQL_ERROR_SIGNATURES = [
+    ("MySQL", "mysql", r"SQL syntax.*MySQL"),
+    ("MySQL", "mysql_", r"Warning.*\Wmysql_"),
+    ("MySQL", "mysqlsyntaxerrorexception", r"MySQLSyntaxErrorException"),
+    ("MySQL", "valid mysql result", r"valid MySQL result"),
+    ("PostgreSQL", "postgresql", r"PostgreSQL.*ERROR"),
+    ("PostgreSQL", "pg_", r"Warning.*\Wpg_"),
+    ("PostgreSQL", "valid postgresql result", r"valid PostgreSQL result"),
+    ("PostgreSQL", "npgsqlexception", r"Npgsql\.NpgsqlException"),
+    ("SQLite", "sqlite", r"SQLite.*error"),
+    ("SQLite", "sqliteexception", r"SQLiteException"),
+    ("SQLite", "sqlite", r"SQLite.*SQL syntax"),
+    ("Microsoft SQL Server", "odbc", r"Microsoft.*ODBC.*SQL Server"),
+    ("Microsoft SQL Server", "odbc sql server driver", r"ODBC SQL Server Driver"),
+    ("Microsoft SQL Server", "sqlserver jdbc driver", r"SQLServer JDBC Driver"),
+    ("Microsoft SQL Server", "mssql_", r"Warning.*\Wmssql_"),
+    ("Microsoft SQL Server", "sqlsrv_", r"Warning.*\Wsqlsrv_"),
+    ("Microsoft SQL Server", "unclosed quotation mark", r"Unclosed quotation mark"),
+    ("Oracle", "quoted string not properly terminated", r"quoted string not properly terminated"),
+    ("Oracle", "ora-", r"\bORA-\d{5}"),
+    ("IBM DB2", "db2 sql error", r"DB2 SQL error"),
+    ("Générique", "sqlexception", r"SQLException"),
+]
+
+
+class SQLErrorDetector:
+    def __init__(self, signatures: list = None):
+        """
+        Détection des erreurs SQL en une seule passe sur la réponse
+
+        Les ancres de toutes les signatures sont recherchées ensemble (automate
+        Aho-Corasick, ou expression régulière combinée si pyahocorasick n'est pas
+        installé) ; seules les expressions des signatures candidates sont ensuite
+        évaluées. Le coût par réponse ne croît donc pas avec le nombre de signatures.
+
+        Args:
+            signatures: Liste de tuples (SGBD, ancre, expression), SQL_ERROR_SIGNATURES par défaut
+        """
+        self.signatures = [
+            (dbms, anchor.lower(), pattern, re.compile(pattern, re.IGNORECASE))
+            for dbms, anchor, pattern in (signatures or SQL_ERROR_SIGNATURES)
+        ]
+
+        # Signatures associées à chaque ancre
+        self._by_anchor = {}
+        for index, (dbms, anchor, pattern, regex) in enumerate(self.signatures):
+            self._by_anchor.setdefault(anchor, []).append(index)
+
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for anchor, indexes in self._by_anchor.items():
+                self._automaton.add_word(anchor, indexes)
+            self._automaton.make_automaton()
+        else:
+            self._automaton = None
+            anchors = sorted(self._by_anchor, key=len, reverse=True)
+            # Recherche en avant : une ancre trouvée à chaque position, la plus longue
+            self._anchor_regex = re.compile(
+                "(?=(" + "|".join(re.escape(anchor) for anchor in anchors) + "))"
+            )
+            # Une ancre plus longue couvre les ancres qu'elle contient
+            self._covered = {
+                anchor: sorted({index for other in anchors if other in anchor for index in self._by_anchor[other]})
+                for anchor in anchors
+            }
+
+    def _candidates(self, text_lower: str):
+        """Indices des signatures dont l'ancre apparaît dans la réponse"""
+        candidates = set()
+        if self._automaton is not None:
+            for _, indexes in self._automaton.iter(text_lower):
+                candidates.update(indexes)
+        else:
+            for match in self._anchor_regex.finditer(text_lower):
+                candidates.update(self._covered[match.group(1)])
+        return sorted(candidates)
+
+    def detect(self, text: str):
+        """
+        Rechercher une erreur SQL dans une réponse
+
+        Returns:
+            Dictionnaire {'dbms', 'signature', 'match'} de la première signature
+            vérifiée (dans l'ordre de la liste), ou None
+        """
+        if not text:
+            return None
+        for index in self._candidates(text.lower()):
+            dbms, anchor, pattern, regex = self.signatures[index]
+            match = regex.search(text)
+            if match:
+                return {
+                    'dbms': dbms,
+                    'signature': pattern,
+                    'match': match.group(0)[:200]
+                }
+        return None
@@ -1,10 +1,15 @@
-import requests
-from bs4 import BeautifulSoup
+from scanners.http_client import HTTPClient
+from scanners.response_cache import ResponseCache
+from scanners.cve_database import CVEDatabase, get_cve_database, version_tuple
 import re
 
 
 class VersionScanner:
-    def __init__(self):
+    def __init__(self, cache: ResponseCache = None, http_client: HTTPClient = None,
+                 cve_database: CVEDatabase = None):
+        self.http = http_client or (cache.client if cache else HTTPClient())
+        self.cache = cache or ResponseCache(client=self.http)
+        self.cve_database = cve_database or get_cve_database()
         self.version_patterns = {
             'apache': [
                 r'Apache/([\d.]+)',
@@ -28,18 +33,11 @@ class VersionScanner:
             ],
         }
         
-        self.vulnerable_versions = {
-            'apache': {
-                '2.4.49': {'severity': 'critical', 'cvss': 9.8, 'description': 'Apache 2.4.49 - Path Traversal (CVE-2021-41773)'},
-                '2.4.50': {'severity': 'critical', 'cvss': 9.8, 'description': 'Apache 2.4.50 - Path Traversal (CVE-2021-42013)'},
-            },
-            'nginx': {
-                '1.18.0': {'severity': 'high', 'cvss': 7.5, 'description': 'Nginx versions < 1.20.0 peuvent avoir des vulnérabilités'},
-            },
-            'php': {
-                '7.4.0': {'severity': 'medium', 'cvss': 6.0, 'description': 'PHP < 7.4.33 peut avoir des vulnérabilités'},
-                '8.0.0': {'severity': 'medium', 'cvss': 6.0, 'description': 'PHP < 8.0.30 peut avoir des vulnérabilités'},
-            },
+        # Versions minimales recommandées
+        self.min_versions = {
+            'apache': version_tuple('2.4.50'),
+            'nginx': version_tuple('1.20.0'),
+            'php': version_tuple('8.1.0'),
         }
 
     def scan(self, target_url: str):
@@ -47,7 +45,7 @@ class VersionScanner:
         try:
             print(f"[*] Scan des versions pour {target_url}...")
             
-            response = requests.get(target_url, timeout=10, allow_redirects=True)
+            response = self.cache.fetch(target_url)
             headers = response.headers
             html_content = response.text
             
@@ -80,24 +78,26 @@ class VersionScanner:
                             'raw_value': match.group(0)
                         })
             
-            # Vérifier si les versions détectées sont vulnérables
+            # Vérifier si les versions détectées sont vulnérables (une fois par couple logiciel/version)
             vulnerabilities = []
+            checked = set()
             for detected in detected_versions:
                 software = detected['software']
                 version = detected['version']
+                if (software, version) in checked:
+                    continue
+                checked.add((software, version))
                 
-                if software in self.vulnerable_versions:
-                    for vuln_version, vuln_info in self.vulnerable_versions[software].items():
-                        if self._is_version_vulnerable(version, vuln_version):
-                            vulnerabilities.append({
-                                'software': software,
-                                'version': version,
-                                'description': f"{vuln_info['description']} (Version détectée: {version})",
-                                'severity': vuln_info['severity'],
-                                'cvss_score': vuln_info['cvss'],
-                                'source': detected['source']
-                            })
-                            break
+                for advisory in self.cve_database.lookup(software, version):
+                    vulnerabilities.append({
+                        'software': software,
+                        'version': version,
+                        'cve': advisory['id'],
+                        'description': f"{advisory['summary']} ({advisory['id']}) (Version détectée: {version})",
+                        'severity': advisory['severity'],
+                        'cvss_score': advisory['cvss_score'],
+                        'source': detected['source']
+                    })
                 
                 # Vérifier aussi les versions très anciennes
                 if self._is_old_version(software, version):
@@ -115,50 +115,7 @@ class VersionScanner:
             print(f"Erreur lors du scan de versions: {e}")
             return []
 
-    def _is_version_vulnerable(self, detected_version: str, vulnerable_version: str) -> bool:
-        """Vérifier si la version détectée correspond à une version vulnérable"""
-        try:
-            # Comparaison simple de versions
-            detected_parts = [int(x) for x in detected_version.split('.')]
-            vuln_parts = [int(x) for x in vulnerable_version.split('.')]
-            
-            # Vérifier si la version détectée est <= à la version vulnérable
-            for i in range(min(len(detected_parts), len(vuln_parts))):
-                if detected_parts[i] < vuln_parts[i]:
-                    return True
-                elif detected_parts[i] > vuln_parts[i]:
-                    return False
-            
-            # Si les versions sont identiques jusqu'à la longueur la plus courte
-            if len(detected_parts) <= len(vuln_parts):
-                return True
-            
-            return False
-        except:
-            # Si la comparaison échoue, considérer comme potentiellement vulnérable
-            return detected_version == vulnerable_version
-
     def _is_old_version(self, software: str, version: str) -> bool:
         """Vérifier si la version est ancienne"""
-        try:
-            version_parts = [int(x) for x in version.split('.')]
-            
-            # Versions minimales recommandées
-            min_versions = {
-                'apache': [2, 4, 50],
-                'nginx': [1, 20, 0],
-                'php': [8, 1, 0],
-            }
-            
-            if software in min_versions:
-                min_version = min_versions[software]
-                for i in range(min(len(version_parts), len(min_version))):
-                    if version_parts[i] < min_version[i]:
-                        return True
-                    elif version_parts[i] > min_version[i]:
-                        return False
-            
-            return False
-        except:
-            return False
-
+        parsed = version_tuple(version)
+        return bool(parsed) and software in self.min_versions and parsed < self.min_versions[software]
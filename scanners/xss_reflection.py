@@ -0,0 +1,125 @@
+import re
+import secrets
+
+# Emplacement du jeton canari dans les modèles de payloads
+CANARY_PLACEHOLDER = "{canary}"
+
+# Nombre maximal de reflets analysés par réponse
+MAX_REFLECTIONS = 20
+
+# Marqueurs de début/fin des commentaires et des blocs script
+_CONTEXT_MARKERS = re.compile(r"(<!--)|(-->)|(<script\b)|(</script)", re.IGNORECASE)
+
+
+def new_canary() -> str:
+    """Jeton unique (alphanumérique, conservé par les encodages usuels) identifiant un probe"""
+    return "xss" + secrets.token_hex(5)
+
+
+def tag_payload(template: str, canary: str) -> str:
+    """Insérer le jeton canari dans un modèle de payload"""
+    return template.replace(CANARY_PLACEHOLDER, canary)
+
+
+class XSSReflectionDetector:
+    """
+    Localisation des reflets d'un payload marqué par un jeton canari
+
+    Les reflets sont trouvés par simple recherche de sous-chaîne du jeton ;
+    le contexte (texte, attribut, script, commentaire) n'est déterminé qu'aux
+    positions trouvées, en un seul parcours de la réponse.
+    """
+
+    def detect(self, html_content: str, payload: str, canary: str):
+        """
+        Rechercher un reflet exploitable du payload
+
+        Args:
+            html_content: Corps de la réponse
+            payload: Payload envoyé (contenant le jeton)
+            canary: Jeton canari du payload
+
+        Returns:
+            Dictionnaire {'context', 'offset'} du premier reflet exploitable, ou None
+        """
+        if not html_content or canary not in html_content:
+            return None
+
+        token_offset = payload.find(canary)
+        starts = []
+        position = html_content.find(canary)
+        while position != -1 and len(starts) < MAX_REFLECTIONS:
+            start = position - token_offset
+            # Seul un reflet intact du payload (non échappé, non filtré) est exploitable
+            if start >= 0 and html_content.startswith(payload, start):
+                starts.append(start)
+            position = html_content.find(canary, position + len(canary))
+
+        for start, context in zip(starts, self.classify(html_content, starts)):
+            if self._is_exploitable(html_content, payload, start, context):
+                return {'context': context, 'offset': start}
+        return None
+
+    def classify(self, html_content: str, offsets: list) -> list:
+        """
+        Contexte HTML de chaque position : 'comment', 'script', 'attribute' ou 'text'
+
+        Les marqueurs de commentaires et de scripts sont parcourus une seule fois,
+        jusqu'à la dernière position demandée.
+        """
+        contexts = []
+        markers = _CONTEXT_MARKERS.finditer(html_content, 0, max(offsets) if offsets else 0)
+        pending = next(markers, None)
+        in_comment = in_script = False
+
+        for offset in offsets:
+            while pending is not None and pending.start() < offset:
+                comment_open, comment_close, script_open, script_close = pending.groups()
+                if in_comment:
+                    in_comment = comment_close is None
+                elif in_script:
+                    in_script = script_close is None
+                else:
+                    in_comment = comment_open is not None
+                    in_script = script_open is not None
+                pending = next(markers, None)
+
+            if in_comment:
+                contexts.append('comment')
+            elif in_script:
+                contexts.append('script')
+            elif html_content.rfind('<', 0, offset) > html_content.rfind('>', 0, offset):
+                contexts.append('attribute')
+            else:
+                contexts.append('text')
+        return contexts
+
+    def _is_exploitable(self, html_content: str, payload: str, start: int, context: str) -> bool:
+        """Le payload reflété tel quel peut-il s'exécuter dans ce contexte ?"""
+        payload_lower = payload.lower()
+        if context == 'comment':
+            return '-->' in payload
+        if context == 'script':
+            # Sortie du bloc script ou de la chaîne JavaScript courante
+            return '</script' in payload_lower or "'" in payload or '"' in payload
+        if context == 'attribute':
+            if payload_lower.startswith('javascript:'):
+                return True
+            quote = self._attribute_quote(html_content, start)
+            if quote:
+                return quote in payload
+            return any(char in payload for char in ' >\t\n')
+        # Texte HTML : une balise injectée est interprétée
+        return payload.startswith('<')
+
+    def _attribute_quote(self, html_content: str, start: int) -> str:
+        """Guillemet ouvrant la valeur d'attribut contenant la position (chaîne vide si non délimitée)"""
+        equals = html_content.rfind('=', html_content.rfind('<', 0, start), start)
+        if equals == -1:
+            return ''
+        value_start = equals + 1
+        while value_start < start and html_content[value_start] in ' \t\n\r':
+            value_start += 1
+        if value_start < start and html_content[value_start] in '"\'':
+            return html_content[value_start]
+        return ''
@@ -1,20 +1,29 @@
-import requests
+import threading
 from urllib.parse import urlparse, urlencode, parse_qs
-from bs4 import BeautifulSoup
-import re
+from scanners.http_client import HTTPClient
+from scanners.response_cache import ResponseCache
+from scanners.injection_engine import InjectionEngine, InjectionProbe
+from scanners.xss_reflection import XSSReflectionDetector, new_canary, tag_payload
+from scanners.payloads import PayloadScheduler
 
 
 class XSSScanner:
-    def __init__(self):
-        self.xss_payloads = [
-            "<script>alert('XSS')</script>",
-            "<img src=x onerror=alert('XSS')>",
-            "<svg onload=alert('XSS')>",
-            "javascript:alert('XSS')",
-            "<body onload=alert('XSS')>",
-            "'\"><script>alert('XSS')</script>",
-            "<iframe src=javascript:alert('XSS')>",
-        ]
+    def __init__(self, cache: ResponseCache = None, http_client: HTTPClient = None,
+                 scheduler: PayloadScheduler = None):
+        self.http = http_client or (cache.client if cache else HTTPClient())
+        self.cache = cache or ResponseCache(client=self.http)
+        # Payloads (data/payloads/xss.json) choisis et ordonnés selon leurs résultats passés ;
+        # {canary} est remplacé par un jeton unique à chaque probe
+        self.scheduler = scheduler or PayloadScheduler('xss')
+        self.engine = InjectionEngine(http_client=self.http, observer=self.scheduler.observe)
+        # Formulaires déjà testés pendant ce scan (un même formulaire apparaît souvent sur chaque page)
+        self._tested_forms = set()
+        self._tested_forms_lock = threading.Lock()
+        self.reflection_detector = XSSReflectionDetector()
+
+    def close(self):
+        """Libérer le pool de threads du moteur d'injection"""
+        self.engine.close()
 
     def scan(self, target_url: str):
         """Scanner les vulnérabilités XSS"""
@@ -31,27 +40,36 @@ class XSSScanner:
                 # Si pas de paramètres, tester les formulaires sur la page
                 return self._scan_forms(target_url)
             
-            # Tester chaque paramètre avec des payloads XSS
+            # Tester chaque paramètre avec des payloads XSS (un groupe par paramètre)
+            groups = []
             for param_name, param_values in params.items():
-                for payload in self.xss_payloads[:3]:  # Limiter pour éviter trop de requêtes
-                    test_url = self._build_test_url(target_url, param_name, payload)
-                    
-                    try:
-                        response = requests.get(test_url, timeout=5, allow_redirects=False)
-                        
-                        # Vérifier si le payload est reflété dans la réponse
-                        if self._check_xss_reflection(response.text, payload):
-                            vulnerabilities.append({
-                                'description': f"Vulnérabilité XSS potentielle dans le paramètre '{param_name}'. Le payload est reflété dans la réponse.",
-                                'severity': 'high',
-                                'cvss_score': 7.5,
-                                'parameter': param_name,
-                                'payload': payload,
-                                'url': test_url
-                            })
-                            break  # Une vulnérabilité trouvée pour ce paramètre
-                    except:
-                        continue
+                group = []
+                for entry in self.scheduler.select('parameter'):
+                    canary = new_canary()
+                    payload = tag_payload(entry.template, canary)
+                    group.append(InjectionProbe(
+                        'GET',
+                        self._build_test_url(target_url, param_name, payload),
+                        payload=payload,
+                        timeout=5,
+                        allow_redirects=False,
+                        check=self._reflection_check(payload, canary),
+                        context={'parameter': param_name, 'payload_id': entry.id, 'payload_context': 'parameter'}
+                    ))
+                groups.append(group)
+            
+            # Une vulnérabilité au plus par paramètre (arrêt au premier payload reflété)
+            for probe, response, verdict in self.engine.run(groups):
+                param_name = probe.context['parameter']
+                vulnerabilities.append({
+                    'description': f"Vulnérabilité XSS potentielle dans le paramètre '{param_name}'. Le payload est reflété dans la réponse (contexte {verdict['context']}).",
+                    'severity': 'high',
+                    'cvss_score': 7.5,
+                    'parameter': param_name,
+                    'payload': probe.payload,
+                    'url': probe.url,
+                    'context': verdict['context']
+                })
             
             return vulnerabilities
         except Exception as e:
@@ -61,100 +79,98 @@ class XSSScanner:
     def _scan_forms(self, target_url: str):
         """Scanner les formulaires sur la page pour XSS"""
         try:
-            response = requests.get(target_url, timeout=10)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            forms = soup.find_all('form')
+            # Formulaires et champs de la page, extraits une seule fois pour tous les scanners
+            page_inputs = self.cache.fetch(target_url).inputs
             vulnerabilities = []
+            groups = []
+            form_payloads = self.scheduler.select('form')
             
-            # Aussi chercher les champs de recherche et autres inputs dans la page
-            search_inputs = soup.find_all('input', {'type': ['text', 'search']})
-            
-            for form in forms:
-                action = form.get('action', '')
-                method = form.get('method', 'get').lower()
-                inputs = form.find_all(['input', 'textarea'])
-                
-                if not inputs:
+            for form in page_inputs.forms:
+                if not form.fields or not self._claim_form(form):
                     continue
                 
-                # Construire l'URL complète du formulaire
-                form_url = urlparse(action) if action else urlparse(target_url)
-                if not form_url.netloc:
-                    form_url = urlparse(target_url)
-                full_form_url = f"{form_url.scheme}://{form_url.netloc}{form_url.path or '/'}"
-                
                 # Tester TOUS les champs, y compris password (important pour les formulaires de login)
-                for input_field in inputs:
-                    input_name = input_field.get('name', '')
-                    input_type = input_field.get('type', 'text').lower()
-                    
-                    if not input_name or input_type in ['hidden', 'submit', 'button']:
-                        continue
-                    
+                for field in form.injectable_fields:
                     # Tester plusieurs payloads pour chaque champ
-                    for payload in self.xss_payloads[:4]:
-                        test_data = {input_name: payload}
-                        
-                        try:
-                            if method == 'post':
-                                test_response = requests.post(
-                                    full_form_url,
-                                    data=test_data,
-                                    timeout=8,
-                                    allow_redirects=True
-                                )
-                            else:
-                                test_response = requests.get(
-                                    full_form_url,
-                                    params=test_data,
-                                    timeout=8,
-                                    allow_redirects=True
-                                )
-                            
-                            if self._check_xss_reflection(test_response.text, payload):
-                                vulnerabilities.append({
-                                    'description': f"Vulnérabilité XSS potentielle dans le formulaire (champ '{input_name}'). Le payload est reflété dans la réponse.",
-                                    'severity': 'high',
-                                    'cvss_score': 7.5,
-                                    'form_field': input_name,
-                                    'payload': payload,
-                                    'form_action': full_form_url
-                                })
-                                break  # Une vulnérabilité trouvée pour ce champ
-                        except Exception as e:
-                            print(f"Erreur lors du test XSS sur {input_name}: {e}")
-                            continue
+                    group = []
+                    for entry in form_payloads:
+                        canary = new_canary()
+                        payload = tag_payload(entry.template, canary)
+                        group.append(InjectionProbe(
+                            form.method,
+                            form.action,
+                            payload=payload,
+                            data={field.name: payload} if form.method == 'post' else None,
+                            params={field.name: payload} if form.method != 'post' else None,
+                            timeout=8,
+                            check=self._reflection_check(payload, canary),
+                            context={'form_field': field.name, 'form_action': form.action,
+                                     'payload_id': entry.id, 'payload_context': 'form'}
+                        ))
+                    groups.append(group)
             
             # Tester aussi les champs de recherche dans la page (hors formulaires)
-            for search_input in search_inputs[:3]:  # Limiter à 3 pour éviter trop de requêtes
-                input_name = search_input.get('name', '')
-                if not input_name:
-                    continue
-                
+            search_payloads = self.scheduler.select('search')
+            for input_name in page_inputs.search_fields[:3]:  # Limiter à 3 pour éviter trop de requêtes
                 # Construire une URL de recherche
-                parsed = urlparse(target_url)
-                test_url = f"{parsed.scheme}://{parsed.netloc}{parsed.path}?{input_name}={self.xss_payloads[0]}"
-                
-                try:
-                    test_response = requests.get(test_url, timeout=5, allow_redirects=True)
-                    if self._check_xss_reflection(test_response.text, self.xss_payloads[0]):
-                        vulnerabilities.append({
-                            'description': f"Vulnérabilité XSS potentielle dans le champ de recherche '{input_name}'. Le payload est reflété dans la réponse.",
-                            'severity': 'high',
-                            'cvss_score': 7.5,
-                            'form_field': input_name,
-                            'payload': self.xss_payloads[0],
-                            'url': test_url
-                        })
-                except:
-                    continue
+                group = []
+                for entry in search_payloads:
+                    canary = new_canary()
+                    payload = tag_payload(entry.template, canary)
+                    parsed = urlparse(target_url)
+                    test_url = f"{parsed.scheme}://{parsed.netloc}{parsed.path}?{input_name}={payload}"
+                    group.append(InjectionProbe(
+                        'GET',
+                        test_url,
+                        payload=payload,
+                        timeout=5,
+                        check=self._reflection_check(payload, canary),
+                        context={'form_field': input_name, 'search': True,
+                                 'payload_id': entry.id, 'payload_context': 'search'}
+                    ))
+                groups.append(group)
+            
+            # Une vulnérabilité au plus par champ (arrêt au premier payload reflété)
+            for probe, response, verdict in self.engine.run(groups):
+                input_name = probe.context['form_field']
+                if probe.context.get('search'):
+                    vulnerabilities.append({
+                        'description': f"Vulnérabilité XSS potentielle dans le champ de recherche '{input_name}'. Le payload est reflété dans la réponse (contexte {verdict['context']}).",
+                        'severity': 'high',
+                        'cvss_score': 7.5,
+                        'form_field': input_name,
+                        'payload': probe.payload,
+                        'url': probe.url,
+                        'context': verdict['context']
+                    })
+                else:
+                    vulnerabilities.append({
+                        'description': f"Vulnérabilité XSS potentielle dans le formulaire (champ '{input_name}'). Le payload est reflété dans la réponse (contexte {verdict['context']}).",
+                        'severity': 'high',
+                        'cvss_score': 7.5,
+                        'form_field': input_name,
+                        'payload': probe.payload,
+                        'form_action': probe.context['form_action'],
+                        'context': verdict['context']
+                    })
             
             return vulnerabilities
         except Exception as e:
             print(f"Erreur lors du scan des formulaires: {e}")
             return []
 
+    def _claim_form(self, form) -> bool:
+        """Réserver un formulaire pour ce scan ; False s'il a déjà été testé"""
+        with self._tested_forms_lock:
+            if form.signature in self._tested_forms:
+                return False
+            self._tested_forms.add(form.signature)
+            return True
+
+    def _reflection_check(self, payload: str, canary: str):
+        """Vérification appliquée à la réponse d'un probe : {'context', 'offset'} ou None"""
+        return lambda response: self._check_xss_reflection(response.text, payload, canary)
+
     def _build_test_url(self, base_url: str, param_name: str, payload: str) -> str:
         """Construire une URL de test avec un payload"""
         parsed = urlparse(base_url)
@@ -164,64 +180,6 @@ class XSSScanner:
         new_query = urlencode(params, doseq=True)
         return f"{parsed.scheme}://{parsed.netloc}{parsed.path}?{new_query}"
 
-    def _check_xss_reflection(self, html_content: str, payload: str) -> bool:
-        """Vérifier si le payload est reflété dans le HTML de manière vulnérable"""
-        payload_lower = payload.lower()
-        html_lower = html_content.lower()
-        
-        # Vérifier la présence du payload dans le HTML
-        if payload not in html_content and payload_lower not in html_lower:
-            return False
-        
-        # Vérifier qu'il n'est pas dans un commentaire HTML
-        if f"<!--{payload}" in html_content or f"<!--{payload_lower}" in html_lower:
-            return False
-        
-        # Vérifier qu'il n'est pas complètement échappé (HTML entities)
-        escaped_payload = payload.replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;').replace("'", '&#39;')
-        if escaped_payload in html_content and payload not in html_content:
-            # Le payload est échappé, donc probablement sécurisé
-            return False
-        
-        # Si le payload contient des balises script
-        if '<script' in payload_lower:
-            # Chercher des balises script non échappées
-            if re.search(r'<script[^>]*>', html_content, re.IGNORECASE):
-                # Vérifier si notre payload est dans une balise script
-                script_pattern = r'<script[^>]*>.*?' + re.escape(payload) + r'.*?</script>'
-                if re.search(script_pattern, html_content, re.IGNORECASE | re.DOTALL):
-                    return True
-            # Ou si le payload script apparaît tel quel (non échappé)
-            if payload in html_content:
-                return True
-        
-        # Si le payload contient des attributs d'événement (onerror, onload, etc.)
-        event_attrs = ['onerror', 'onload', 'onclick', 'onmouseover', 'onfocus']
-        for attr in event_attrs:
-            if attr in payload_lower:
-                # Chercher des attributs d'événement dans le HTML
-                pattern = r'<[^>]+\s+' + attr + r'\s*=\s*["\']?[^"\'>]*' + re.escape(payload) + r'[^"\'>]*["\']?[^>]*>'
-                if re.search(pattern, html_content, re.IGNORECASE):
-                    return True
-                # Ou si le payload apparaît dans un attribut d'événement
-                if re.search(r'<[^>]+\s+' + attr + r'\s*=\s*["\']?[^"\'>]*' + re.escape(payload), html_content, re.IGNORECASE):
-                    return True
-        
-        # Si le payload contient des balises HTML simples (<img>, <svg>, etc.)
-        if payload.startswith('<') and payload.endswith('>'):
-            # Vérifier si la balise apparaît non échappée
-            if payload in html_content:
-                # Vérifier qu'elle n'est pas dans un contexte sécurisé (échappée)
-                escaped_tag = payload.replace('<', '&lt;').replace('>', '&gt;')
-                if escaped_tag not in html_content:
-                    return True
-        
-        # Vérifier les payloads javascript:
-        if payload.startswith('javascript:'):
-            if payload in html_content or payload_lower in html_lower:
-                # Vérifier qu'il n'est pas échappé
-                if 'javascript:' in html_content.lower():
-                    return True
-        
-        return False
-
+    def _check_xss_reflection(self, html_content: str, payload: str, canary: str):
+        """Vérifier si le payload est reflété dans le HTML de manière exploitable"""
+        return self.reflection_detector.detect(html_content, payload, canary)
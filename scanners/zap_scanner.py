@@ -1,19 +1,70 @@
-import requests
+import os
+import random
+import re
+import threading
 import time
+import uuid
+from datetime import datetime, timedelta
 from urllib.parse import urlparse
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from api.database import ZapSiteLock, engine
+from scanners.http_client import HTTPClient
+
+# Sessions HTTP de l'API ZAP, partagées par tous les scans du processus (une par instance)
+_api_clients = {}
+_api_clients_lock = threading.Lock()
+
+
+def _api_client(instance_url: str) -> HTTPClient:
+    """Client HTTP (pool keep-alive) réutilisé pour une instance ZAP"""
+    with _api_clients_lock:
+        if instance_url not in _api_clients:
+            _api_clients[instance_url] = HTTPClient()
+        return _api_clients[instance_url]
+
+
+# Durée du verrou d'un site (renouvelé pendant le scan) : un worker arrêté
+# brutalement ne bloque le site que jusqu'à son expiration
+SITE_LOCK_SECONDS = 300
 
 
 class ZAPScanner:
-    def __init__(self, zap_proxy_url="http://localhost:8080", zap_api_key=None):
+    def __init__(self, zap_proxy_url="http://localhost:8080", zap_api_key=None, http_client: HTTPClient = None,
+                 bind=None):
         """
         Initialiser le scanner ZAP
         
+        Chaque scan s'exécute dans son propre contexte ZAP (périmètre du spider et
+        du scan actif), supprimé à la fin du scan. ZAP conserve en revanche les
+        alertes par site : un scan réserve le site sur l'instance (verrou en base,
+        partagé par tous les workers) avant d'effacer ses alertes, et un second
+        scan du même site n'utilise pas ZAP tant que le premier est en cours.
+        Des scans de sites différents peuvent partager une même instance ; avec
+        plusieurs instances, la moins chargée est choisie au début du scan.
+        
         Args:
-            zap_proxy_url: URL du proxy ZAP (par défaut http://localhost:8080)
+            zap_proxy_url: URL du proxy ZAP, ou liste d'URLs séparées par des virgules
+                           (par défaut http://localhost:8080)
             zap_api_key: Clé API ZAP (optionnelle si ZAP est en mode non-sécurisé)
+            http_client: Client HTTP à utiliser pour l'API (par défaut une session partagée par instance)
+            bind: Connexion à la base des verrous de site (par défaut le moteur de l'API)
         """
-        self.zap_proxy_url = zap_proxy_url.rstrip('/')
+        self.instances = [url.strip().rstrip('/') for url in zap_proxy_url.split(',') if url.strip()]
+        self.zap_proxy_url = self.instances[0]
         self.zap_api_key = zap_api_key
+        self._http_client = http_client
+        self.http = http_client or _api_client(self.zap_proxy_url)
+        # Intervalle de sondage adaptatif : court tant que le scan progresse, allongé sinon
+        self.poll_min = float(os.getenv('ZAP_POLL_MIN', '0.5'))
+        self.poll_max = float(os.getenv('ZAP_POLL_MAX', '5'))
+        # Nombre d'alertes récupérées par requête
+        self.alert_page_size = int(os.getenv('ZAP_ALERT_PAGE_SIZE', '500'))
+        self._bind = bind or engine
+        # Verrou du site détenu par le scan en cours : (instance, site, propriétaire)
+        self._site_lock = None
+        self._site_lock_renewed_at = 0.0
     
     def _make_request(self, endpoint, params=None, method='GET'):
         """Faire une requête à l'API ZAP"""
@@ -25,9 +76,9 @@ class ZAPScanner:
                 params['apikey'] = self.zap_api_key
             
             if method == 'GET':
-                response = requests.get(url, params=params, timeout=30)
+                response = self.http.get(url, params=params, timeout=30)
             else:
-                response = requests.post(url, params=params, timeout=30)
+                response = self.http.post(url, params=params, timeout=30)
             
             if response.status_code == 200:
                 return response.json()
@@ -36,210 +87,344 @@ class ZAPScanner:
             print(f"Erreur lors de la requête ZAP API: {e}")
             return None
     
+    def _use_instance(self, instance_url: str):
+        """Diriger les requêtes suivantes vers une instance ZAP"""
+        self.zap_proxy_url = instance_url
+        self.http = self._http_client or _api_client(instance_url)
+    
     def is_available(self):
-        """Vérifier si ZAP est disponible"""
+        """Vérifier si ZAP est disponible (et choisir l'instance la moins chargée)"""
         try:
+            candidates = []
+            for instance_url in self.instances:
+                self._use_instance(instance_url)
+                result = self._make_request("ascan/view/scans")
+                if result is None:
+                    continue
+                running = sum(1 for scan in result.get('scans', []) if scan.get('state') == 'RUNNING')
+                candidates.append((running, random.random(), instance_url))
+            
+            if not candidates:
+                return False
+            
+            self._use_instance(min(candidates)[2])
             result = self._make_request("core/view/version")
             if result and 'version' in result:
-                print(f"[*] ZAP détecté - Version: {result.get('version', 'unknown')}")
+                print(f"[*] ZAP détecté - Version: {result.get('version', 'unknown')} ({self.zap_proxy_url})")
                 return True
             return False
         except:
             return False
     
-    def scan(self, target_url: str):
+    def scan(self, target_url: str, on_finding=None):
         """
         Effectuer un scan complet avec ZAP (Spider + Active Scan)
         
         Args:
             target_url: URL cible à scanner
+            on_finding: Fonction appelée avec chaque vulnérabilité dès sa lecture ;
+                        les vulnérabilités ne sont alors pas conservées en mémoire
             
         Returns:
-            Liste de vulnérabilités détectées
+            Liste de vulnérabilités détectées (vide si on_finding est fourni)
         """
         if not self.is_available():
-            print("[!] ZAP n'est pas disponible. Assurez-vous que ZAP est démarré sur", self.zap_proxy_url)
+            print("[!] ZAP n'est pas disponible. Assurez-vous que ZAP est démarré sur", ", ".join(self.instances))
             return []
         
+        context_name = f"vuln-scanner-{uuid.uuid4().hex[:12]}"
+        parsed = urlparse(target_url)
+        site = f"{parsed.scheme}://{parsed.netloc}"
+        try:
+            acquired = self._acquire_site_lock(site, context_name)
+        except Exception as e:
+            print(f"Erreur lors de la réservation du site {site} dans ZAP: {e}")
+            return []
+        if not acquired:
+            # Effacer ou relire les alertes du site mélangerait les deux scans
+            print(f"[!] {site} est déjà en cours de scan sur {self.zap_proxy_url}, scan ZAP ignoré")
+            return []
+        try:
+            return self._scan_site(target_url, context_name, on_finding)
+        finally:
+            self._release_site_lock()
+    
+    def _scan_site(self, target_url: str, context_name: str, on_finding=None):
+        """Scan ZAP d'un site, appelé sous le verrou du site"""
+        context_id = None
+        spider_scan_id = None
+        active_scan_id = None
         try:
             print(f"[*] Démarrage du scan ZAP pour {target_url}...")
             
+            # Alertes d'un scan précédent du même site (conservées par ZAP)
+            self._clear_alerts(target_url)
+            
+            # Contexte propre au scan : périmètre du spider et du scan actif
+            context_id = self._create_context(context_name, target_url)
+            if context_id is None:
+                context_name = None
+            
             # Étape 1: Spider (crawl) du site
             print("[*] Phase 1/2: Spider (crawl) du site...")
-            spider_scan_id = self._start_spider(target_url)
+            spider_scan_id = self._start_spider(target_url, context_name)
             if spider_scan_id:
                 self._wait_for_spider(spider_scan_id)
             
             # Étape 2: Active Scan
             print("[*] Phase 2/2: Active Scan (tests de sécurité)...")
-            active_scan_id = self._start_active_scan(target_url)
+            active_scan_id = self._start_active_scan(target_url, context_id)
             if active_scan_id:
                 self._wait_for_active_scan(active_scan_id)
             
-            # Récupérer les alertes
+            # Récupérer les alertes page par page
             print("[*] Récupération des alertes ZAP...")
-            alerts = self._get_alerts(target_url)
+            vulnerabilities = []
+            count = 0
+            for alert in self._get_alerts(target_url, context_name):
+                vulnerability = self._parse_alert(alert, target_url)
+                if vulnerability is None:
+                    continue
+                count += 1
+                if on_finding:
+                    on_finding(vulnerability)
+                else:
+                    vulnerabilities.append(vulnerability)
+            print(f"[*] {count} alertes ZAP retenues")
             
-            return self._parse_alerts(alerts, target_url)
+            return vulnerabilities
             
         except Exception as e:
             print(f"Erreur lors du scan ZAP: {e}")
             return []
+        finally:
+            self._cleanup(context_name, spider_scan_id, active_scan_id)
     
-    def _start_spider(self, target_url: str):
-        """Démarrer un scan Spider"""
+    def _acquire_site_lock(self, site: str, owner: str) -> bool:
+        """
+        Réserver un site sur l'instance ZAP courante pour ce scan
+
+        Insertion de la ligne du verrou, ou reprise d'un verrou expiré par un
+        UPDATE conditionnel : un seul scan obtient le site, quel que soit son
+        processus. False si un autre scan le détient.
+        """
+        now = datetime.utcnow()
+        key = (self.zap_proxy_url, site, owner)
+        with Session(bind=self._bind) as db:
+            taken_over = db.query(ZapSiteLock).filter(
+                ZapSiteLock.instance_url == self.zap_proxy_url,
+                ZapSiteLock.site == site,
+                ZapSiteLock.expires_at < now,
+            ).update(
+                {ZapSiteLock.owner: owner, ZapSiteLock.expires_at: now + timedelta(seconds=SITE_LOCK_SECONDS)},
+                synchronize_session=False,
+            )
+            if not taken_over:
+                db.add(ZapSiteLock(
+                    instance_url=self.zap_proxy_url, site=site, owner=owner,
+                    expires_at=now + timedelta(seconds=SITE_LOCK_SECONDS),
+                ))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                return False
+        self._site_lock = key
+        self._site_lock_renewed_at = time.monotonic()
+        return True
+    
+    def _renew_site_lock(self):
+        """Prolonger le verrou du site (au plus une écriture par tiers de sa durée)"""
+        if self._site_lock is None or time.monotonic() - self._site_lock_renewed_at < SITE_LOCK_SECONDS / 3:
+            return
+        instance_url, site, owner = self._site_lock
         try:
-            params = {'url': target_url}
-            if self.zap_api_key:
-                params['apikey'] = self.zap_api_key
-            
-            url = f"{self.zap_proxy_url}/JSON/spider/action/scan"
-            response = requests.get(url, params=params, timeout=30)
-            
-            if response.status_code == 200:
-                result = response.json()
-                if 'scan' in result:
-                    return result['scan']
-            return None
+            with Session(bind=self._bind) as db:
+                db.query(ZapSiteLock).filter(
+                    ZapSiteLock.instance_url == instance_url,
+                    ZapSiteLock.site == site,
+                    ZapSiteLock.owner == owner,
+                ).update(
+                    {ZapSiteLock.expires_at: datetime.utcnow() + timedelta(seconds=SITE_LOCK_SECONDS)},
+                    synchronize_session=False,
+                )
+                db.commit()
+            self._site_lock_renewed_at = time.monotonic()
         except Exception as e:
-            print(f"Erreur lors du démarrage du Spider: {e}")
+            print(f"Erreur lors du renouvellement du verrou ZAP de {site}: {e}")
+    
+    def _release_site_lock(self):
+        """Libérer le verrou du site détenu par ce scan"""
+        if self._site_lock is None:
+            return
+        instance_url, site, owner = self._site_lock
+        self._site_lock = None
+        try:
+            with Session(bind=self._bind) as db:
+                db.query(ZapSiteLock).filter(
+                    ZapSiteLock.instance_url == instance_url,
+                    ZapSiteLock.site == site,
+                    ZapSiteLock.owner == owner,
+                ).delete(synchronize_session=False)
+                db.commit()
+        except Exception as e:
+            print(f"Erreur lors de la libération du verrou ZAP de {site}: {e}")
+    
+    def _clear_alerts(self, target_url: str):
+        """Effacer les alertes ZAP du site cible avant de le scanner"""
+        parsed = urlparse(target_url)
+        result = self._make_request("alert/action/deleteAlerts", {'baseurl': f"{parsed.scheme}://{parsed.netloc}"})
+        if result is None:
+            print("[!] Impossible d'effacer les alertes ZAP du site, celles des scans précédents seront relues")
+    
+    def _create_context(self, context_name: str, target_url: str):
+        """Créer le contexte ZAP du scan, limité au site cible (None si indisponible)"""
+        result = self._make_request("context/action/newContext", {'contextName': context_name})
+        if not result or 'contextId' not in result:
+            print("[!] Impossible de créer un contexte ZAP, alertes filtrées par URL de base")
             return None
+        
+        parsed = urlparse(target_url)
+        self._make_request("context/action/includeInContext", {
+            'contextName': context_name,
+            'regex': re.escape(f"{parsed.scheme}://{parsed.netloc}") + ".*"
+        })
+        return result['contextId']
+    
+    def _cleanup(self, context_name, spider_scan_id, active_scan_id):
+        """Arrêter et supprimer les scans et le contexte du scan dans ZAP"""
+        if active_scan_id:
+            self._make_request("ascan/action/stop", {'scanId': active_scan_id})
+            self._make_request("ascan/action/removeScan", {'scanId': active_scan_id})
+        if spider_scan_id:
+            self._make_request("spider/action/stop", {'scanId': spider_scan_id})
+            self._make_request("spider/action/removeScan", {'scanId': spider_scan_id})
+        if context_name:
+            self._make_request("context/action/removeContext", {'contextName': context_name})
+    
+    def _start_spider(self, target_url: str, context_name: str = None):
+        """Démarrer un scan Spider (dans le contexte du scan)"""
+        params = {'url': target_url}
+        if context_name:
+            params['contextName'] = context_name
+        result = self._make_request("spider/action/scan", params)
+        if result and 'scan' in result:
+            return result['scan']
+        print("[!] Impossible de démarrer le Spider ZAP")
+        return None
     
     def _wait_for_spider(self, scan_id, timeout=300):
         """Attendre la fin du scan Spider"""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            try:
-                params = {'scanId': scan_id}
-                if self.zap_api_key:
-                    params['apikey'] = self.zap_api_key
-                
-                url = f"{self.zap_proxy_url}/JSON/spider/view/status"
-                response = requests.get(url, params=params, timeout=30)
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    status = int(result.get('status', 100))
-                    if status >= 100:  # 100 = terminé
-                        print(f"[*] Spider terminé: {status}%")
-                        return True
-                    print(f"[*] Spider en cours: {status}%")
-                time.sleep(2)
-            except:
-                time.sleep(2)
-        return False
+        return self._wait_for_completion("spider/view/status", scan_id, "Spider", timeout)
     
-    def _start_active_scan(self, target_url: str):
-        """Démarrer un scan actif"""
-        try:
-            params = {'url': target_url}
-            if self.zap_api_key:
-                params['apikey'] = self.zap_api_key
-            
-            url = f"{self.zap_proxy_url}/JSON/ascan/action/scan"
-            response = requests.get(url, params=params, timeout=30)
-            
-            if response.status_code == 200:
-                result = response.json()
-                if 'scan' in result:
-                    return result['scan']
-            return None
-        except Exception as e:
-            print(f"Erreur lors du démarrage de l'Active Scan: {e}")
-            return None
+    def _start_active_scan(self, target_url: str, context_id=None):
+        """Démarrer un scan actif (dans le contexte du scan)"""
+        params = {'url': target_url, 'recurse': 'true'}
+        if context_id:
+            params['contextId'] = context_id
+        result = self._make_request("ascan/action/scan", params)
+        if result and 'scan' in result:
+            return result['scan']
+        print("[!] Impossible de démarrer l'Active Scan ZAP")
+        return None
     
     def _wait_for_active_scan(self, scan_id, timeout=600):
         """Attendre la fin du scan actif"""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            try:
-                params = {'scanId': scan_id}
-                if self.zap_api_key:
-                    params['apikey'] = self.zap_api_key
-                
-                url = f"{self.zap_proxy_url}/JSON/ascan/view/status"
-                response = requests.get(url, params=params, timeout=30)
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    status = int(result.get('status', 100))
-                    if status >= 100:  # 100 = terminé
-                        print(f"[*] Active Scan terminé: {status}%")
-                        return True
-                    print(f"[*] Active Scan en cours: {status}%")
-                time.sleep(3)
-            except:
-                time.sleep(3)
-        return False
+        return self._wait_for_completion("ascan/view/status", scan_id, "Active Scan", timeout)
     
-    def _get_alerts(self, target_url: str):
-        """Récupérer les alertes ZAP"""
-        try:
-            parsed = urlparse(target_url)
-            base_url = f"{parsed.scheme}://{parsed.netloc}"
-            
-            params = {'baseurl': base_url}
-            if self.zap_api_key:
-                params['apikey'] = self.zap_api_key
-            
-            url = f"{self.zap_proxy_url}/JSON/core/view/alerts"
-            response = requests.get(url, params=params, timeout=30)
-            
-            if response.status_code == 200:
-                result = response.json()
-                if 'alerts' in result:
-                    return result['alerts']
-            return []
-        except Exception as e:
-            print(f"Erreur lors de la récupération des alertes: {e}")
-            return []
+    def _wait_for_completion(self, status_endpoint: str, scan_id, label: str, timeout: float):
+        """
+        Sonder l'avancement d'un scan ZAP jusqu'à 100 %
+        
+        L'intervalle repart de poll_min à chaque progression et s'allonge
+        (x1.5, plafonné à poll_max) tant que le statut ne change pas ; une
+        gigue de ±20 % évite que les scans simultanés sondent ZAP en même temps.
+        """
+        deadline = time.monotonic() + timeout
+        interval = self.poll_min
+        last_status = None
+        while time.monotonic() < deadline:
+            self._renew_site_lock()
+            result = self._make_request(status_endpoint, {'scanId': scan_id})
+            if result is not None:
+                status = int(result.get('status', 100))
+                if status >= 100:  # 100 = terminé
+                    print(f"[*] {label} terminé: {status}%")
+                    return True
+                if status != last_status:
+                    print(f"[*] {label} en cours: {status}%")
+                    last_status = status
+                    interval = self.poll_min
+                else:
+                    interval = min(interval * 1.5, self.poll_max)
+            else:
+                interval = min(interval * 1.5, self.poll_max)
+            time.sleep(min(interval * random.uniform(0.8, 1.2), max(0.0, deadline - time.monotonic())))
+        print(f"[!] {label} non terminé après {timeout}s")
+        return False
     
-    def _parse_alerts(self, alerts, target_url):
-        """Parser les alertes ZAP en vulnérabilités"""
-        vulnerabilities = []
+    def _get_alerts(self, target_url: str, context_name: str = None):
+        """
+        Récupérer les alertes ZAP page par page (start/count) sans tout charger en mémoire
         
-        # Mapping des risques ZAP vers nos niveaux de sévérité
-        risk_mapping = {
-            'Informational': 'info',
-            'Low': 'low',
-            'Medium': 'medium',
-            'High': 'high',
-            'Critical': 'critical'
-        }
+        Les alertes sont filtrées par site (et par contexte, limité au même site) :
+        ZAP les conserve par site, d'où le verrou du site pendant tout le scan.
+        """
+        parsed = urlparse(target_url)
+        base_url = f"{parsed.scheme}://{parsed.netloc}"
         
-        # Mapping des risques vers CVSS
-        cvss_mapping = {
-            'Informational': 0.0,
-            'Low': 3.0,
-            'Medium': 5.5,
-            'High': 7.5,
-            'Critical': 9.0
-        }
+        endpoint = "alert/view/alerts" if context_name else "core/view/alerts"
+        params = {'baseurl': base_url}
+        if context_name:
+            params['contextName'] = context_name
         
-        for alert in alerts:
-            risk = alert.get('risk', 'Medium')
-            severity = risk_mapping.get(risk, 'medium')
-            cvss = cvss_mapping.get(risk, 5.5)
-            
-            # Filtrer les alertes informatives sauf si importantes
-            if severity == 'info' and 'SQL' not in alert.get('name', '') and 'XSS' not in alert.get('name', ''):
-                continue
-            
-            vulnerability = {
-                'title': alert.get('name', 'Vulnérabilité détectée par ZAP'),
-                'description': alert.get('description', ''),
-                'severity': severity,
-                'cvss_score': cvss,
-                'url': alert.get('url', target_url),
-                'parameter': alert.get('param', ''),
-                'evidence': alert.get('evidence', ''),
-                'solution': alert.get('solution', ''),
-                'reference': alert.get('reference', ''),
-                'cweid': alert.get('cweid', ''),
-                'wascid': alert.get('wascid', '')
-            }
-            
-            vulnerabilities.append(vulnerability)
+        start = 0
+        while True:
+            result = self._make_request(endpoint, {**params, 'start': start, 'count': self.alert_page_size})
+            alerts = result.get('alerts', []) if result else []
+            yield from alerts
+            if len(alerts) < self.alert_page_size:
+                return
+            start += len(alerts)
+    
+    # Mapping des risques ZAP vers nos niveaux de sévérité
+    RISK_MAPPING = {
+        'Informational': 'info',
+        'Low': 'low',
+        'Medium': 'medium',
+        'High': 'high',
+        'Critical': 'critical'
+    }
+    
+    # Mapping des risques vers CVSS
+    CVSS_MAPPING = {
+        'Informational': 0.0,
+        'Low': 3.0,
+        'Medium': 5.5,
+        'High': 7.5,
+        'Critical': 9.0
+    }
+    
+    def _parse_alert(self, alert, target_url):
+        """Convertir une alerte ZAP en vulnérabilité (None si l'alerte est ignorée)"""
+        risk = alert.get('risk', 'Medium')
+        severity = self.RISK_MAPPING.get(risk, 'medium')
+        cvss = self.CVSS_MAPPING.get(risk, 5.5)
         
-        return vulnerabilities
-
+        # Filtrer les alertes informatives sauf si importantes
+        if severity == 'info' and 'SQL' not in alert.get('name', '') and 'XSS' not in alert.get('name', ''):
+            return None
+        
+        return {
+            'title': alert.get('name', 'Vulnérabilité détectée par ZAP'),
+            'description': alert.get('description', ''),
+            'severity': severity,
+            'cvss_score': cvss,
+            'url': alert.get('url', target_url),
+            'parameter': alert.get('param', ''),
+            'evidence': alert.get('evidence', ''),
+            'solution': alert.get('solution', ''),
+            'reference': alert.get('reference', ''),
+            'cweid': alert.get('cweid', ''),
+            'wascid': alert.get('wascid', '')
+        }